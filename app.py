@@ -12,7 +12,7 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
-def create_app(config_name=None):
+def create_app(config_name=None, run_startup_tasks=True):
     app = Flask(__name__)
     
     config_name = config_name or os.environ.get('FLASK_ENV', 'default')
@@ -90,8 +90,27 @@ def create_app(config_name=None):
         app.logger.setLevel(logging.INFO)
         app.logger.info('WatchTogether startup')
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    from utils.prefix_search import register_search_hooks
+    register_search_hooks()
+    
+    # Create and upgrade database tables; helper processes of an already started app skip this
+    if run_startup_tasks:
+        with app.app_context():
+            db.create_all()
+            
+            from utils.schema_upgrades import ensure_preference_stats_column, ensure_recommendation_indexes
+            ensure_preference_stats_column()
+            ensure_recommendation_indexes()
+            
+            # create_all never alters existing tables; add the discussion counters and fill them once
+            from utils.discussion_threads import ensure_counter_columns, repair_discussion_counters
+            if ensure_counter_columns():
+                repair_discussion_counters()
+            
+            from utils.discussion_search import install_discussion_search
+            install_discussion_search()
+            
+            from utils.prefix_search import backfill_search_index
+            backfill_search_index()
     
     return app
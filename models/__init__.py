@@ -4,11 +4,13 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
 import json
+import unicodedata
 
 # Import recommendation models
 from .recommendations import (
     UserPreferenceProfile, GroupPreferenceProfile, Recommendation,
-    RecommendationFeedback, RecommendationHistory, ABTestExperiment
+    RecommendationFeedback, RecommendationHistory, ABTestExperiment,
+    ContentSimilarity, ContentSimilarityState, RecommendationCacheVersion
 )
 
 class User(UserMixin, db.Model):
@@ -142,20 +144,17 @@ class User(UserMixin, db.Model):
     
     @classmethod
     def search_users(cls, query, current_user_id=None):
-        """Search for users by username, first name, or last name"""
-        search_query = f"%{query}%"
-        users = cls.query.filter(
+        """Search for users by username, first name, or last name (word prefixes), best match first"""
+        ranking = SearchToken.ranking('user', query)
+        if ranking is None:
+            return []
+        users = cls.query.join(ranking, ranking.c.entity_id == cls.id).filter(
             db.and_(
                 cls.is_active == True,
                 cls.is_profile_public == True,
-                cls.id != current_user_id,  # Exclude current user
-                db.or_(
-                    cls.username.ilike(search_query),
-                    cls.first_name.ilike(search_query),
-                    cls.last_name.ilike(search_query)
-                )
+                cls.id != current_user_id  # Exclude current user
             )
-        ).limit(20).all()
+        ).order_by(ranking.c.score.desc(), cls.username).limit(20).all()
         return users
     
     @staticmethod
@@ -644,20 +643,16 @@ class Group(db.Model):
     
     @staticmethod
     def search_public_groups(query=None, limit=20):
-        """Search for public groups"""
-        query_filter = Group.privacy_level == 'public'
+        """Search for public groups, best name/description prefix match first when there is a query"""
+        groups = Group.query.filter(Group.privacy_level == 'public')
         
         if query:
-            search_pattern = f"%{query}%"
-            query_filter = db.and_(
-                Group.privacy_level == 'public',
-                db.or_(
-                    Group.name.ilike(search_pattern),
-                    Group.description.ilike(search_pattern)
-                )
-            )
+            ranking = SearchToken.ranking('group', query)
+            if ranking is None:
+                return []
+            groups = groups.join(ranking, ranking.c.entity_id == Group.id).order_by(ranking.c.score.desc())
         
-        return Group.query.filter(query_filter).order_by(Group.created_at.desc()).limit(limit).all()
+        return groups.order_by(Group.created_at.desc()).limit(limit).all()
     
     @staticmethod
     def validate_group_name(name, group_id=None):
@@ -817,12 +812,42 @@ class Content(db.Model):
     
     def get_genres(self):
         """Get genres as a list"""
-        if self.genre:
-            try:
-                return json.loads(self.genre)
-            except:
-                return [self.genre]
-        return []
+        return Content.parse_genres(self.genre)
+    
+    def to_tmdb_details(self):
+        """Local row in the shape TMDBService.get_content_details returns, for TMDB-style pages"""
+        return {
+            'title': self.title,
+            'description': self.description or '',
+            'type': self.type,
+            'genres': self.get_genres(),
+            'year': self.year,
+            'rating': self.rating,
+            'duration': self.duration,
+            'poster_url': self.poster_url,
+            'backdrop_url': self.backdrop_url,
+            'trailer_url': self.trailer_url,
+            'director': self.director,
+            'cast': [name.strip() for name in (self.cast or '').split(',') if name.strip()],
+            'country': self.country,
+            'language': self.language,
+            'imdb_id': self.imdb_id,
+            'tmdb_id': self.tmdb_id,
+            'content_type': 'tv' if self.type == 'tv_show' else 'movie'
+        }
+    
+    @staticmethod
+    def parse_genres(raw_genre):
+        """Parse a genre column stored as a JSON list or a comma separated string"""
+        if not raw_genre:
+            return []
+        try:
+            genres = json.loads(raw_genre)
+        except (ValueError, TypeError):
+            genres = raw_genre.split(',')
+        if isinstance(genres, str):
+            genres = [genres]
+        return [genre.strip() for genre in genres if isinstance(genre, str) and genre.strip()]
     
     def set_genres(self, genres):
         """Set genres from a list"""
@@ -1453,6 +1478,12 @@ class Discussion(db.Model):
     is_hidden = db.Column(db.Boolean, default=False)  # For moderation
     is_pinned = db.Column(db.Boolean, default=False)  # For important discussions
     
+    # Denormalized engagement counters, kept in step by utils.discussion_threads
+    like_count = db.Column(db.Integer, nullable=False, default=0)
+    dislike_count = db.Column(db.Integer, nullable=False, default=0)
+    direct_reply_count = db.Column(db.Integer, nullable=False, default=0)  # Visible direct replies
+    descendant_reply_count = db.Column(db.Integer, nullable=False, default=0)  # Visible nested replies
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     edited_at = db.Column(db.DateTime, nullable=True)
@@ -1468,30 +1499,71 @@ class Discussion(db.Model):
     reports = db.relationship('DiscussionReport', backref='discussion', cascade='all, delete-orphan')
     notifications = db.relationship('DiscussionNotification', backref='discussion', cascade='all, delete-orphan')
     
+    # Engagement sorting for content and group discussion listings
+    __table_args__ = (
+        db.Index('ix_discussion_content_engagement', 'content_id', 'parent_id', 'like_count'),
+        db.Index('ix_discussion_group_engagement', 'group_id', 'parent_id', 'like_count'),
+    )
+    
+    # Depth and viewer state filled in by utils.discussion_threads; None when not prefetched
+    _prefetched = None
+    
+    # Highlighted match excerpt set by utils.discussion_search.search_discussions
+    search_snippet = None
+    
     def __repr__(self):
         return f'<Discussion {self.id}: {self.message[:50]}...>'
     
+    @classmethod
+    def replies_cte(cls, root_id):
+        """Recursive CTE of the visible replies below root_id with their depth (1 for direct replies)
+        
+        Hidden replies prune their whole subtree, as in the thread view.
+        """
+        tree = db.select(cls.id, cls.parent_id, db.literal(1).label('depth'))\
+                 .where(cls.parent_id == root_id, cls.is_hidden == False)\
+                 .cte('thread_replies', recursive=True)
+        return tree.union_all(
+            db.select(cls.id, cls.parent_id, tree.c.depth + 1)
+              .where(cls.parent_id == tree.c.id, cls.is_hidden == False)
+        )
+    
+    @classmethod
+    def ancestors_cte(cls, discussion_id):
+        """Recursive CTE of the ancestors of discussion_id with their distance (1 for the parent)"""
+        start = db.select(cls.parent_id).where(cls.id == discussion_id).scalar_subquery()
+        chain = db.select(cls.id, cls.parent_id, db.literal(1).label('distance'))\
+                  .where(cls.id == start)\
+                  .cte('thread_ancestors', recursive=True)
+        return chain.union_all(
+            db.select(cls.id, cls.parent_id, chain.c.distance + 1).where(cls.id == chain.c.parent_id)
+        )
+    
+    def get_thread_root(self):
+        """Top-level discussion of this thread (self for top-level discussions), in one query"""
+        if not self.parent_id:
+            return self
+        chain = Discussion.ancestors_cte(self.id)
+        return Discussion.query.join(chain, chain.c.id == Discussion.id)\
+                               .filter(chain.c.parent_id.is_(None)).one()
+    
     def get_reply_count(self):
         """Get total number of replies (including nested)"""
-        def count_recursive(discussion_id):
-            direct_replies = Discussion.query.filter_by(parent_id=discussion_id, is_hidden=False).count()
-            total = direct_replies
-            for reply in Discussion.query.filter_by(parent_id=discussion_id, is_hidden=False).all():
-                total += count_recursive(reply.id)
-            return total
-        
-        return count_recursive(self.id)
+        return self.descendant_reply_count or 0
     
     def get_like_count(self):
         """Get number of likes"""
-        return len([like for like in self.likes if like.is_like])
+        return self.like_count or 0
     
     def get_dislike_count(self):
         """Get number of dislikes"""
-        return len([like for like in self.likes if not like.is_like])
+        return self.dislike_count or 0
     
     def get_user_reaction(self, user_id):
         """Get user's reaction (like/dislike/none)"""
+        if self._prefetched is not None and self._prefetched['viewer_id'] == user_id:
+            return self._prefetched['viewer_reaction']
+        
         like = DiscussionLike.query.filter_by(
             discussion_id=self.id,
             user_id=user_id
@@ -1502,6 +1574,9 @@ class Discussion(db.Model):
     
     def is_reported_by_user(self, user_id):
         """Check if user has reported this discussion"""
+        if self._prefetched is not None and self._prefetched['viewer_id'] == user_id:
+            return self._prefetched['viewer_reported']
+        
         return DiscussionReport.query.filter_by(
             discussion_id=self.id,
             reporter_id=user_id
@@ -1509,25 +1584,29 @@ class Discussion(db.Model):
     
     def get_thread_depth(self):
         """Get the depth of this discussion in the thread"""
-        depth = 0
-        current = self
-        while current.parent_id:
-            depth += 1
-            current = current.parent
-        return depth
+        if self._prefetched is not None:
+            return self._prefetched['depth']
+        if not self.parent_id:
+            return 0
+        
+        chain = Discussion.ancestors_cte(self.id)
+        return db.session.scalar(db.select(db.func.count()).select_from(chain))
     
     def can_user_edit(self, user_id):
         """Check if user can edit this discussion"""
         if self.user_id == user_id:
             return True
         
+        if self._prefetched is not None and self._prefetched['viewer_id'] == user_id:
+            return self.can_viewer_moderate()
+        
         # Check if user is group admin/moderator
         if self.group_id:
             member = GroupMember.query.filter_by(
                 group_id=self.group_id,
                 user_id=user_id
             ).first()
-            return member and member.role in ['admin', 'moderator']
+            return member is not None and member.role in ['admin', 'moderator']
         
         return False
     
@@ -1537,15 +1616,24 @@ class Discussion(db.Model):
     
     def can_user_pin(self, user_id):
         """Check if user can pin this discussion"""
+        if self._prefetched is not None and self._prefetched['viewer_id'] == user_id:
+            return self.can_viewer_moderate()
+        
         if self.group_id:
             member = GroupMember.query.filter_by(
                 group_id=self.group_id,
                 user_id=user_id
             ).first()
-            return member and member.role in ['admin', 'moderator']
+            return member is not None and member.role in ['admin', 'moderator']
         
         return False
     
+    def can_viewer_moderate(self):
+        """Whether the prefetched viewer is a group admin/moderator, as a bool like the GroupMember lookups"""
+        if not self.group_id:
+            return False
+        return self._prefetched['viewer_role'] in ('admin', 'moderator')
+    
     def get_formatted_message(self):
         """Get message with spoiler tags formatted"""
         if self.has_spoilers:
@@ -1708,78 +1796,6 @@ class DiscussionNotification(db.Model):
         }
 
 
-class DiscussionSearch(db.Model):
-    """Search index for discussions (simplified full-text search)"""
-    
-    id = db.Column(db.Integer, primary_key=True)
-    discussion_id = db.Column(db.Integer, db.ForeignKey('discussion.id'), nullable=False)
-    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=True)
-    group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=True)
-    search_text = db.Column(db.Text, nullable=False)  # Preprocessed searchable text
-    
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Relationships
-    discussion = db.relationship('Discussion', backref=db.backref('search_index', uselist=False, cascade='all, delete-orphan'))
-    content = db.relationship('Content', backref='discussion_searches')
-    group = db.relationship('Group', backref='discussion_searches')
-    
-    def __repr__(self):
-        return f'<DiscussionSearch {self.discussion_id}>'
-    
-    @staticmethod
-    def create_or_update_for_discussion(discussion):
-        """Create or update search index for a discussion"""
-        search_entry = DiscussionSearch.query.filter_by(discussion_id=discussion.id).first()
-        
-        # Create searchable text
-        search_text_parts = [discussion.message]
-        if discussion.user:
-            search_text_parts.append(discussion.user.username)
-            search_text_parts.append(discussion.user.get_full_name() or '')
-        
-        search_text = ' '.join(search_text_parts).lower()
-        
-        if search_entry:
-            search_entry.search_text = search_text
-            search_entry.updated_at = datetime.utcnow()
-        else:
-            search_entry = DiscussionSearch(
-                discussion_id=discussion.id,
-                content_id=discussion.content_id,
-                group_id=discussion.group_id,
-                search_text=search_text
-            )
-            db.session.add(search_entry)
-        
-        db.session.commit()
-        return search_entry
-    
-    @staticmethod
-    def search_discussions(query, content_id=None, group_id=None, limit=50):
-        """Search discussions by query"""
-        search_query = DiscussionSearch.query
-        
-        if content_id:
-            search_query = search_query.filter_by(content_id=content_id)
-        if group_id:
-            search_query = search_query.filter_by(group_id=group_id)
-        
-        # Simple text search (can be enhanced with full-text search later)
-        search_terms = query.lower().split()
-        for term in search_terms:
-            search_query = search_query.filter(DiscussionSearch.search_text.like(f'%{term}%'))
-        
-        search_results = search_query.limit(limit).all()
-        
-        # Return the actual discussions
-        discussion_ids = [result.discussion_id for result in search_results]
-        return Discussion.query.filter(
-            Discussion.id.in_(discussion_ids),
-            Discussion.is_hidden == False        ).order_by(Discussion.created_at.desc()).all()
-
-
 class ContentProposal(db.Model):
     """Content proposal model for group voting"""
     
@@ -2229,3 +2245,69 @@ class ProposalAnalytics(db.Model):
             'most_active_voter': self.most_active_voter.username if self.most_active_voter else None,
             'last_updated': self.last_updated.isoformat()
         }
+
+
+class SearchToken(db.Model):
+    """Edge n-gram index for typeahead search over users, groups, content and proposals
+    
+    Each row maps one word prefix of a searchable field to an entity, so prefix lookups are
+    indexed equality matches. Maintained by utils.prefix_search.
+    """
+    
+    MAX_PREFIX_LENGTH = 24
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # user, group, content, proposal
+    entity_id = db.Column(db.Integer, nullable=False)
+    prefix = db.Column(db.String(MAX_PREFIX_LENGTH), nullable=False)
+    score = db.Column(db.Float, nullable=False)  # Field weight, doubled when the prefix is a whole word
+    
+    __table_args__ = (
+        db.Index('ix_search_token_lookup', 'entity_type', 'prefix', 'entity_id'),
+        db.Index('unique_search_token', 'entity_type', 'entity_id', 'prefix', unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<SearchToken {self.entity_type}:{self.entity_id} {self.prefix}>'
+    
+    @staticmethod
+    def normalize_words(text):
+        """Lowercase, accent-stripped words of text"""
+        if not text:
+            return []
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+        return re.findall(r'\w+', text.lower())
+    
+    @staticmethod
+    def ranking(entity_type, query, max_terms=5):
+        """Subquery of (entity_id, score) for entities matching every word of query as a prefix
+        
+        Returns None when query has no words. Join it to the entity's query and order by score.
+        """
+        terms = list(dict.fromkeys(SearchToken.normalize_words(query)))[:max_terms]
+        if not terms:
+            return None
+        
+        matches = [
+            db.select(SearchToken.entity_id, db.func.max(SearchToken.score).label('score'))
+              .where(SearchToken.entity_type == entity_type,
+                     SearchToken.prefix == term[:SearchToken.MAX_PREFIX_LENGTH])
+              .group_by(SearchToken.entity_id).subquery(f'search_term_{index}')
+            for index, term in enumerate(terms)
+        ]
+        ranking = db.select(matches[0].c.entity_id, sum(match.c.score for match in matches).label('score'))\
+                    .select_from(matches[0])
+        for match in matches[1:]:
+            ranking = ranking.join(match, match.c.entity_id == matches[0].c.entity_id)
+        return ranking.subquery('search_ranking')
+
+
+class SearchIndexState(db.Model):
+    """Marks entity types whose pre-existing rows have been backfilled into SearchToken"""
+    
+    entity_type = db.Column(db.String(20), primary_key=True)
+    backfilled_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SearchIndexState {self.entity_type}>'
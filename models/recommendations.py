@@ -16,6 +16,9 @@ class UserPreferenceProfile(db.Model):
     # Content type preferences
     content_type_preferences = db.Column(db.Text, nullable=True)  # JSON: {type: weight}
     
+    # Running sums and counts the preferences are derived from, for incremental updates
+    preference_stats = db.Column(db.Text, nullable=True)  # JSON: {genres: {genre: [sum, count, watchlist]}, types: {...}, ratings, watchlist}
+    
     # Preference for ratings/years/duration
     preferred_rating_range = db.Column(db.String(20), default="3.0-5.0")  # "min-max"
     preferred_year_range = db.Column(db.String(20), default="2000-2025")  # "min-max"
@@ -77,6 +80,81 @@ class UserPreferenceProfile(db.Model):
         else:
             self.content_type_preferences = None
     
+    @staticmethod
+    def empty_preference_stats():
+        """Stats for a user with no ratings or watchlist items"""
+        return {'genres': {}, 'types': {}, 'ratings': 0, 'watchlist': 0}
+    
+    def get_preference_stats(self):
+        """Get running preference stats as dictionary, or None if they were never built"""
+        if self.preference_stats:
+            try:
+                return json.loads(self.preference_stats)
+            except json.JSONDecodeError:
+                return None
+        return None
+    
+    def set_preference_stats(self, stats):
+        """Set running preference stats from dictionary"""
+        self.preference_stats = json.dumps(stats) if stats is not None else None
+    
+    @staticmethod
+    def _add_to_stats(stats, genres, content_type, rating_sum=0.0, rating_count=0, watchlist_count=0):
+        """Add (or with negative values remove) one item's contribution to every genre and its type"""
+        buckets = [(stats['genres'], genre) for genre in genres] + [(stats['types'], content_type)]
+        for bucket, key in buckets:
+            entry = bucket.setdefault(key, [0.0, 0, 0])
+            entry[0] += rating_sum
+            entry[1] += rating_count
+            entry[2] += watchlist_count
+            if entry[1] <= 0 and entry[2] <= 0:
+                del bucket[key]
+            elif entry[1] <= 0:
+                entry[0] = 0.0  # Drop float residue once the last rating is gone
+    
+    def apply_rating_delta(self, genres, content_type, old_rating=None, new_rating=None):
+        """Apply a rating create (old None), edit or delete (new None) to the running stats"""
+        stats = self.get_preference_stats()
+        if old_rating is not None:
+            self._add_to_stats(stats, genres, content_type, -old_rating / 5.0, -1)
+            stats['ratings'] -= 1
+        if new_rating is not None:
+            self._add_to_stats(stats, genres, content_type, new_rating / 5.0, 1)
+            stats['ratings'] += 1
+        self.set_preference_stats(stats)
+    
+    def apply_watchlist_delta(self, genres, content_type, delta):
+        """Apply a watchlist add (+1) or removal (-1) to the running stats"""
+        stats = self.get_preference_stats()
+        self._add_to_stats(stats, genres, content_type, watchlist_count=delta)
+        stats['watchlist'] += delta
+        self.set_preference_stats(stats)
+    
+    def refresh_preferences_from_stats(self, watchlist_weight=0.6):
+        """Derive genre/type preferences and confidence from the running stats
+        
+        Ratings contribute their average weight; each watchlist item then moves the
+        preference halfway towards watchlist_weight, so the order items arrive in does not matter.
+        """
+        stats = self.get_preference_stats() or self.empty_preference_stats()
+        
+        def derive(bucket):
+            preferences = {}
+            for key, (rating_sum, rating_count, watchlist_count) in bucket.items():
+                preference = rating_sum / rating_count if rating_count > 0 else None
+                if watchlist_count > 0:
+                    preference = watchlist_weight if preference is None else (
+                        watchlist_weight + (preference - watchlist_weight) / 2 ** watchlist_count
+                    )
+                if preference is not None:
+                    preferences[key] = preference
+            return preferences
+        
+        self.set_genre_preferences(derive(stats['genres']))
+        self.set_content_type_preferences(derive(stats['types']))
+        self.confidence_score = min(1.0, (stats['ratings'] * 0.7 + stats['watchlist'] * 0.3) / 20)
+        self.last_updated = datetime.utcnow()
+    
     def get_preferred_languages(self):
         """Get preferred languages as list"""
         if self.preferred_languages:
@@ -229,6 +307,14 @@ class Recommendation(db.Model):
     content = db.relationship('Content', backref='recommendations')
     feedback = db.relationship('RecommendationFeedback', backref='recommendation', cascade='all, delete-orphan')
     
+    # At most one active recommendation per user/group and content (partial unique indexes)
+    __table_args__ = (
+        db.Index('uq_active_user_recommendation', 'user_id', 'content_id', unique=True,
+                 sqlite_where=db.text("status = 'active'"), postgresql_where=db.text("status = 'active'")),
+        db.Index('uq_active_group_recommendation', 'group_id', 'content_id', unique=True,
+                 sqlite_where=db.text("status = 'active'"), postgresql_where=db.text("status = 'active'")),
+    )
+    
     def __repr__(self):
         target = self.user.username if self.user else self.group.name
         return f'<Recommendation {target}: {self.content.title} ({self.score:.2f})>'
@@ -815,3 +901,73 @@ class SocialRecommendationInsight(db.Model):
         """Dismiss insight"""
         self.dismissed_at = datetime.utcnow()
         self.status = 'dismissed'
+
+
+class ContentSimilarity(db.Model):
+    """Precomputed item-to-item neighbours used for similar content lookups"""
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False)
+    similar_content_id = db.Column(db.Integer, db.ForeignKey('content.id'), nullable=False)
+    
+    # Similarity scores
+    score = db.Column(db.Float, nullable=False)  # Blended score used for ranking
+    rating_similarity = db.Column(db.Float, default=0.0)  # Cosine over co-ratings
+    genre_similarity = db.Column(db.Float, default=0.0)  # Jaccard overlap of genres
+    rank = db.Column(db.Integer, nullable=False)  # 1 = most similar
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    content = db.relationship('Content', foreign_keys=[content_id])
+    similar_content = db.relationship('Content', foreign_keys=[similar_content_id])
+    
+    # Unique constraint and lookup index
+    __table_args__ = (
+        db.UniqueConstraint('content_id', 'similar_content_id', name='unique_content_similarity'),
+        db.Index('ix_content_similarity_lookup', 'content_id', 'rank'),
+    )
+    
+    def __repr__(self):
+        return f'<ContentSimilarity {self.content_id}->{self.similar_content_id} ({self.score:.2f})>'
+    
+    @staticmethod
+    def get_similar_content(content_id, limit=6):
+        """Get the most similar active content for an item from the index"""
+        from models import Content
+        return Content.query.join(
+            ContentSimilarity, ContentSimilarity.similar_content_id == Content.id
+        ).filter(
+            ContentSimilarity.content_id == content_id,
+            Content.status == 'active'
+        ).order_by(ContentSimilarity.rank).limit(limit).all()
+
+
+class ContentSimilarityState(db.Model):
+    """Per-item watermark of the ratings the similarity index was last built from
+    
+    One row per indexed item, including items with no neighbours, so refreshes can tell
+    new, edited and deleted ratings apart from items that are simply up to date.
+    """
+    
+    content_id = db.Column(db.Integer, db.ForeignKey('content.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)  # Ratings seen at build time
+    built_at = db.Column(db.DateTime, nullable=False)  # Taken before ratings were read
+    
+    def __repr__(self):
+        return f'<ContentSimilarityState {self.content_id} ({self.rating_count} ratings)>'
+
+
+class RecommendationCacheVersion(db.Model):
+    """Per-target invalidation counter shared by every worker's in-process recommendation caches
+    
+    Cached profiles and candidates remember the version they were built at and are dropped
+    once it moves, so a rating handled by one worker invalidates the caches of all of them.
+    """
+    
+    target_type = db.Column(db.String(10), primary_key=True)  # 'user' or 'group'
+    target_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<RecommendationCacheVersion {self.target_type} {self.target_id} v{self.version}>'
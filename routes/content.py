@@ -1,12 +1,16 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
-from models import db, Content, Platform, ContentPlatform, UserWatchlist, ContentRating
+from models import db, Content, Platform, ContentPlatform, UserWatchlist, ContentRating, ContentSimilarity
 from forms import ContentSearchForm, ContentRatingForm
 from utils.tmdb_api import TMDBService
+from utils.exclusion_index import exclude_content, invalidate_exclusions
+from utils.recommendation_engine import apply_rating_change, apply_watchlist_change
+from utils.recommendation_cache import invalidate_user_cache
+from utils.tmdb_importer import is_content_fresh, refresh_content_in_background
 from sqlalchemy import or_, and_, desc, asc
+from sqlalchemy.orm import aliased, contains_eager
 import json
 import os
-import requests
 
 content = Blueprint('content', __name__, url_prefix='/content')
 
@@ -18,59 +22,54 @@ def index():
         search_query = request.args.get('search', '').strip()
         content_type = request.args.get('type', 'movie')
         page = request.args.get('page', 1, type=int)
+        genre_filter = request.args.get('genre', '').strip()
         
+        # Bounded by the page deadline; past it, the last cached page is shown instead.
+        # Genre lists are fetched alongside so cards get genre names without per-title calls.
         if search_query:
-            results = tmdb.search_content(search_query, 'multi', page)
+            fetch = lambda service: service.search_content(search_query, 'multi', page)
+        elif genre_filter:
+            # TMDB filters by genre server-side, so pages and totals cover the whole genre
+            def fetch(service):
+                genre_ids = [genre_id for genre_id, name in service.get_genre_map(content_type).items()
+                             if name == genre_filter]
+                if not genre_ids:
+                    return {'results': [], 'total_pages': 1, 'total_results': 0}
+                return service.discover_content(content_type, genre_ids[0], page)
         else:
-            results = tmdb.get_popular_content(content_type, page)
+            fetch = lambda service: service.get_popular_content(content_type, page)
+        fetched = tmdb.fan_out({
+            'results': fetch,
+            'movie_genres': lambda service: service.get_genre_map('movie'),
+            'tv_genres': lambda service: service.get_genre_map('tv')
+        })
+        results = fetched['results']
+        genre_options = sorted(set(fetched['tv_genres' if content_type == 'tv' else 'movie_genres'].values()))
         
+        # Search has no genre parameter, so a genre only narrows the fetched page
+        filter_page = bool(search_query and genre_filter)
         content_items = []
         if results and 'results' in results:
             for item in results['results']:
-                item_type = item.get('media_type', content_type)
-                if item_type == 'tv':
-                    item_type = 'tv_show'
-                elif item_type == 'person':
-                    continue
-                
-                title = item.get('title') or item.get('name', '')
-                release_date = item.get('release_date') or item.get('first_air_date', '')
-                year = None
-                if release_date:
-                    try:
-                        year = int(release_date.split('-')[0])
-                    except:
-                        pass
-                
-                # Build poster URL
-                poster_url = None
-                if item.get('poster_path'):
-                    poster_url = f"https://image.tmdb.org/t/p/w500{item['poster_path']}"
-                
-                content_items.append({
-                    'tmdb_id': item['id'],
-                    'title': title,
-                    'description': item.get('overview', ''),
-                    'type': item_type,
-                    'year': year,
-                    'rating': item.get('vote_average'),
-                    'poster_url': poster_url,
-                    'genre': None  # Will be populated in detail view
-                })
+                card = tmdb.transform_list_item(item, content_type)
+                if card and (not filter_page or genre_filter in card['genres']):
+                    content_items.append(card)
         
-        # Pagination info
-        total_pages = results.get('total_pages', 1) if results else 1
-        total_results = results.get('total_results', 0) if results else 0
+        # Pagination info; hidden when the page was filtered locally, as TMDB's totals would not match
+        total_pages = results.get('total_pages', 1) if results and not filter_page else 1
+        total_results = results.get('total_results', 0) if results and not filter_page else 0
         
         # Get current filters for template
         current_filters = {
             'search': search_query,
-            'type': content_type
+            'type': content_type,
+            'genre': genre_filter
         }
         
         return render_template('content/browse.html',
                              content_items=content_items,
                              current_filters=current_filters,
+                             genre_options=genre_options,
                              page=page,
                              total_pages=min(total_pages, 500),  # TMDB limit
                              total_results=total_results,
@@ -80,7 +79,8 @@ def index():
         current_app.logger.error(f"Error in content index: {e}")
         return render_template('content/browse.html',
                              content_items=[],
-                             current_filters={'search': '', 'type': 'movie'},
+                             current_filters={'search': '', 'type': 'movie', 'genre': ''},
+                             genre_options=[],
                              page=1,
                              total_pages=1,
                              total_results=0,
@@ -89,87 +89,89 @@ def index():
 
 @content.route('/<int:tmdb_id>')
 @content.route('/<int:tmdb_id>/<content_type>')
-def detail(tmdb_id, content_type='movie'):
-    """Content detail page using TMDB API"""
+def detail(tmdb_id, content_type=None):
+    """Content detail page, served from the local catalog when possible and from TMDB otherwise"""
     try:
+        # Local-first: one query for the stored title, the viewer's watchlist status and rating, and the latest reviews
+        user_id = current_user.id if current_user.is_authenticated else None
+        watchlist_status_query = db.session.query(UserWatchlist.status).filter(
+            UserWatchlist.content_id == Content.id, UserWatchlist.user_id == user_id
+        ).limit(1).scalar_subquery()
+        user_rating_query = db.session.query(ContentRating.rating).filter(
+            ContentRating.content_id == Content.id, ContentRating.user_id == user_id
+        ).limit(1).scalar_subquery()
+        latest_reviews = ContentRating.query.filter(
+            ContentRating.content_id.in_(db.session.query(Content.id).filter(Content.tmdb_id == tmdb_id)),
+            ContentRating.review_text.isnot(None),
+            ContentRating.is_public == True
+        ).order_by(desc(ContentRating.created_at)).limit(5).subquery()
+        review = aliased(ContentRating, latest_reviews)
+        local_rows = db.session.query(Content, watchlist_status_query, user_rating_query, review)\
+                               .filter(Content.tmdb_id == tmdb_id)\
+                               .outerjoin(review, review.content_id == Content.id)\
+                               .outerjoin(review.user).options(contains_eager(review.user))\
+                               .order_by(desc(review.created_at)).all()
+        
+        local_content, watchlist_status, user_rating = local_rows[0][:3] if local_rows else (None, None, None)
+        reviews = [row[3] for row in local_rows if row[3] is not None]
+        content_details = None
+        
+        if local_content:
+            local_type = 'tv' if local_content.type == 'tv_show' else 'movie'
+            if content_type in (None, local_type):
+                content_type = local_type
+                content_details = local_content.to_tmdb_details()
+                if not is_content_fresh(local_content):
+                    refresh_content_in_background(current_app._get_current_object(), tmdb_id, content_type)
+        
+        content_type = content_type or 'movie'
+        
         # Initialize TMDB service
         try:
             tmdb = TMDBService()
         except Exception as tmdb_error:
-            current_app.logger.error(f"TMDB Service initialization error: {tmdb_error}")
-            flash('Movie database service is currently unavailable', 'error')
-            return redirect(url_for('content.index'))
-        
-        # Get content details from TMDB
-        content_details = tmdb.get_content_details(tmdb_id, content_type)
-        if not content_details:
-            # Try the other content type
-            alt_type = 'tv' if content_type == 'movie' else 'movie'
-            content_details = tmdb.get_content_details(tmdb_id, alt_type)
-            if content_details:
-                content_type = alt_type
+            if not content_details:
+                current_app.logger.error(f"TMDB Service initialization error: {tmdb_error}")
+                flash('Movie database service is currently unavailable', 'error')
+                return redirect(url_for('content.index'))
+            tmdb = None
         
         if not content_details:
-            flash('Content not found', 'error')
-            return redirect(url_for('content.index'))
+            # Get content details from TMDB, probing the other content type concurrently
+            content_details, content_type = tmdb.find_content_details(tmdb_id, content_type)
+            
+            if not content_details:
+                flash('Content not found', 'error')
+                return redirect(url_for('content.index'))
         
         # Add TMDB ID to content details
         content_details['tmdb_id'] = tmdb_id
         content_details['content_type'] = content_type
         
-        # Get user's watchlist status if logged in
-        watchlist_status = None
-        user_rating = None
-        if current_user.is_authenticated:
-            # Check if content exists in our database
-            from models import Content as LocalContent
-            local_content = LocalContent.query.filter_by(tmdb_id=tmdb_id).first()
-            
-            if local_content:
-                watchlist_item = UserWatchlist.query.filter_by(
-                    user_id=current_user.id,
-                    content_id=local_content.id
-                ).first()
-                if watchlist_item:
-                    watchlist_status = watchlist_item.status
-                
-                user_rating_item = ContentRating.query.filter_by(
-                    user_id=current_user.id,
-                    content_id=local_content.id
-                ).first()
-                if user_rating_item:
-                    user_rating = user_rating_item.rating
-        
-        # Get similar content recommendations
+        # Get similar content: precomputed local neighbours for stored titles, TMDB's (cached) similar list otherwise.
+        # Stored titles never wait on TMDB here; one without neighbours renders without the block.
         recommendations = []
-        try:
-            # Get similar movies/shows from TMDB
-            endpoint = f"https://api.themoviedb.org/3/{content_type}/{tmdb_id}/similar"
-            params = {'api_key': tmdb.api_key, 'page': 1}
-            response = requests.get(endpoint, params=params)
-            if response.status_code == 200:
-                similar_data = response.json()
-                for item in similar_data.get('results', [])[:6]:
-                    recommendations.append({
-                        'tmdb_id': item['id'],
-                        'title': item.get('title') or item.get('name', ''),
-                        'poster_url': f"https://image.tmdb.org/t/p/w300{item['poster_path']}" if item.get('poster_path') else None,
-                        'type': content_type
-                    })
-        except:
-            pass
-        
-        # Get reviews from our local database if content exists
-        reviews = []
-        local_content = None
-        from models import Content as LocalContent
-        local_content = LocalContent.query.filter_by(tmdb_id=tmdb_id).first()
         if local_content:
-            reviews = ContentRating.query.filter_by(content_id=local_content.id)\
-                                        .filter(ContentRating.review_text.isnot(None))\
-                                        .filter(ContentRating.is_public == True)\
-                                        .order_by(desc(ContentRating.created_at))\
-                                        .limit(5).all()
+            neighbours = db.session.query(Content.tmdb_id, Content.title, Content.poster_url, Content.type)\
+                                   .join(ContentSimilarity, ContentSimilarity.similar_content_id == Content.id)\
+                                   .filter(ContentSimilarity.content_id == local_content.id,
+                                           Content.tmdb_id.isnot(None))\
+                                   .order_by(ContentSimilarity.rank).limit(6).all()
+            for neighbour_tmdb_id, title, poster_url, neighbour_type in neighbours:
+                recommendations.append({
+                    'tmdb_id': neighbour_tmdb_id,
+                    'title': title,
+                    'poster_url': poster_url,
+                    'type': 'tv' if neighbour_type == 'tv_show' else 'movie'
+                })
+        
+        elif tmdb:
+            similar_data = tmdb.fan_out({
+                'similar': lambda service: service.get_similar_content(tmdb_id, content_type)
+            })['similar']
+            for item in (similar_data or {}).get('results', [])[:6]:
+                card = tmdb.transform_list_item(item, content_type, poster_size='w300')
+                recommendations.append(dict(card, type=content_type))  # Detail URLs take 'movie'/'tv'
         
         return render_template('content/detail_tmdb.html',
                              content=content_details,
@@ -200,34 +202,10 @@ def search():
         search_results = []
         if results and 'results' in results:
             for item in results['results'][:10]:  # Limit to 10 results
-                # Skip person results
-                if item.get('media_type') == 'person':
-                    continue
-                
-                title = item.get('title') or item.get('name', '')
-                year = None
-                release_date = item.get('release_date') or item.get('first_air_date', '')
-                if release_date:
-                    try:
-                        year = int(release_date.split('-')[0])
-                    except:
-                        pass
-                
-                content_type = item.get('media_type', 'movie')
-                if content_type == 'tv':
-                    content_type = 'tv_show'
-                
-                poster_url = None
-                if item.get('poster_path'):
-                    poster_url = f"https://image.tmdb.org/t/p/w200{item['poster_path']}"
-                
-                search_results.append({
-                    'tmdb_id': item['id'],
-                    'title': title,
-                    'year': year,
-                    'type': content_type,
-                    'poster_url': poster_url
-                })
+                card = tmdb.transform_list_item(item, poster_size='w200')
+                if card:  # Skip person results
+                    search_results.append({key: card[key] for key in
+                                           ('tmdb_id', 'title', 'year', 'type', 'poster_url', 'genres')})
         
         return jsonify(search_results)
     except Exception as e:
@@ -308,6 +286,14 @@ def toggle_watchlist():
                 action = 'none'
         
         db.session.commit()
+        if action == 'added':
+            exclude_content([local_content.id], user_id=current_user.id)
+            apply_watchlist_change(current_user.id, local_content, 1)
+            invalidate_user_cache(current_user.id)
+        elif action == 'removed':
+            invalidate_exclusions(user_id=current_user.id)
+            apply_watchlist_change(current_user.id, local_content, -1)
+            invalidate_user_cache(current_user.id)
         return jsonify({'success': True, 'action': action})
         
     except Exception as e:
@@ -342,6 +328,7 @@ def rate_content():
         content_id=content_id
     ).first()
     
+    old_rating = existing_rating.rating if existing_rating else None
     if existing_rating:
         existing_rating.rating = rating
         existing_rating.review = review if review else None
@@ -356,6 +343,9 @@ def rate_content():
     
     try:
         db.session.commit()
+        exclude_content([content_item.id], user_id=current_user.id)
+        apply_rating_change(current_user.id, content_item, old_rating, rating)
+        invalidate_user_cache(current_user.id)
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
@@ -519,31 +509,15 @@ def get_unique_content_types():
     types = db.session.query(Content.type).distinct().all()
     return sorted([type_[0] for type_ in types])
 
+def get_similar_content(content_item, limit=5):
+    """Get similar content from the precomputed item-item similarity index"""
+    return ContentSimilarity.get_similar_content(content_item.id, limit=limit)
+
 def get_content_recommendations(content_item, limit=6):
     """Get content recommendations based on current content"""
-    recommendations = []
-    
-    # Simple content-based recommendations
-    # 1. Same genre
-    if content_item.genre:
-        same_genre = Content.query.filter(
-            Content.genre.ilike(f'%{content_item.get_genres()[0] if content_item.get_genres() else ""}%'),
-            Content.id != content_item.id,
-            Content.status == 'active'
-        ).limit(3).all()
-        recommendations.extend(same_genre)
-    
-    # 2. Same type and similar year
-    if content_item.year and len(recommendations) < limit:
-        similar_year = Content.query.filter(
-            Content.type == content_item.type,
-            Content.year.between(content_item.year - 5, content_item.year + 5),
-            Content.id != content_item.id,
-            Content.status == 'active'
-        ).filter(~Content.id.in_([r.id for r in recommendations])).limit(limit - len(recommendations)).all()
-        recommendations.extend(similar_year)
+    recommendations = get_similar_content(content_item, limit=limit)
     
-    # 3. Fill remaining with high-rated content
+    # Items imported since the last index refresh fall back to high-rated content
     if len(recommendations) < limit:
         high_rated = Content.query.filter(
             Content.rating >= 7.0,
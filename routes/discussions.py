@@ -6,8 +6,11 @@ import re
 
 from app import db
 from models import (Discussion, DiscussionLike, DiscussionReport, DiscussionNotification,
-                   DiscussionSearch, Content, Group, GroupMember, User)
+                   Content, Group, GroupMember, User)
 from forms import DiscussionForm, ReportDiscussionForm
+from utils.discussion_threads import (load_thread, prefetch_discussions, serialize_discussions, serialize_thread,
+                                      apply_reply_change, apply_reaction_change, set_discussion_hidden)
+from utils.discussion_search import search_discussions as search_discussion_index
 
 discussion_bp = Blueprint('discussion', __name__, url_prefix='/discussions')
 
@@ -30,8 +33,9 @@ def content_discussions(content_id):
     # Apply sorting
     if sort_by == 'popular':
         # Sort by like count and reply count
-        query = query.outerjoin(DiscussionLike).group_by(Discussion.id).order_by(
-            desc(db.func.count(DiscussionLike.id.distinct())),
+        query = query.order_by(
+            desc(Discussion.like_count),
+            desc(Discussion.descendant_reply_count),
             desc(Discussion.created_at)
         )
     elif sort_by == 'oldest':
@@ -50,6 +54,7 @@ def content_discussions(content_id):
     discussions = query.paginate(
         page=page, per_page=per_page, error_out=False
     )
+    prefetch_discussions(discussions.items + pinned_discussions, current_user.id)
     
     form = DiscussionForm()
     
@@ -86,8 +91,9 @@ def group_discussions(group_id):
     
     # Apply sorting
     if sort_by == 'popular':
-        query = query.outerjoin(DiscussionLike).group_by(Discussion.id).order_by(
-            desc(db.func.count(DiscussionLike.id.distinct())),
+        query = query.order_by(
+            desc(Discussion.like_count),
+            desc(Discussion.descendant_reply_count),
             desc(Discussion.created_at)
         )
     elif sort_by == 'oldest':
@@ -106,6 +112,7 @@ def group_discussions(group_id):
     discussions = query.paginate(
         page=page, per_page=per_page, error_out=False
     )
+    prefetch_discussions(discussions.items + pinned_discussions, current_user.id)
     
     form = DiscussionForm()
     
@@ -134,29 +141,10 @@ def view_thread(discussion_id):
             abort(403)
     
     # Get the root discussion if this is a reply
-    root_discussion = discussion
-    while root_discussion.parent_id:
-        root_discussion = root_discussion.parent
+    root_discussion = discussion.get_thread_root()
     
-    # Get all replies in thread order
-    def get_thread_replies(parent_id, depth=0):
-        replies = Discussion.query.filter_by(
-            parent_id=parent_id,
-            is_hidden=False
-        ).order_by(Discussion.created_at.asc()).all()
-        
-        thread_data = []
-        for reply in replies:
-            reply_data = {
-                'discussion': reply,
-                'depth': depth,
-                'replies': get_thread_replies(reply.id, depth + 1)
-            }
-            thread_data.append(reply_data)
-        
-        return thread_data
-    
-    thread_replies = get_thread_replies(root_discussion.id)
+    # Get all replies in thread order, with counts and the viewer's reactions prefetched
+    thread_replies = load_thread(root_discussion, current_user.id)
     
     form = DiscussionForm()
     
@@ -203,11 +191,10 @@ def create_discussion():
         )
         
         db.session.add(discussion)
+        db.session.flush()
+        apply_reply_change(discussion, 1)
         db.session.commit()
         
-        # Create search index
-        DiscussionSearch.create_or_update_for_discussion(discussion)
-        
         # Create notifications
         create_discussion_notifications(discussion)
         
@@ -241,9 +228,6 @@ def edit_discussion(discussion_id):
         
         db.session.commit()
         
-        # Update search index
-        DiscussionSearch.create_or_update_for_discussion(discussion)
-        
         flash('Discussion updated successfully!', 'success')
         return redirect(url_for('discussion.view_thread', discussion_id=discussion_id))
     
@@ -269,7 +253,7 @@ def delete_discussion(discussion_id):
     parent_id = discussion.parent_id
     
     # Instead of hard delete, mark as hidden
-    discussion.is_hidden = True
+    set_discussion_hidden(discussion, True)
     db.session.commit()
     
     flash('Discussion deleted successfully.', 'success')
@@ -277,10 +261,8 @@ def delete_discussion(discussion_id):
     # Redirect appropriately
     if parent_id:
         # If this was a reply, go back to the parent thread
-        parent = Discussion.query.get(parent_id)
-        while parent.parent_id:
-            parent = parent.parent
-        return redirect(url_for('discussion.view_thread', discussion_id=parent.id))
+        root = discussion.get_thread_root()
+        return redirect(url_for('discussion.view_thread', discussion_id=root.id))
     elif content_id:
         return redirect(url_for('discussion.content_discussions', content_id=content_id))
     else:
@@ -321,11 +303,15 @@ def toggle_like(discussion_id, action):
         user_id=current_user.id
     ).first()
     
+    old_is_like = existing_like.is_like if existing_like else None
+    
     if action == 'remove':
         if existing_like:
             db.session.delete(existing_like)
+        apply_reaction_change(discussion_id, old_is_like, None)
     else:
         is_like = action == 'like'
+        apply_reaction_change(discussion_id, old_is_like, is_like)
         
         if existing_like:
             existing_like.is_like = is_like
@@ -411,30 +397,26 @@ def search_discussions():
     discussions = []
     
     if query:
-        # Use the search index
-        all_results = DiscussionSearch.search_discussions(
-            query=query,
+        # Ranked full-text search; the index is kept in sync by database triggers
+        discussions, total = search_discussion_index(
+            query,
             content_id=content_id,
             group_id=group_id,
-            limit=200
+            limit=per_page,
+            offset=(page - 1) * per_page
         )
         
-        # Paginate results
-        start = (page - 1) * per_page
-        end = start + per_page
-        discussions = all_results[start:end]
-        
         # Create pagination object
         has_prev = page > 1
-        has_next = end < len(all_results)
+        has_next = page * per_page < total
         pagination = {
             'has_prev': has_prev,
             'has_next': has_next,
             'prev_num': page - 1 if has_prev else None,
             'next_num': page + 1 if has_next else None,
             'page': page,
-            'pages': (len(all_results) + per_page - 1) // per_page,
-            'total': len(all_results)
+            'pages': (total + per_page - 1) // per_page,
+            'total': total
         }
     else:
         pagination = None
@@ -474,10 +456,7 @@ def api_recent_content_discussions(content_id):
     
     discussions = query.order_by(desc(Discussion.created_at)).limit(limit).all()
     
-    return jsonify([
-        discussion.to_dict(user_id=current_user.id) 
-        for discussion in discussions
-    ])
+    return jsonify(serialize_discussions(discussions, current_user.id))
 
 
 @discussion_bp.route('/api/recent/group/<int:group_id>')
@@ -506,10 +485,7 @@ def api_recent_group_discussions(group_id):
     
     discussions = query.order_by(desc(Discussion.created_at)).limit(limit).all()
     
-    return jsonify([
-        discussion.to_dict(user_id=current_user.id) 
-        for discussion in discussions
-    ])
+    return jsonify(serialize_discussions(discussions, current_user.id))
 
 
 @discussion_bp.route('/api/thread/<int:discussion_id>')
@@ -526,7 +502,7 @@ def api_thread(discussion_id):
         if not group.is_member(current_user.id):
             abort(403)
     
-    return jsonify(discussion.to_dict(include_replies=True, user_id=current_user.id))
+    return jsonify(serialize_thread(discussion, current_user.id))
 
 
 @discussion_bp.route('/api/notifications')
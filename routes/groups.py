@@ -5,9 +5,11 @@ groups = Blueprint('groups', __name__)
 from flask import render_template, request, flash, redirect, url_for, jsonify, abort
 from flask_login import login_required, current_user
 from app import db
-from models import Group, GroupMember, User
+from models import Group, GroupMember, User, SearchToken
 from forms import CreateGroupForm, EditGroupForm, JoinGroupForm, LeaveGroupForm, SearchGroupsForm, ManageMemberForm, DeleteGroupForm
 from datetime import datetime
+from utils.exclusion_index import exclude_content
+from utils.recommendation_cache import invalidate_group_cache
 
 @groups.route('/groups')
 def discover_groups():
@@ -18,13 +20,12 @@ def discover_groups():
     query = Group.query.filter_by(privacy_level='public')
     
     if search_query:
-        search_pattern = f"%{search_query}%"
-        query = query.filter(
-            db.or_(
-                Group.name.ilike(search_pattern),
-                Group.description.ilike(search_pattern)
-            )
-        )
+        # Indexed word-prefix match, best match first
+        ranking = SearchToken.ranking('group', search_query)
+        if ranking is None:
+            query = query.filter(db.false())
+        else:
+            query = query.join(ranking, ranking.c.entity_id == Group.id).order_by(ranking.c.score.desc())
     
     # Paginate results
     groups_pagination = query.order_by(Group.created_at.desc()).paginate(
@@ -188,6 +189,7 @@ def join_group(group_id):
             
             db.session.add(membership)
             db.session.commit()
+            invalidate_group_cache(group_id)
             
             flash(f'Successfully joined "{group.name}"!', 'success')
             
@@ -224,6 +226,7 @@ def leave_group(group_id):
         try:
             db.session.delete(membership)
             db.session.commit()
+            invalidate_group_cache(group_id)
             
             flash(f'You have left "{group.name}".', 'info')
             return redirect(url_for('groups.discover_groups'))
@@ -378,6 +381,7 @@ def manage_member(group_id, user_id):
                     flash(message, 'warning')
             
             db.session.commit()
+            invalidate_group_cache(group_id)
             
         except Exception as e:
             db.session.rollback()
@@ -400,6 +404,7 @@ def delete_group(group_id):
             group_name = group.name
             db.session.delete(group)
             db.session.commit()
+            invalidate_group_cache(group_id)
             
             flash(f'Group "{group_name}" has been deleted.', 'info')
             return redirect(url_for('groups.discover_groups'))
@@ -493,7 +498,7 @@ def add_from_tmdb_to_group(group_id):
                 director=content_details.get('director'),
                 cast=', '.join(content_details.get('cast', [])),
                 country=content_details.get('country'),
-                language=content_details.get('language'),
+                language=content_details['language'].upper() if content_details.get('language') else None,
                 status='active'
             )
             db.session.add(local_content)
@@ -513,6 +518,7 @@ def add_from_tmdb_to_group(group_id):
         )
         db.session.add(watchlist_item)
         db.session.commit()
+        exclude_content([local_content.id], group_id=group_id)
         logging.info(f"Added content {local_content.id} to group {group_id} by user {current_user.id}")
         return jsonify({'success': True, 'message': 'Added to group watchlist.'})
     except Exception as e:
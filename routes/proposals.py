@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort
 from flask_login import login_required, current_user
 from app import db
-from models import Group, GroupMember, User, Content, ContentProposal, ProposalVote, ProposalAnalytics, Discussion
+from models import Group, GroupMember, User, Content, ContentProposal, ProposalVote, ProposalAnalytics, Discussion, SearchToken
 from forms import (ContentProposalForm, EditProposalForm, VoteProposalForm, 
                   ProposalFilterForm, ProposalSearchForm, ProposalActionForm, ProposalSettingsForm)
 from datetime import datetime, timedelta
@@ -51,14 +51,12 @@ def group_proposals(group_id):
             query = query.filter_by(proposer_id=proposer_user.id)
     
     if search_query:
-        search_pattern = f"%{search_query}%"
-        query = query.filter(
-            or_(
-                ContentProposal.title.ilike(search_pattern),
-                ContentProposal.description.ilike(search_pattern),
-                ContentProposal.reason.ilike(search_pattern)
-            )
-        )
+        # Indexed word-prefix match; the chosen sort order still applies
+        ranking = SearchToken.ranking('proposal', search_query)
+        if ranking is None:
+            query = query.filter(db.false())
+        else:
+            query = query.join(ranking, ranking.c.entity_id == ContentProposal.id)
     
     # Apply sorting
     if sort_by == 'created_desc':
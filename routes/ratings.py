@@ -4,6 +4,9 @@ from app import db
 from models import ContentRating, Content, GroupRating, ReviewHelpfulnessVote, RatingStatistics, Group, GroupMember
 from sqlalchemy import and_, desc, func
 from datetime import datetime
+from utils.exclusion_index import exclude_content, invalidate_exclusions
+from utils.recommendation_engine import apply_rating_change
+from utils.recommendation_cache import invalidate_user_cache
 
 ratings_bp = Blueprint('ratings', __name__)
 
@@ -28,6 +31,7 @@ def rate_content(content_id):
             return redirect(url_for('ratings.rate_content', content_id=content_id))
         
         try:
+            old_rating = existing_rating.rating if existing_rating else None
             if existing_rating:
                 # Update existing rating
                 existing_rating.rating = rating_value
@@ -50,6 +54,9 @@ def rate_content(content_id):
                 flash('Your rating has been saved!', 'success')
             
             db.session.commit()
+            exclude_content([content_id], user_id=current_user.id)
+            apply_rating_change(current_user.id, content, old_rating, rating_value)
+            invalidate_user_cache(current_user.id)
             
             # Update statistics
             content.update_rating_statistics()
@@ -138,6 +145,7 @@ def edit_rating(rating_id):
             return render_template('ratings/edit_rating.html', rating=rating)
         
         try:
+            old_rating = rating.rating
             rating.rating = rating_value
             rating.review_text = review_text if review_text else None
             rating.is_spoiler = is_spoiler
@@ -145,6 +153,8 @@ def edit_rating(rating_id):
             rating.updated_at = datetime.utcnow()
             
             db.session.commit()
+            apply_rating_change(current_user.id, rating.content, old_rating, rating_value)
+            invalidate_user_cache(current_user.id)
             
             # Update statistics
             rating.content.update_rating_statistics()
@@ -173,11 +183,15 @@ def delete_rating(rating_id):
     
     try:
         content_id = rating.content_id
+        old_rating = rating.rating
         db.session.delete(rating)
         db.session.commit()
+        invalidate_exclusions(user_id=current_user.id)
         
         # Update statistics
         content = Content.query.get(content_id)
+        apply_rating_change(current_user.id, content, old_rating=old_rating)
+        invalidate_user_cache(current_user.id)
         content.update_rating_statistics()
         
         # Update group ratings
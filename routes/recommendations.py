@@ -11,6 +11,7 @@ from models.recommendations import (
 )
 from utils.recommendation_engine import RecommendationEngine, mark_recommendation_feedback
 from utils.social_analytics import SocialRecommendationAnalytics
+from utils.exclusion_index import invalidate_exclusions
 from datetime import datetime, timedelta
 import json
 
@@ -296,6 +297,7 @@ def dismiss_recommendation(recommendation_id):
     
     recommendation.status = 'dismissed'
     db.session.commit()
+    invalidate_exclusions(user_id=recommendation.user_id, group_id=recommendation.group_id)
     
     flash('Recommendation dismissed.', 'info')
     return redirect(url_for('recommendations.index'))
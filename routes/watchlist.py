@@ -10,11 +10,13 @@ import json
 
 from app import db
 from models import (User, Content, UserWatchlist, GroupWatchlist, Group, GroupMember, 
-                   WatchlistShare, GroupWatchlistVote)
+                   WatchlistShare, GroupWatchlistVote, SearchToken)
 from models.recommendations import Recommendation
 from forms import (AddToWatchlistForm, UpdateWatchlistForm, AddToGroupWatchlistForm, 
                   ShareWatchlistForm, CreateWatchSessionForm, WatchlistFilterForm)
-from utils.recommendation_engine import RecommendationEngine
+from utils.recommendation_engine import RecommendationEngine, apply_watchlist_change
+from utils.exclusion_index import exclude_content, invalidate_exclusions
+from utils.recommendation_cache import invalidate_user_cache
 
 watchlist_bp = Blueprint('watchlist', __name__, url_prefix='/watchlist')
 
@@ -160,6 +162,9 @@ def add_to_watchlist(content_id):
         
         db.session.add(watchlist_item)
         db.session.commit()
+        exclude_content([content_id], user_id=current_user.id)
+        apply_watchlist_change(current_user.id, content, 1)
+        invalidate_user_cache(current_user.id)
         
         flash(f'"{content.title}" has been added to your watchlist!', 'success')
         return redirect(url_for('watchlist.my_watchlist'))
@@ -192,6 +197,9 @@ def quick_add_to_watchlist(content_id):
     
     db.session.add(watchlist_item)
     db.session.commit()
+    exclude_content([content_id], user_id=current_user.id)
+    apply_watchlist_change(current_user.id, content, 1)
+    invalidate_user_cache(current_user.id)
     
     return jsonify({
         'success': True, 
@@ -256,9 +264,13 @@ def remove_from_watchlist(watchlist_id):
     if item.user_id != current_user.id:
         abort(403)
     
-    title = item.content_ref.title
+    content = item.content_ref
+    title = content.title
     db.session.delete(item)
     db.session.commit()
+    invalidate_exclusions(user_id=current_user.id)
+    apply_watchlist_change(current_user.id, content, -1)
+    invalidate_user_cache(current_user.id)
     
     flash(f'"{title}" has been removed from your watchlist.', 'info')
     return redirect(url_for('watchlist.my_watchlist'))
@@ -375,6 +387,7 @@ def add_to_group_watchlist(group_id, content_id):
         
         db.session.add(watchlist_item)
         db.session.commit()
+        exclude_content([content_id], group_id=group_id)
         
         flash(f'"{content.title}" has been added to the group watchlist!', 'success')
         return redirect(url_for('watchlist.group_watchlist', group_id=group_id))
@@ -625,14 +638,14 @@ def api_search_content():
     if not query:
         return jsonify([])
     
-    # Search content
-    results = Content.query.filter(
-        or_(
-            Content.title.ilike(f'%{query}%'),
-            Content.description.ilike(f'%{query}%')
-        ),
-        Content.status == 'active'
-    ).limit(10).all()
+    # Indexed word-prefix search, best title/description match first
+    ranking = SearchToken.ranking('content', query)
+    if ranking is None:
+        return jsonify([])
+    results = Content.query.join(ranking, ranking.c.entity_id == Content.id)\
+                           .filter(Content.status == 'active')\
+                           .order_by(ranking.c.score.desc(), Content.rating.desc())\
+                           .limit(10).all()
     
     return jsonify([{
         'id': content.id,
@@ -0,0 +1,250 @@
+"""
+Parallel batch recommendation generation for WatchTogether
+Shards users across a process pool, writes recommendations in bulk and checkpoints finished shards
+"""
+
+import os
+import json
+import hashlib
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app import create_app, db
+from utils.recommendation_engine import RecommendationEngine
+from utils.recommendation_store import (
+    insert_recommendations, insert_history, expire_recommendations, archive_overflow
+)
+from utils.exclusion_index import invalidate_exclusions
+from utils.rating_matrix import get_rating_matrix
+from utils.content_features import get_content_feature_store
+from utils.matrix_factorization import get_factor_model
+from utils.recommendation_config import Config
+from datetime import datetime, timedelta
+from typing import List, Dict, Tuple, Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+# Per-process state for pool workers
+_worker_app = None
+_worker_engine = None
+
+
+def plan_shards(user_ids: List[int], shard_size: int) -> List[List[int]]:
+    """Split user ids into fixed shards in a stable order"""
+    user_ids = sorted(set(user_ids))
+    return [user_ids[start:start + shard_size] for start in range(0, len(user_ids), shard_size)]
+
+
+def generate_shard(user_ids: List[int], algorithm: str, limit: int, engine: RecommendationEngine = None) -> Dict:
+    """Generate and bulk-insert recommendations for one shard of users inside the current app context"""
+    engine = engine or RecommendationEngine()
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    recommendation_rows = []
+    history_rows = []
+    errors = 0
+
+    # Expire and trim the whole shard's recommendations with two set-based UPDATEs
+    expire_recommendations(user_ids=user_ids, now=now)
+    archive_overflow(user_ids=user_ids, keep=50)
+    db.session.commit()
+
+    for user_id in user_ids:
+        try:
+            recommendations, used_algorithm, variant = engine.score_recommendations(
+                user_id=user_id, algorithm=algorithm, limit=limit
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error generating recommendations for user {user_id}: {str(e)}")
+            errors += 1
+            continue
+
+        recommendation_rows.extend(
+            {
+                'user_id': user_id,
+                'content_id': content.id,
+                'score': float(score),
+                'algorithm': used_algorithm,
+                'reasoning': reasoning,
+                'variant': variant,
+                'status': 'active',
+                'created_at': now,
+                'expires_at': now + timedelta(days=7)
+            }
+            for content, score, reasoning in recommendations
+        )
+        history_rows.append({
+            'user_id': user_id,
+            'algorithm': used_algorithm,
+            'total_recommendations': len(recommendations),
+            'variant': variant,
+            'generation_date': now,
+            'updated_at': now
+        })
+
+    # Multi-row inserts and a single commit for the whole shard
+    inserted = insert_recommendations(recommendation_rows)
+    insert_history(history_rows)
+    db.session.commit()
+
+    # Expiry above may have released content; the new rows are loaded on next use
+    for user_id in user_ids:
+        invalidate_exclusions(user_id=user_id)
+
+    return {
+        'users': len(user_ids) - errors,
+        'recommendations': inserted,
+        'errors': errors,
+        'elapsed': time.perf_counter() - started
+    }
+
+
+def _init_worker(config_name: Optional[str]):
+    """Give each pool process its own app context and database connection
+
+    The parent already ran the app's startup tasks (table creation, schema upgrades, index backfills).
+    """
+    global _worker_app, _worker_engine
+
+    _worker_app = create_app(config_name, run_startup_tasks=False)
+    _worker_app.app_context().push()
+    _worker_engine = RecommendationEngine()
+
+
+def _run_worker_shard(shard_index: int, user_ids: List[int], algorithm: str, limit: int) -> Tuple[int, Dict]:
+    return shard_index, generate_shard(user_ids, algorithm, limit, engine=_worker_engine)
+
+
+class BatchCheckpoint:
+    """JSON record of a run's shard plan and which shards have been committed"""
+
+    def __init__(self, path: str, state: Dict):
+        self.path = path
+        self.state = state
+
+    @staticmethod
+    def users_hash(shards: List[List[int]]) -> str:
+        """Fingerprint of the users a shard plan covers, independent of the shard size"""
+        user_ids = sorted(user_id for shard in shards for user_id in shard)
+        return hashlib.sha256(json.dumps(user_ids).encode()).hexdigest()
+
+    @classmethod
+    def load_or_create(cls, path: str, shards: List[List[int]], algorithm: str, limit: int,
+                       resume: bool = True) -> 'BatchCheckpoint':
+        """Resume an unfinished run with the same users and parameters, or start a new one"""
+        users_hash = cls.users_hash(shards)
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if (state.get('algorithm'), state.get('limit'), state.get('users_hash')) == (algorithm, limit, users_hash):
+                logger.info(f"Resuming batch run from {path}: "
+                            f"{len(state['completed'])}/{len(state['shards'])} shards done")
+                return cls(path, state)
+            logger.info(f"Checkpoint {path} is for a different run; starting over")
+
+        checkpoint = cls(path, {
+            'algorithm': algorithm,
+            'limit': limit,
+            'users_hash': users_hash,
+            'started_at': datetime.utcnow().isoformat(),
+            'shards': shards,
+            'completed': []
+        })
+        checkpoint.save()
+        return checkpoint
+
+    @property
+    def shards(self) -> List[List[int]]:
+        return self.state['shards']
+
+    def pending(self) -> List[int]:
+        completed = set(self.state['completed'])
+        return [index for index in range(len(self.shards)) if index not in completed]
+
+    def mark_completed(self, shard_index: int):
+        self.state['completed'].append(shard_index)
+        self.save()
+
+    def save(self):
+        """Write atomically so a crash never leaves a truncated checkpoint"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def run_batch_generation(user_ids: List[int], algorithm: str = 'hybrid', limit: int = 10,
+                         workers: int = None, shard_size: int = None, job_name: str = 'recommendations',
+                         resume: bool = True, config_name: str = None, progress=None) -> Dict:
+    """Generate recommendations for many users, resuming from the last committed shard
+
+    Must be called inside an app context. With workers <= 1 shards run in this process.
+    Returns run statistics including users_per_second.
+    """
+    settings = Config.BATCH_GENERATION
+    workers = settings['workers'] if workers is None else workers
+    shard_size = shard_size or settings['shard_size']
+
+    checkpoint_path = os.path.join(settings['checkpoint_dir'], f'{job_name}.json')
+    checkpoint = BatchCheckpoint.load_or_create(
+        checkpoint_path, plan_shards(user_ids, shard_size), algorithm, limit, resume=resume
+    )
+    pending = checkpoint.pending()
+
+    stats = {
+        'users': 0,
+        'recommendations': 0,
+        'errors': 0,
+        'shards': len(pending),
+        'skipped_shards': len(checkpoint.shards) - len(pending)
+    }
+    started = time.perf_counter()
+
+    def record(shard_index: int, shard_stats: Dict):
+        checkpoint.mark_completed(shard_index)
+        for key in ('users', 'recommendations', 'errors'):
+            stats[key] += shard_stats[key]
+        elapsed = time.perf_counter() - started
+        logger.info(f"Shard {shard_index + 1}/{len(checkpoint.shards)}: {shard_stats['users']} users in "
+                    f"{shard_stats['elapsed']:.2f}s ({stats['users'] / elapsed if elapsed else 0:.1f} users/sec overall)")
+        if progress:
+            progress(len(checkpoint.shards[shard_index]))
+
+    if workers <= 1 or len(pending) <= 1:
+        engine = RecommendationEngine()
+        for shard_index in pending:
+            record(shard_index, generate_shard(checkpoint.shards[shard_index], algorithm, limit, engine=engine))
+    else:
+        # Warm the read-only snapshots before forking so workers share them copy-on-write,
+        # then drop pooled connections so no socket is shared with a child
+        get_rating_matrix()
+        get_content_feature_store()
+        get_factor_model()
+        db.session.remove()
+        db.engine.dispose()
+
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=context,
+                                 initializer=_init_worker, initargs=(config_name,)) as executor:
+            futures = [
+                executor.submit(_run_worker_shard, shard_index, checkpoint.shards[shard_index], algorithm, limit)
+                for shard_index in pending
+            ]
+            for future in as_completed(futures):
+                record(*future.result())
+
+    checkpoint.finish()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['users_per_second'] = stats['users'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    logger.info(f"Batch generation finished: {stats['users']} users, {stats['recommendations']} recommendations, "
+                f"{stats['errors']} errors, {stats['users_per_second']:.1f} users/sec")
+    return stats
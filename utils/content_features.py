@@ -0,0 +1,166 @@
+"""
+Catalog feature store for WatchTogether
+Caches active content as numpy feature matrices so preference scoring is vectorized
+"""
+
+import logging
+import threading
+import numpy as np
+from scipy import sparse
+from app import db
+from models import Content
+from typing import Dict, List, Tuple
+from sqlalchemy import func
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+class ContentFeatureStore:
+    """Multi-hot genre, one-hot type, year and rating features indexed by content id"""
+
+    def __init__(self, rows, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.content_ids = np.array([row[0] for row in rows], dtype=np.int64)
+
+        # Multi-hot genres (sparse, item x genre)
+        self.genre_index = {}
+        genre_rows, genre_cols = [], []
+        for position, (_, raw_genre, _, _, _) in enumerate(rows):
+            for genre in set(Content.parse_genres(raw_genre)):
+                genre_rows.append(position)
+                genre_cols.append(self.genre_index.setdefault(genre, len(self.genre_index)))
+        self.genres = sparse.csr_matrix(
+            (np.ones(len(genre_rows)), (genre_rows, genre_cols)),
+            shape=(len(rows), max(len(self.genre_index), 1))
+        )
+
+        # One-hot content type followed by a normalized rating column (dense, item x feature)
+        self.type_index = {}
+        for _, _, content_type, _, _ in rows:
+            self.type_index.setdefault(content_type, len(self.type_index))
+        self.ratings = np.array([row[3] if row[3] is not None else np.nan for row in rows], dtype=np.float64)
+        self.years = np.array([row[4] if row[4] is not None else np.nan for row in rows], dtype=np.float64)
+
+        self.features = np.zeros((len(rows), len(self.type_index) + 1), dtype=np.float64)
+        for position, (_, _, content_type, _, _) in enumerate(rows):
+            self.features[position, self.type_index[content_type]] = 1.0
+        self.features[:, -1] = np.nan_to_num(self.ratings) / 10.0
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def __repr__(self):
+        return f'<ContentFeatureStore {len(self)} items, {len(self.genre_index)} genres, {len(self.type_index)} types>'
+
+    @classmethod
+    def from_database(cls):
+        """Load every active content row's scoring columns in a single query"""
+        fingerprint = cls.current_fingerprint()
+        rows = db.session.query(
+            Content.id, Content.genre, Content.type, Content.rating, Content.year
+        ).filter(Content.status == 'active').order_by(Content.id).all()
+        return cls(rows, fingerprint=fingerprint)
+
+    @staticmethod
+    def current_fingerprint() -> Tuple:
+        """Cheap aggregate that changes whenever content is inserted, updated or deleted"""
+        count, max_id, last_updated = db.session.query(
+            func.count(Content.id),
+            func.max(Content.id),
+            func.max(Content.updated_at)
+        ).one()
+        return (count, max_id, last_updated)
+
+    def rating_mask(self, min_rating: float, max_rating: float) -> np.ndarray:
+        """Items whose rating is known and within range"""
+        with np.errstate(invalid='ignore'):
+            return (self.ratings >= min_rating) & (self.ratings <= max_rating)
+
+    def year_mask(self, min_year: int, max_year: int) -> np.ndarray:
+        """Items whose year is known and within range"""
+        with np.errstate(invalid='ignore'):
+            return (self.years >= min_year) & (self.years <= max_year)
+
+    def preference_vectors(self, genre_prefs: Dict, type_prefs: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Project preference dicts onto the genre and feature columns of this store"""
+        genre_vector = np.zeros(self.genres.shape[1], dtype=np.float64)
+        for genre, weight in (genre_prefs or {}).items():
+            if genre in self.genre_index:
+                genre_vector[self.genre_index[genre]] = weight
+
+        feature_vector = np.zeros(self.features.shape[1], dtype=np.float64)
+        for content_type, weight in (type_prefs or {}).items():
+            if content_type in self.type_index:
+                feature_vector[self.type_index[content_type]] = weight * 0.3
+        feature_vector[-1] = 0.1  # Quality boost for high-rated content
+
+        return genre_vector, feature_vector
+
+    def preference_matrices(self, preferences: List[Tuple[Dict, Dict]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Stack (genre_prefs, type_prefs) pairs into member x genre and member x feature matrices"""
+        genre_matrix = np.zeros((len(preferences), self.genres.shape[1]), dtype=np.float64)
+        feature_matrix = np.zeros((len(preferences), self.features.shape[1]), dtype=np.float64)
+        for row, (genre_prefs, type_prefs) in enumerate(preferences):
+            genre_matrix[row], feature_matrix[row] = self.preference_vectors(genre_prefs, type_prefs)
+        return genre_matrix, feature_matrix
+
+    def score(self, genre_prefs: Dict, type_prefs: Dict) -> np.ndarray:
+        """Score every item the same way as RecommendationEngine._calculate_content_score"""
+        genre_matrix, feature_matrix = self.preference_matrices([(genre_prefs, type_prefs)])
+        return self.score_matrix(genre_matrix, feature_matrix)[0]
+
+    def score_matrix(self, genre_matrix: np.ndarray, feature_matrix: np.ndarray) -> np.ndarray:
+        """Score every item for several preference rows at once. Returns a member x item matrix"""
+        best_genre = np.zeros((genre_matrix.shape[0], len(self)), dtype=np.float64)
+
+        # Best matching genre per item: gather each item's genre weights and reduce per CSR row
+        # (preferences are non-negative weights, so items without genres stay at zero)
+        has_genres = np.flatnonzero(np.diff(self.genres.indptr))
+        if len(has_genres):
+            item_weights = genre_matrix[:, self.genres.indices]
+            best_genre[:, has_genres] = np.maximum.reduceat(
+                item_weights, self.genres.indptr[has_genres], axis=1
+            )
+
+        return best_genre * 0.6 + feature_matrix @ self.features.T
+
+    def top_k(self, scores: np.ndarray, limit: int, mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and scores of the best positive-scoring items, best first (ties by id)"""
+        candidates = scores > 0
+        if mask is not None:
+            candidates &= mask
+        positions = np.flatnonzero(candidates)
+
+        if limit and len(positions) > limit:
+            threshold = np.partition(scores[positions], len(positions) - limit)[len(positions) - limit]
+            positions = positions[scores[positions] >= threshold]
+
+        order = positions[np.lexsort((self.content_ids[positions], -scores[positions]))]
+        if limit:
+            order = order[:limit]
+        return self.content_ids[order], scores[order]
+
+
+_store_lock = threading.Lock()
+_cached_store = None
+
+
+def get_content_feature_store() -> ContentFeatureStore:
+    """Get the shared feature store, rebuilding it when Content rows were inserted or updated"""
+    global _cached_store
+
+    fingerprint = ContentFeatureStore.current_fingerprint()
+    with _store_lock:
+        if _cached_store is None or _cached_store.fingerprint != fingerprint:
+            _cached_store = ContentFeatureStore.from_database()
+            logger.info(f"Rebuilt content feature store: {_cached_store}")
+        return _cached_store
+
+
+def invalidate_content_feature_store():
+    """Drop the shared feature store so the next request rebuilds it"""
+    global _cached_store
+
+    with _store_lock:
+        _cached_store = None
@@ -0,0 +1,270 @@
+"""
+Full-text discussion search for WatchTogether
+FTS5 on SQLite and a GIN-indexed tsvector on PostgreSQL, kept in sync by triggers, behind one ranked search API
+"""
+
+import re
+import logging
+from app import db
+from models import Discussion, User
+from markupsafe import Markup, escape
+from sqlalchemy.orm import joinedload
+from typing import List, Optional, Tuple
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+# Highlight markers returned by the engines; replaced by <mark> after the snippet is HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+# Schema objects by name; install_discussion_search only runs the statements of missing ones
+SQLITE_SCHEMA = {
+    'discussion_fts': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS discussion_fts
+           USING fts5(message, author, tokenize = 'unicode61 remove_diacritics 2')""",
+    ],
+    'discussion_fts_insert': [
+        """CREATE TRIGGER IF NOT EXISTS discussion_fts_insert AFTER INSERT ON discussion BEGIN
+               INSERT INTO discussion_fts (rowid, message, author) VALUES (new.id, new.message,
+                   (SELECT username || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, '')
+                    FROM "user" WHERE id = new.user_id));
+           END""",
+    ],
+    'discussion_fts_update': [
+        """CREATE TRIGGER IF NOT EXISTS discussion_fts_update AFTER UPDATE OF message, user_id ON discussion BEGIN
+               DELETE FROM discussion_fts WHERE rowid = old.id;
+               INSERT INTO discussion_fts (rowid, message, author) VALUES (new.id, new.message,
+                   (SELECT username || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, '')
+                    FROM "user" WHERE id = new.user_id));
+           END""",
+    ],
+    'discussion_fts_delete': [
+        """CREATE TRIGGER IF NOT EXISTS discussion_fts_delete AFTER DELETE ON discussion BEGIN
+               DELETE FROM discussion_fts WHERE rowid = old.id;
+           END""",
+    ],
+    'discussion_fts_author': [
+        """CREATE TRIGGER IF NOT EXISTS discussion_fts_author AFTER UPDATE OF username, first_name, last_name ON "user" BEGIN
+               UPDATE discussion_fts
+               SET author = new.username || ' ' || coalesce(new.first_name, '') || ' ' || coalesce(new.last_name, '')
+               WHERE rowid IN (SELECT id FROM discussion WHERE user_id = new.id);
+           END""",
+    ],
+}
+
+SQLITE_EXISTING = "SELECT name FROM sqlite_master WHERE name IN ({names})"
+
+SQLITE_BACKFILL = """
+    INSERT INTO discussion_fts (rowid, message, author)
+    SELECT d.id, d.message, u.username || ' ' || coalesce(u.first_name, '') || ' ' || coalesce(u.last_name, '')
+    FROM discussion d LEFT JOIN "user" u ON u.id = d.user_id
+    WHERE NOT EXISTS (SELECT 1 FROM discussion_fts f WHERE f.rowid = d.id)
+"""
+
+# Message terms weigh more than author names (weights A and B)
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('simple', coalesce({message}, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(u.username, '') || ' ' || coalesce(u.first_name, '') || ' ' ||
+                                    coalesce(u.last_name, '')), 'B')
+"""
+
+# Not exercised by the test suite, which runs on SQLite
+POSTGRES_SCHEMA = {
+    'discussion_fts': [
+        """CREATE TABLE IF NOT EXISTS discussion_fts (
+               discussion_id INTEGER PRIMARY KEY REFERENCES discussion (id) ON DELETE CASCADE,
+               document TSVECTOR NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS ix_discussion_fts_document ON discussion_fts USING GIN (document)",
+    ],
+    'discussion_fts_refresh': [
+        f"""CREATE OR REPLACE FUNCTION discussion_fts_refresh() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO discussion_fts (discussion_id, document)
+                SELECT NEW.id, {POSTGRES_DOCUMENT.format(message='NEW.message')}
+                FROM "user" u WHERE u.id = NEW.user_id
+                ON CONFLICT (discussion_id) DO UPDATE SET document = EXCLUDED.document;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql""",
+        """CREATE TRIGGER discussion_fts_refresh AFTER INSERT OR UPDATE OF message, user_id ON discussion
+           FOR EACH ROW EXECUTE FUNCTION discussion_fts_refresh()""",
+    ],
+    'discussion_fts_author': [
+        f"""CREATE OR REPLACE FUNCTION discussion_fts_author() RETURNS trigger AS $$
+            BEGIN
+                UPDATE discussion_fts f SET document = {POSTGRES_DOCUMENT.format(message='d.message')}
+                FROM discussion d JOIN "user" u ON u.id = d.user_id
+                WHERE d.id = f.discussion_id AND d.user_id = NEW.id;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql""",
+        """CREATE TRIGGER discussion_fts_author AFTER UPDATE OF username, first_name, last_name ON "user"
+           FOR EACH ROW EXECUTE FUNCTION discussion_fts_author()""",
+    ],
+}
+
+POSTGRES_EXISTING = """
+    SELECT relname FROM pg_class WHERE relname IN ({names}) AND relkind = 'r'
+    UNION SELECT tgname FROM pg_trigger WHERE tgname IN ({names}) AND NOT tgisinternal
+"""
+
+POSTGRES_BACKFILL = f"""
+    INSERT INTO discussion_fts (discussion_id, document)
+    SELECT d.id, {POSTGRES_DOCUMENT.format(message='d.message')}
+    FROM discussion d JOIN "user" u ON u.id = d.user_id
+    WHERE NOT EXISTS (SELECT 1 FROM discussion_fts f WHERE f.discussion_id = d.id)
+"""
+
+# Serializes concurrent installs from workers booting together (pg_advisory_xact_lock key)
+POSTGRES_INSTALL_LOCK = 7261841
+
+
+_engines = {}
+
+
+def get_search_engine() -> str:
+    """'fts5', 'tsvector' or 'like' (the unindexed fallback) for the current database"""
+    engine = _engines.get(db.engine)
+    if engine is None:
+        engine = 'like'
+        if db.engine.dialect.name == 'postgresql':
+            engine = 'tsvector'
+        elif db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as connection:
+                if connection.exec_driver_sql("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'").scalar():
+                    engine = 'fts5'
+        _engines[db.engine] = engine
+    return engine
+
+
+def _missing_objects(connection, schema: dict, existing_query: str) -> List[str]:
+    names = ', '.join(f"'{name}'" for name in schema)
+    existing = {name for (name,) in connection.exec_driver_sql(existing_query.format(names=names))}
+    return [name for name in schema if name not in existing]
+
+
+def install_discussion_search():
+    """Create whichever parts of the full-text index and its sync triggers are missing
+
+    Cheap when everything exists: one catalog query, no DDL and no backfill. When something
+    was missing, discussions without an index entry are backfilled. On PostgreSQL the check
+    and any DDL run under a transaction-scoped advisory lock, and triggers are only ever
+    created, never dropped. The PostgreSQL path has not been run against a live server.
+    """
+    engine = get_search_engine()
+    schema, existing_query, backfill = {
+        'fts5': (SQLITE_SCHEMA, SQLITE_EXISTING, SQLITE_BACKFILL),
+        'tsvector': (POSTGRES_SCHEMA, POSTGRES_EXISTING, POSTGRES_BACKFILL),
+    }.get(engine, ({}, None, None))
+    if not schema:
+        logger.warning("No full-text engine for this database; discussion search falls back to LIKE scans")
+        return engine
+
+    with db.engine.connect() as connection:
+        if not _missing_objects(connection, schema, existing_query):
+            return engine
+
+    with db.engine.begin() as connection:
+        if engine == 'tsvector':
+            connection.execute(db.text("SELECT pg_advisory_xact_lock(:key)"), {'key': POSTGRES_INSTALL_LOCK})
+        missing = _missing_objects(connection, schema, existing_query)
+        for name in missing:
+            for statement in schema[name]:
+                connection.exec_driver_sql(statement)
+        if missing:
+            connection.exec_driver_sql(backfill)
+            logger.info(f"Installed discussion search objects: {', '.join(missing)}")
+    return engine
+
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r'\w+', query.lower())
+
+
+def _scope_filters(content_id: Optional[int], group_id: Optional[int]) -> Tuple[str, dict]:
+    clauses, params = ['d.is_hidden = :hidden'], {'hidden': False}
+    if content_id:
+        clauses.append('d.content_id = :content_id')
+        params['content_id'] = content_id
+    if group_id:
+        clauses.append('d.group_id = :group_id')
+        params['group_id'] = group_id
+    return ' AND '.join(clauses), params
+
+
+def _ranked_ids(engine: str, terms: List[str], content_id, group_id, limit, offset):
+    """[(discussion_id, snippet)] best match first, plus the total number of matches"""
+    scope, params = _scope_filters(content_id, group_id)
+    params.update(limit=limit, offset=offset)
+
+    if engine == 'fts5':
+        # Every term must match, as a prefix; quoting keeps user input out of the FTS5 query syntax
+        params['match'] = ' '.join(f'"{term}"*' for term in terms)
+        source = (f"FROM discussion_fts JOIN discussion d ON d.id = discussion_fts.rowid "
+                  f"WHERE discussion_fts MATCH :match AND {scope}")
+        rows = db.session.execute(db.text(
+            f"SELECT d.id, snippet(discussion_fts, 0, char(2), char(3), '…', 24) {source} "
+            "ORDER BY bm25(discussion_fts, 10.0, 2.0), d.created_at DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+    else:
+        params['tsquery'] = ' & '.join(f'{term}:*' for term in terms)
+        params['headline'] = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxFragments=2, MaxWords=30, MinWords=10'
+        source = (f"FROM discussion_fts f JOIN discussion d ON d.id = f.discussion_id, "
+                  f"to_tsquery('simple', :tsquery) q WHERE f.document @@ q AND {scope}")
+        rows = db.session.execute(db.text(
+            f"SELECT d.id, ts_headline('simple', d.message, q, :headline) {source} "
+            "ORDER BY ts_rank_cd(f.document, q) DESC, d.created_at DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+
+    total = db.session.execute(db.text(f"SELECT count(*) {source}"), params).scalar()
+    return rows, total
+
+
+def _like_ids(terms: List[str], content_id, group_id, limit, offset):
+    """Unindexed fallback for databases without a full-text engine: newest matches first"""
+    query = db.session.query(Discussion.id, Discussion.message).join(User, User.id == Discussion.user_id)\
+                      .filter(Discussion.is_hidden == False)
+    if content_id:
+        query = query.filter(Discussion.content_id == content_id)
+    if group_id:
+        query = query.filter(Discussion.group_id == group_id)
+    for term in terms:
+        query = query.filter(db.or_(Discussion.message.ilike(f'%{term}%'), User.username.ilike(f'%{term}%')))
+    total = query.count()
+    rows = query.order_by(Discussion.created_at.desc()).limit(limit).offset(offset).all()
+    return [(discussion_id, message[:300]) for discussion_id, message in rows], total
+
+
+def highlight_snippet(snippet: str) -> Markup:
+    """HTML-escape an engine snippet and turn its match markers into <mark> tags"""
+    return Markup(str(escape(snippet)).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search_discussions(query: str, content_id: int = None, group_id: int = None,
+                       limit: int = 20, offset: int = 0) -> Tuple[List[Discussion], int]:
+    """Visible discussions matching every term of query (as prefixes), best match first
+
+    Returns (discussions, total matches). Each discussion carries a search_snippet with the
+    matched terms highlighted. Results are ranked by BM25 on SQLite and ts_rank_cd on PostgreSQL.
+    """
+    terms = _terms(query)
+    if not terms:
+        return [], 0
+
+    engine = get_search_engine()
+    if engine == 'like':
+        rows, total = _like_ids(terms, content_id, group_id, limit, offset)
+    else:
+        rows, total = _ranked_ids(engine, terms, content_id, group_id, limit, offset)
+
+    snippets = dict(rows)
+    discussions = {
+        discussion.id: discussion for discussion in Discussion.query.options(
+            joinedload(Discussion.user), joinedload(Discussion.content), joinedload(Discussion.group)
+        ).filter(Discussion.id.in_(snippets))
+    }
+    results = []
+    for discussion_id, snippet in rows:
+        discussion = discussions[discussion_id]
+        discussion.search_snippet = highlight_snippet(snippet)
+        results.append(discussion)
+    return results, total
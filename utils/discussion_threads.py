@@ -0,0 +1,257 @@
+"""
+Discussion threads, counters and serialization for WatchTogether
+Loads threads and discussion lists with viewer state in a fixed number of set queries and keeps engagement counters in step
+"""
+
+import logging
+from app import db
+from models import Discussion, DiscussionLike, DiscussionReport, GroupMember, User
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload
+from typing import Dict, Iterable, List, Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+def get_descendant_counts(discussion_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    """Visible nested reply count per discussion (all discussions when ids is None), in one recursive query"""
+    seed = db.select(Discussion.id, Discussion.parent_id.label('origin_id'))\
+             .where(Discussion.parent_id.isnot(None), Discussion.is_hidden == False)
+    if discussion_ids is not None:
+        ids = list(discussion_ids)
+        seed = seed.where(Discussion.parent_id.in_(ids))
+    else:
+        ids = [discussion_id for (discussion_id,) in db.session.query(Discussion.id)]
+    tree = seed.cte('reply_trees', recursive=True)
+    tree = tree.union_all(
+        db.select(Discussion.id, tree.c.origin_id)
+          .where(Discussion.parent_id == tree.c.id, Discussion.is_hidden == False)
+    )
+    counts = dict.fromkeys(ids, 0)
+    counts.update(db.session.execute(
+        db.select(tree.c.origin_id, db.func.count()).group_by(tree.c.origin_id)
+    ).all())
+    return counts
+
+
+def get_thread_depths(discussion_ids: Iterable[int]) -> Dict[int, int]:
+    """Number of ancestors per discussion, for many discussions in one recursive query"""
+    ids = list(discussion_ids)
+    chain = db.select(Discussion.id.label('origin_id'), Discussion.parent_id.label('ancestor_id'))\
+              .where(Discussion.id.in_(ids), Discussion.parent_id.isnot(None))\
+              .cte('ancestor_chains', recursive=True)
+    chain = chain.union_all(
+        db.select(chain.c.origin_id, Discussion.parent_id)
+          .where(Discussion.id == chain.c.ancestor_id, Discussion.parent_id.isnot(None))
+    )
+    depths = dict.fromkeys(ids, 0)
+    depths.update(db.session.execute(
+        db.select(chain.c.origin_id, db.func.count()).group_by(chain.c.origin_id)
+    ).all())
+    return depths
+
+
+def prefetch_discussions(discussions: List[Discussion], viewer_id: Optional[int] = None,
+                         depths: Dict[int, int] = None):
+    """Prefetch depths and the viewer's reactions, reports and group roles onto discussions
+
+    Afterwards get_thread_depth, get_user_reaction, is_reported_by_user, can_user_edit and
+    can_user_pin answer for viewer_id without queries (counts are columns). Authors not loaded
+    yet are fetched in one query into the session's identity map. Callers that already know
+    the depths (e.g. from a loaded thread) pass them in to skip that query.
+    """
+    if not discussions:
+        return
+    ids = [discussion.id for discussion in discussions]
+
+    missing_authors = {discussion.user_id for discussion in discussions if 'user' in inspect(discussion).unloaded}
+    if missing_authors:
+        User.query.filter(User.id.in_(missing_authors)).all()
+
+    if depths is None:
+        nested_ids = [discussion.id for discussion in discussions if discussion.parent_id]
+        depths = get_thread_depths(nested_ids) if nested_ids else {}
+
+    viewer_reactions, viewer_reports, viewer_roles = {}, set(), {}
+    if viewer_id is not None:
+        viewer_reactions = {
+            discussion_id: 'like' if is_like else 'dislike'
+            for discussion_id, is_like in db.session.query(DiscussionLike.discussion_id, DiscussionLike.is_like)
+                                                    .filter(DiscussionLike.discussion_id.in_(ids),
+                                                            DiscussionLike.user_id == viewer_id)
+        }
+        viewer_reports = {
+            discussion_id for (discussion_id,) in db.session.query(DiscussionReport.discussion_id)
+                                                            .filter(DiscussionReport.discussion_id.in_(ids),
+                                                                    DiscussionReport.reporter_id == viewer_id)
+        }
+        group_ids = {discussion.group_id for discussion in discussions if discussion.group_id}
+        if group_ids:
+            viewer_roles = dict(db.session.query(GroupMember.group_id, GroupMember.role).filter(
+                GroupMember.group_id.in_(group_ids), GroupMember.user_id == viewer_id
+            ))
+
+    for discussion in discussions:
+        discussion._prefetched = {
+            'depth': depths.get(discussion.id, 0),
+            'viewer_id': viewer_id,
+            'viewer_reaction': viewer_reactions.get(discussion.id),
+            'viewer_reported': discussion.id in viewer_reports,
+            'viewer_role': viewer_roles.get(discussion.group_id)
+        }
+
+
+def load_thread(root: Discussion, viewer_id: Optional[int] = None) -> List[Dict]:
+    """Visible replies below root as nested {'discussion', 'depth', 'replies'} nodes (depth 0 for direct replies)
+
+    The replies and their authors come from one recursive CTE query; viewer state is
+    prefetched onto root and every reply (see prefetch_discussions), so the whole thread
+    takes a fixed number of queries whatever its size.
+    """
+    tree = Discussion.replies_cte(root.id)
+    rows = db.session.query(Discussion, tree.c.depth)\
+                     .join(tree, tree.c.id == Discussion.id)\
+                     .options(joinedload(Discussion.user))\
+                     .order_by(Discussion.created_at.asc(), Discussion.id.asc()).all()
+
+    discussions = [root] + [discussion for discussion, _ in rows]
+    depths = {root.id: 0}
+    depths.update({discussion.id: depth for discussion, depth in rows})
+
+    # Assemble the tree; rows are in created_at order, so children keep the same order
+    nodes = {discussion.id: {'discussion': discussion, 'depth': depths[discussion.id] - 1, 'replies': []}
+             for discussion in discussions}
+    for discussion in discussions[1:]:
+        nodes[discussion.parent_id]['replies'].append(nodes[discussion.id])
+
+    root_depth = root.get_thread_depth() if root.parent_id else 0
+    prefetch_discussions(discussions, viewer_id,
+                         depths={discussion_id: root_depth + depth for discussion_id, depth in depths.items()})
+
+    return nodes[root.id]['replies']
+
+
+def serialize_discussions(discussions: List[Discussion], viewer_id: Optional[int] = None) -> List[Dict]:
+    """Discussion.to_dict for a list of discussions, prefetched in a fixed number of queries"""
+    prefetch_discussions(discussions, viewer_id)
+    return [discussion.to_dict(user_id=viewer_id) for discussion in discussions]
+
+
+def serialize_thread(root: Discussion, viewer_id: Optional[int] = None) -> Dict:
+    """Discussion.to_dict(include_replies=True) for root, built from one thread load"""
+    def serialize(discussion, replies):
+        data = discussion.to_dict(user_id=viewer_id)
+        data['replies'] = [serialize(node['discussion'], node['replies']) for node in replies]
+        return data
+
+    return serialize(root, load_thread(root, viewer_id))
+
+
+def _counting_ancestors(discussion: Discussion):
+    """Ids of the ancestors whose descendant_reply_count includes this discussion's subtree
+
+    Hidden discussions prune their subtree, so the walk up stops after the first hidden ancestor.
+    """
+    chain = db.select(Discussion.id, Discussion.parent_id, Discussion.is_hidden)\
+              .where(Discussion.id == discussion.parent_id)\
+              .cte('counting_ancestors', recursive=True)
+    chain = chain.union_all(
+        db.select(Discussion.id, Discussion.parent_id, Discussion.is_hidden)
+          .where(Discussion.id == chain.c.parent_id, chain.c.is_hidden == False)
+    )
+    return db.select(chain.c.id)
+
+
+def apply_reply_change(discussion: Discussion, delta: int):
+    """Update reply counters when a reply appears (delta=1) or disappears (delta=-1) with its visible subtree
+
+    Counters are adjusted in SQL within the caller's transaction.
+    """
+    if not discussion.parent_id:
+        return
+    subtree_size = 1 + (discussion.descendant_reply_count or 0)
+    db.session.execute(
+        db.update(Discussion).where(Discussion.id == discussion.parent_id)
+          .values(direct_reply_count=Discussion.direct_reply_count + delta)
+    )
+    db.session.execute(
+        db.update(Discussion).where(Discussion.id.in_(_counting_ancestors(discussion)))
+          .values(descendant_reply_count=Discussion.descendant_reply_count + delta * subtree_size),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+
+
+def apply_reaction_change(discussion_id: int, old_is_like: Optional[bool], new_is_like: Optional[bool]):
+    """Update like/dislike counters when a reaction changes (None for no reaction)"""
+    like_delta = (new_is_like is True) - (old_is_like is True)
+    dislike_delta = (new_is_like is False) - (old_is_like is False)
+    if like_delta or dislike_delta:
+        db.session.execute(
+            db.update(Discussion).where(Discussion.id == discussion_id).values(
+                like_count=Discussion.like_count + like_delta,
+                dislike_count=Discussion.dislike_count + dislike_delta
+            )
+        )
+
+
+def set_discussion_hidden(discussion: Discussion, hidden: bool):
+    """Hide or unhide a discussion, moving its visible subtree out of or into its ancestors' counts"""
+    if bool(discussion.is_hidden) == hidden:
+        return
+    discussion.is_hidden = hidden
+    apply_reply_change(discussion, -1 if hidden else 1)
+
+
+def repair_discussion_counters() -> int:
+    """Recompute every discussion's counters from the likes and replies tables; returns the rows fixed"""
+    likes, dislikes = {}, {}
+    for discussion_id, is_like, count in db.session.query(
+        DiscussionLike.discussion_id, DiscussionLike.is_like, db.func.count()
+    ).group_by(DiscussionLike.discussion_id, DiscussionLike.is_like):
+        (likes if is_like else dislikes)[discussion_id] = count
+
+    direct = dict(db.session.query(Discussion.parent_id, db.func.count()).filter(
+        Discussion.parent_id.isnot(None), Discussion.is_hidden == False
+    ).group_by(Discussion.parent_id))
+    descendants = get_descendant_counts()
+
+    current = db.session.query(Discussion.id, Discussion.like_count, Discussion.dislike_count,
+                               Discussion.direct_reply_count, Discussion.descendant_reply_count)
+    fixes = []
+    for discussion_id, *stored in current:
+        counters = (likes.get(discussion_id, 0), dislikes.get(discussion_id, 0),
+                    direct.get(discussion_id, 0), descendants.get(discussion_id, 0))
+        if tuple(stored) != counters:
+            fixes.append(dict(zip(('id', 'like_count', 'dislike_count', 'direct_reply_count',
+                                   'descendant_reply_count'), (discussion_id,) + counters)))
+
+    if fixes:
+        db.session.execute(db.update(Discussion), fixes)
+    db.session.commit()
+    logger.info(f"Repaired counters on {len(fixes)} discussions")
+    return len(fixes)
+
+
+def ensure_counter_columns():
+    """Add the counter columns and engagement indexes to a discussion table created before they existed
+
+    Runs at app start; returns True when columns were added, so their counters still need a repair.
+    """
+    names = ('like_count', 'dislike_count', 'direct_reply_count', 'descendant_reply_count')
+    columns = {column['name'] for column in inspect(db.engine).get_columns(Discussion.__tablename__)}
+    missing = [name for name in names if name not in columns]
+    if not missing:
+        return False
+
+    # IF NOT EXISTS lets PostgreSQL workers booting together race safely
+    if_not_exists = 'IF NOT EXISTS ' if db.engine.dialect.name == 'postgresql' else ''
+    with db.engine.begin() as connection:
+        for name in missing:
+            connection.execute(db.text(
+                f"ALTER TABLE {Discussion.__tablename__} ADD COLUMN {if_not_exists}{name} INTEGER NOT NULL DEFAULT 0"
+            ))
+        for index in Discussion.__table__.indexes:
+            index.create(connection, checkfirst=True)
+    logger.info(f"Added discussion counter columns: {', '.join(missing)}")
+    return True
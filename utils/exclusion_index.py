@@ -0,0 +1,113 @@
+"""
+Per-user and per-group exclusion index for WatchTogether
+Keeps the content ids a target has already rated, watchlisted or been recommended as sorted int arrays in a bounded LRU
+"""
+
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from app import db
+from models import ContentRating, UserWatchlist, GroupWatchlist
+from models.recommendations import Recommendation
+from utils.recommendation_config import Config
+from datetime import datetime
+from typing import Iterable
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+class ExclusionIndex:
+    """Sorted, de-duplicated array of content ids that should not be recommended"""
+
+    def __init__(self, content_ids: Iterable[int] = ()):
+        self.content_ids = np.unique(np.fromiter(content_ids, dtype=np.int64))
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def __contains__(self, content_id):
+        pos = np.searchsorted(self.content_ids, content_id)
+        return bool(pos < len(self.content_ids) and self.content_ids[pos] == content_id)
+
+    def mask(self, content_ids) -> np.ndarray:
+        """Boolean array, True where the content id is excluded"""
+        return np.isin(np.asarray(content_ids, dtype=np.int64), self.content_ids, assume_unique=False)
+
+    def add(self, content_ids: Iterable[int]):
+        self.content_ids = np.union1d(self.content_ids, np.fromiter(content_ids, dtype=np.int64))
+
+    @classmethod
+    def for_user(cls, user_id: int) -> 'ExclusionIndex':
+        """Rated, watchlisted and actively recommended content ids, loaded as bare id columns"""
+        rated = db.session.query(ContentRating.content_id).filter_by(user_id=user_id)
+        watchlisted = db.session.query(UserWatchlist.content_id).filter_by(user_id=user_id)
+        recommended = db.session.query(Recommendation.content_id).filter(
+            Recommendation.user_id == user_id,
+            Recommendation.status == 'active',
+            Recommendation.expires_at > datetime.utcnow()
+        )
+        return cls(content_id for (content_id,) in rated.union(watchlisted, recommended))
+
+    @classmethod
+    def for_group(cls, group_id: int) -> 'ExclusionIndex':
+        """Group watchlist and actively recommended content ids"""
+        watchlisted = db.session.query(GroupWatchlist.content_id).filter_by(group_id=group_id)
+        recommended = db.session.query(Recommendation.content_id).filter(
+            Recommendation.group_id == group_id,
+            Recommendation.status == 'active',
+            Recommendation.expires_at > datetime.utcnow()
+        )
+        return cls(content_id for (content_id,) in watchlisted.union(recommended))
+
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def _key(user_id: int = None, group_id: int = None):
+    return ('user', user_id) if user_id else ('group', group_id)
+
+
+def get_exclusion_index(user_id: int = None, group_id: int = None) -> ExclusionIndex:
+    """Get a target's exclusion index, loading it on a miss or once it is older than the TTL
+
+    The TTL bounds staleness from writes handled by other worker processes.
+    """
+    key = _key(user_id, group_id)
+    ttl = Config.CACHING['exclusion_index_ttl_seconds']
+
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None and time.monotonic() - index.loaded_at < ttl:
+            _cache.move_to_end(key)
+            return index
+
+    index = ExclusionIndex.for_user(user_id) if user_id else ExclusionIndex.for_group(group_id)
+
+    with _cache_lock:
+        _cache[key] = index
+        _cache.move_to_end(key)
+        while len(_cache) > Config.CACHING['cache_size_limit']:
+            _cache.popitem(last=False)
+    return index
+
+
+def exclude_content(content_ids: Iterable[int], user_id: int = None, group_id: int = None):
+    """Add newly rated/watchlisted/recommended content to a cached index (no-op if not cached)"""
+    with _cache_lock:
+        index = _cache.get(_key(user_id, group_id))
+        if index is not None:
+            index.add(content_ids)
+
+
+def invalidate_exclusions(user_id: int = None, group_id: int = None):
+    """Drop a cached index after removals (a removed id may still be excluded by another source)"""
+    with _cache_lock:
+        if user_id is None and group_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(_key(user_id, group_id), None)
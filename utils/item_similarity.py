@@ -0,0 +1,223 @@
+"""
+Item-item similarity index for WatchTogether
+Precomputes the top-N similar content for each item from rating co-occurrence and genre overlap
+"""
+
+import logging
+import numpy as np
+from scipy import sparse
+from app import db
+from models import Content, ContentRating
+from models.recommendations import ContentSimilarity, ContentSimilarityState
+from utils.rating_matrix import RatingMatrix
+from utils.recommendation_config import Config
+from datetime import datetime
+from typing import List, Dict, Tuple
+from sqlalchemy import func
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+def _lookup(sorted_ids: np.ndarray, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of ids in a sorted id array, with a mask of which ids were found"""
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    positions = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+    return positions, sorted_ids[positions] == ids
+
+
+class ItemSimilarityBuilder:
+    """Computes blended rating/genre similarity between active content items"""
+
+    def __init__(self, settings: Dict = None):
+        self.settings = dict(Config.ITEM_SIMILARITY, **(settings or {}))
+
+        # Catalog of active content and its genres
+        catalog = db.session.query(Content.id, Content.genre).filter(
+            Content.status == 'active'
+        ).order_by(Content.id).all()
+        self.content_ids = np.array([content_id for content_id, _ in catalog], dtype=np.int64)
+        self.genres = self._build_genre_matrix([genre for _, genre in catalog])
+        self.genre_counts = np.asarray(self.genres.sum(axis=1)).ravel()
+
+        # Watermark and per-item rating counts are taken before the ratings are read, so
+        # ratings written during the build look newer than the build on the next refresh
+        self.built_at = datetime.utcnow()
+        self.rating_counts = dict(db.session.query(ContentRating.content_id, func.count()).group_by(
+            ContentRating.content_id
+        ))
+
+        # Rating vectors aligned with the catalog (one row per item, one column per user)
+        self.ratings = self._build_rating_matrix(RatingMatrix.from_database())
+        self.rating_norms = np.sqrt(np.asarray(self.ratings.multiply(self.ratings).sum(axis=1)).ravel())
+
+    def _build_genre_matrix(self, raw_genres: List) -> sparse.csr_matrix:
+        """Multi-hot item x genre matrix"""
+        vocabulary = {}
+        rows, cols = [], []
+        for row, raw_genre in enumerate(raw_genres):
+            for genre in set(Content.parse_genres(raw_genre)):
+                rows.append(row)
+                cols.append(vocabulary.setdefault(genre.lower(), len(vocabulary)))
+
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(raw_genres), max(len(vocabulary), 1))
+        )
+
+    def _build_rating_matrix(self, matrix: RatingMatrix) -> sparse.csr_matrix:
+        """Reorder rating matrix columns into catalog rows; unrated items get empty rows"""
+        item_by_user = matrix.by_item.T.tocsr()
+        positions, rated = _lookup(matrix.content_ids, self.content_ids)
+
+        selector = sparse.csr_matrix(
+            (np.ones(int(rated.sum()), dtype=np.float32), (np.flatnonzero(rated), positions[rated])),
+            shape=(len(self.content_ids), item_by_user.shape[0])
+        )
+        return (selector @ item_by_user).tocsr()
+
+    def neighbours(self, content_ids) -> Dict[int, List[Tuple[int, float, float, float]]]:
+        """Compute (similar_id, score, rating_similarity, genre_similarity) lists for items"""
+        top_n = self.settings['neighbours_per_item']
+        batch_size = self.settings['batch_size']
+
+        positions, found = _lookup(self.content_ids, np.asarray(content_ids, dtype=np.int64))
+        targets = np.unique(positions[found])
+
+        results = {}
+        for start in range(0, len(targets), batch_size):
+            rows = targets[start:start + batch_size]
+            rating_sim, genre_sim = self._similarity_block(rows)
+            score = (self.settings['rating_weight'] * rating_sim +
+                     self.settings['genre_weight'] * genre_sim)
+            score[np.arange(len(rows)), rows] = 0  # An item is not its own neighbour
+
+            for i, row in enumerate(rows):
+                row_scores = score[i]
+                candidates = np.flatnonzero(row_scores >= self.settings['min_similarity'])
+                if len(candidates) > top_n:
+                    top = np.argpartition(-row_scores[candidates], top_n - 1)[:top_n]
+                    candidates = candidates[top]
+                order = candidates[np.lexsort((self.content_ids[candidates], -row_scores[candidates]))]
+                results[int(self.content_ids[row])] = [
+                    (int(self.content_ids[col]), float(row_scores[col]),
+                     float(rating_sim[i, col]), float(genre_sim[i, col]))
+                    for col in order
+                ]
+
+        return results
+
+    def _similarity_block(self, rows) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense rating cosine and genre Jaccard similarity of a batch of items to the catalog"""
+        dot = (self.ratings[rows] @ self.ratings.T).toarray()
+        norms = np.outer(self.rating_norms[rows], self.rating_norms)
+        rating_sim = np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+
+        shared = (self.genres[rows] @ self.genres.T).toarray()
+        union = self.genre_counts[rows][:, np.newaxis] + self.genre_counts[np.newaxis, :] - shared
+        genre_sim = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+        return rating_sim.astype(np.float32), genre_sim.astype(np.float32)
+
+
+def _write_neighbours(neighbours: Dict[int, List[Tuple]], builder: ItemSimilarityBuilder):
+    """Replace index rows and build watermarks for the given items in batched statements"""
+    content_ids = list(neighbours.keys())
+    batch_size = builder.settings['batch_size']
+    now = builder.built_at
+
+    for start in range(0, len(content_ids), batch_size):
+        batch = content_ids[start:start + batch_size]
+        ContentSimilarity.query.filter(ContentSimilarity.content_id.in_(batch)).delete(synchronize_session=False)
+        ContentSimilarityState.query.filter(ContentSimilarityState.content_id.in_(batch))\
+                                    .delete(synchronize_session=False)
+
+    rows = [
+        {
+            'content_id': content_id,
+            'similar_content_id': similar_id,
+            'score': score,
+            'rating_similarity': rating_sim,
+            'genre_similarity': genre_sim,
+            'rank': rank,
+            'updated_at': now
+        }
+        for content_id, items in neighbours.items()
+        for rank, (similar_id, score, rating_sim, genre_sim) in enumerate(items, start=1)
+    ]
+    for start in range(0, len(rows), batch_size * 20):
+        db.session.execute(db.insert(ContentSimilarity), rows[start:start + batch_size * 20])
+
+    # Every written item gets a watermark, including items with no neighbours
+    states = [
+        {'content_id': content_id, 'rating_count': builder.rating_counts.get(content_id, 0), 'built_at': now}
+        for content_id in content_ids
+    ]
+    for start in range(0, len(states), batch_size * 20):
+        db.session.execute(db.insert(ContentSimilarityState), states[start:start + batch_size * 20])
+
+    db.session.commit()
+    return len(rows)
+
+
+def rebuild_similarity_index(settings: Dict = None) -> Tuple[int, int]:
+    """Rebuild neighbours for the whole active catalog. Returns (items, rows)"""
+    builder = ItemSimilarityBuilder(settings)
+    neighbours = builder.neighbours(builder.content_ids.tolist())
+
+    ContentSimilarity.query.delete(synchronize_session=False)
+    ContentSimilarityState.query.delete(synchronize_session=False)
+    row_count = _write_neighbours(neighbours, builder)
+    logger.info(f"Rebuilt similarity index: {len(neighbours)} items, {row_count} rows")
+    return len(neighbours), row_count
+
+
+def get_stale_content_ids(since: datetime = None) -> List[int]:
+    """Items whose ratings were added, edited or deleted since their last build, plus unindexed active items
+
+    Each item is compared with its ContentSimilarityState: a different rating count catches
+    deletions and a rating newer than built_at catches additions and edits. Items rated
+    after since are included too.
+    """
+    current = db.session.query(
+        ContentRating.content_id.label('content_id'),
+        func.count().label('rating_count'),
+        func.max(ContentRating.updated_at).label('latest')
+    ).group_by(ContentRating.content_id).subquery()
+
+    stale = db.session.query(Content.id)\
+                      .outerjoin(ContentSimilarityState, ContentSimilarityState.content_id == Content.id)\
+                      .outerjoin(current, current.c.content_id == Content.id)\
+                      .filter(Content.status == 'active', db.or_(
+                          ContentSimilarityState.content_id.is_(None),
+                          func.coalesce(current.c.rating_count, 0) != ContentSimilarityState.rating_count,
+                          current.c.latest > ContentSimilarityState.built_at
+                      ))
+    stale_ids = {content_id for (content_id,) in stale}
+
+    if since is not None:
+        stale_ids.update(
+            content_id for (content_id,) in db.session.query(ContentRating.content_id).filter(
+                ContentRating.updated_at > since
+            ).distinct()
+        )
+    return sorted(stale_ids)
+
+
+def refresh_similarity_index(since: datetime = None, settings: Dict = None) -> Tuple[int, int]:
+    """Recompute neighbours only for items whose ratings changed. Returns (items, rows)"""
+    stale_ids = get_stale_content_ids(since)
+    if not stale_ids:
+        return 0, 0
+
+    builder = ItemSimilarityBuilder(settings)
+    neighbours = builder.neighbours(stale_ids)
+
+    # Items that went inactive keep no neighbours
+    for content_id in stale_ids:
+        neighbours.setdefault(content_id, [])
+
+    row_count = _write_neighbours(neighbours, builder)
+    logger.info(f"Refreshed similarity index: {len(stale_ids)} items, {row_count} rows")
+    return len(stale_ids), row_count
@@ -0,0 +1,238 @@
+"""
+Matrix factorization model for WatchTogether
+Trains implicit-feedback ALS factors offline and serves them from versioned, memory-mapped .npy files
+"""
+
+import os
+import shutil
+import logging
+import threading
+import numpy as np
+from scipy import sparse
+from app import db
+from models import ContentRating, UserWatchlist
+from models.recommendations import Recommendation, RecommendationFeedback
+from utils.recommendation_config import Config
+from datetime import datetime
+from typing import Dict, List, Tuple, Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+CURRENT_POINTER = 'CURRENT'
+ARTIFACTS = ('user_ids', 'item_ids', 'user_factors', 'item_factors')
+
+
+def _settings(settings: Dict = None) -> Dict:
+    return dict(Config.MATRIX_FACTORIZATION, **(settings or {}))
+
+
+def load_interactions(settings: Dict = None) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+    """Combine ratings, watchlist and recommendation feedback into a signed confidence matrix
+
+    Returns (user_ids, item_ids, matrix). Each stored value's magnitude is the extra
+    confidence (alpha * signal strength) and its sign is the binary preference.
+    """
+    settings = _settings(settings)
+    users, items, signals = [], [], []
+
+    # Explicit ratings: 1-2 stars are observed dislikes, 3-5 stars are likes
+    for user_id, content_id, rating in db.session.query(
+        ContentRating.user_id, ContentRating.content_id, ContentRating.rating
+    ):
+        users.append(user_id)
+        items.append(content_id)
+        signals.append((rating - 2.5) / 2.5)
+
+    # Implicit watchlist interest
+    for user_id, content_id in db.session.query(UserWatchlist.user_id, UserWatchlist.content_id):
+        users.append(user_id)
+        items.append(content_id)
+        signals.append(settings['watchlist_weight'])
+
+    # Feedback on earlier recommendations
+    feedback_weights = settings['feedback_weights']
+    for user_id, content_id, feedback_type in db.session.query(
+        RecommendationFeedback.user_id, Recommendation.content_id, RecommendationFeedback.feedback_type
+    ).join(Recommendation, RecommendationFeedback.recommendation_id == Recommendation.id):
+        if feedback_type in feedback_weights:
+            users.append(user_id)
+            items.append(content_id)
+            signals.append(feedback_weights[feedback_type])
+
+    user_ids, rows = np.unique(np.asarray(users, dtype=np.int64), return_inverse=True)
+    item_ids, cols = np.unique(np.asarray(items, dtype=np.int64), return_inverse=True)
+    signals = np.asarray(signals, dtype=np.float64)
+
+    # Aggregate duplicate (user, item) events: strengths add up, the net sign decides preference
+    keys, inverse = np.unique(rows * max(len(item_ids), 1) + cols, return_inverse=True)
+    strength = np.bincount(inverse, weights=np.abs(signals), minlength=len(keys))
+    net = np.bincount(inverse, weights=signals, minlength=len(keys))
+    values = settings['confidence_alpha'] * strength * np.where(net > 0, 1.0, -1.0)
+
+    matrix = sparse.csr_matrix(
+        (values, (keys // max(len(item_ids), 1), keys % max(len(item_ids), 1))),
+        shape=(len(user_ids), len(item_ids))
+    )
+    return user_ids, item_ids, matrix
+
+
+def _als_step(signed: sparse.csr_matrix, fixed: np.ndarray, regularization: float) -> np.ndarray:
+    """Solve every row's factors against the fixed side (Hu, Koren & Volinsky confidence weighting)"""
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    solved = np.zeros((signed.shape[0], factors), dtype=np.float64)
+
+    for row in range(signed.shape[0]):
+        start, end = signed.indptr[row], signed.indptr[row + 1]
+        if start == end:
+            continue
+        cols = signed.indices[start:end]
+        extra_confidence = np.abs(signed.data[start:end])
+        preference = (signed.data[start:end] > 0).astype(np.float64)
+
+        observed = fixed[cols]
+        lhs = gram + (observed.T * extra_confidence) @ observed
+        rhs = observed.T @ ((1.0 + extra_confidence) * preference)
+        solved[row] = np.linalg.solve(lhs, rhs)
+
+    return solved
+
+
+def train_factor_model(settings: Dict = None) -> Optional[Dict[str, np.ndarray]]:
+    """Train user and item factors from every interaction. Returns None when there is no data"""
+    settings = _settings(settings)
+    user_ids, item_ids, signed = load_interactions(settings)
+    if not signed.nnz:
+        return None
+
+    rng = np.random.default_rng(settings['random_seed'])
+    user_factors = rng.normal(scale=0.01, size=(len(user_ids), settings['factors']))
+    item_factors = rng.normal(scale=0.01, size=(len(item_ids), settings['factors']))
+    by_item = signed.T.tocsr()
+
+    for _ in range(settings['iterations']):
+        user_factors = _als_step(signed, item_factors, settings['regularization'])
+        item_factors = _als_step(by_item, user_factors, settings['regularization'])
+
+    return {
+        'user_ids': user_ids,
+        'item_ids': item_ids,
+        'user_factors': user_factors.astype(np.float32),
+        'item_factors': item_factors.astype(np.float32)
+    }
+
+
+def save_factor_model(model: Dict[str, np.ndarray], model_dir: str = None, keep_versions: int = None) -> str:
+    """Write a new model version and atomically point CURRENT at it. Returns the version"""
+    model_dir = model_dir or Config.MATRIX_FACTORIZATION['model_dir']
+    keep_versions = keep_versions or Config.MATRIX_FACTORIZATION['keep_versions']
+    os.makedirs(model_dir, exist_ok=True)
+
+    version = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}"
+    staging = os.path.join(model_dir, f'.{version}.tmp')
+    os.makedirs(staging)
+    for name in ARTIFACTS:
+        np.save(os.path.join(staging, f'{name}.npy'), model[name])
+
+    # Readers only ever see complete version directories and a complete pointer file
+    os.replace(staging, os.path.join(model_dir, version))
+    pointer_tmp = os.path.join(model_dir, f'.{CURRENT_POINTER}.{version}.tmp')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(model_dir, CURRENT_POINTER))
+
+    # Old versions can be removed: workers that still map them keep their pages until they reload
+    versions = sorted(name for name in os.listdir(model_dir)
+                      if not name.startswith('.') and name != CURRENT_POINTER)
+    for old_version in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(model_dir, old_version), ignore_errors=True)
+
+    logger.info(f"Saved factor model version {version} to {model_dir}")
+    return version
+
+
+def get_current_version(model_dir: str = None) -> Optional[str]:
+    """Read the version CURRENT points at, or None if no model has been trained"""
+    model_dir = model_dir or Config.MATRIX_FACTORIZATION['model_dir']
+    try:
+        with open(os.path.join(model_dir, CURRENT_POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class FactorModel:
+    """Read-only view of one trained model version, memory-mapped so workers share pages"""
+
+    def __init__(self, model_dir: str, version: str):
+        self.version = version
+        path = os.path.join(model_dir, version)
+        for name in ARTIFACTS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+
+    def __repr__(self):
+        return f'<FactorModel {self.version}: {len(self.user_ids)} users x {len(self.item_ids)} items>'
+
+    def user_row(self, user_id: int) -> Optional[int]:
+        """Get the factor row for a user, or None if they were not in the training data"""
+        pos = int(np.searchsorted(self.user_ids, user_id))
+        if pos < len(self.user_ids) and self.user_ids[pos] == user_id:
+            return pos
+        return None
+
+    def score_user(self, user_id: int, exclude_ids=None, limit: int = None) -> List[Tuple[int, float]]:
+        """Rank items for a user with one dot product against the item factors, best first"""
+        row = self.user_row(user_id)
+        if row is None:
+            return []
+
+        scores = np.asarray(self.item_factors @ self.user_factors[row], dtype=np.float64)
+        candidates = np.ones(len(scores), dtype=bool)
+        if exclude_ids:
+            excluded = np.isin(self.item_ids, np.fromiter(exclude_ids, dtype=np.int64))
+            candidates &= ~excluded
+        positions = np.flatnonzero(candidates)
+
+        if limit and len(positions) > limit:
+            threshold = np.partition(scores[positions], len(positions) - limit)[len(positions) - limit]
+            positions = positions[scores[positions] >= threshold]
+
+        order = positions[np.lexsort((self.item_ids[positions], -scores[positions]))]
+        if limit:
+            order = order[:limit]
+        return [(int(self.item_ids[i]), float(scores[i])) for i in order]
+
+
+_model_lock = threading.Lock()
+_cached_model = None
+
+
+def get_factor_model(model_dir: str = None) -> Optional[FactorModel]:
+    """Get the current factor model, remapping when the nightly job has published a new version"""
+    global _cached_model
+
+    model_dir = model_dir or Config.MATRIX_FACTORIZATION['model_dir']
+    version = get_current_version(model_dir)
+    if version is None:
+        return None
+
+    with _model_lock:
+        if _cached_model is None or _cached_model.version != version:
+            try:
+                _cached_model = FactorModel(model_dir, version)
+                logger.info(f"Loaded factor model: {_cached_model}")
+            except OSError as e:
+                # Keep serving the mapped version if the new one was pruned between reads
+                logger.error(f"Error loading factor model version {version}: {str(e)}")
+        return _cached_model
+
+
+def retrain_factor_model(settings: Dict = None) -> Optional[str]:
+    """Train on the current database and publish a new version. Returns the version"""
+    settings = _settings(settings)
+    model = train_factor_model(settings)
+    if model is None:
+        logger.info("No interactions available, skipping factor model training")
+        return None
+    return save_factor_model(model, settings['model_dir'], settings['keep_versions'])
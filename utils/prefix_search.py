@@ -0,0 +1,170 @@
+"""
+Typeahead search index for WatchTogether
+Keeps SearchToken edge n-grams for users, groups, content and proposals current through session hooks
+"""
+
+import logging
+from app import db
+from models import User, Group, Content, ContentProposal, SearchToken, SearchIndexState
+from datetime import datetime
+from sqlalchemy import event, inspect
+from typing import Dict, Iterable, List, Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+# entity type -> (model, [(column, weight, long_text)]); long text fields index fewer, longer prefixes
+SEARCHABLE = {
+    'user': (User, [('username', 3.0, False), ('first_name', 2.0, False), ('last_name', 2.0, False)]),
+    'group': (Group, [('name', 3.0, False), ('description', 1.0, True)]),
+    'content': (Content, [('title', 3.0, False), ('description', 1.0, True)]),
+    'proposal': (ContentProposal, [('title', 3.0, False), ('description', 1.0, True), ('reason', 1.0, True)]),
+}
+ENTITY_TYPES = {model: entity_type for entity_type, (model, _) in SEARCHABLE.items()}
+
+LONG_TEXT_MIN_PREFIX = 3
+LONG_TEXT_MAX_WORDS = 50
+REINDEX_BATCH_SIZE = 500
+
+# Lets one of several PostgreSQL workers booting together run the backfill (pg_try_advisory_xact_lock key)
+BACKFILL_LOCK = 7261842
+
+
+def token_rows(entity_type: str, entity_id: int, values: Dict[str, Optional[str]]) -> List[Dict]:
+    """SearchToken rows for one entity; each prefix keeps its best score across fields"""
+    scores = {}
+    for column, weight, long_text in SEARCHABLE[entity_type][1]:
+        words = list(dict.fromkeys(SearchToken.normalize_words(values.get(column))))
+        min_length = 1
+        if long_text:
+            words, min_length = words[:LONG_TEXT_MAX_WORDS], LONG_TEXT_MIN_PREFIX
+        for word in words:
+            word = word[:SearchToken.MAX_PREFIX_LENGTH]
+            for length in range(min_length, len(word) + 1):
+                prefix = word[:length]
+                score = weight * 2 if length == len(word) else weight
+                if score > scores.get(prefix, 0):
+                    scores[prefix] = score
+    return [{'entity_type': entity_type, 'entity_id': entity_id, 'prefix': prefix, 'score': score}
+            for prefix, score in scores.items()]
+
+
+def _write_tokens(connection, entity_type: str, rows_by_id: Dict[int, Dict]):
+    table = SearchToken.__table__
+    connection.execute(table.delete().where(table.c.entity_type == entity_type,
+                                            table.c.entity_id.in_(list(rows_by_id))))
+    tokens = [token for entity_id, values in rows_by_id.items() if values is not None
+              for token in token_rows(entity_type, entity_id, values)]
+    if tokens:
+        connection.execute(table.insert(), tokens)
+
+
+def reindex(entity_type: str, entity_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild tokens for some entities of a type (all of them when entity_ids is None); returns entities indexed
+
+    Used for writes that bypass the ORM hooks, such as bulk upserts.
+    """
+    model, fields = SEARCHABLE[entity_type]
+    columns = [getattr(model, column) for column, _, _ in fields]
+    table = SearchToken.__table__
+
+    if entity_ids is None:
+        db.session.execute(table.delete().where(table.c.entity_type == entity_type))
+        ids = [entity_id for (entity_id,) in db.session.query(model.id)]
+    else:
+        ids = list(entity_ids)
+
+    connection = db.session.connection()
+    for start in range(0, len(ids), REINDEX_BATCH_SIZE):
+        batch = ids[start:start + REINDEX_BATCH_SIZE]
+        rows_by_id = dict.fromkeys(batch)  # Deleted entities keep None and only lose their tokens
+        for entity_id, *values in db.session.query(model.id, *columns).filter(model.id.in_(batch)):
+            rows_by_id[entity_id] = dict(zip((column for column, _, _ in fields), values))
+        _write_tokens(connection, entity_type, rows_by_id)
+    return len(ids)
+
+
+def rebuild_search_index() -> Dict[str, int]:
+    """Rebuild every entity type's tokens from scratch, e.g. after changing the tokenizer
+
+    Also creates indexes missing from a search_token table made before they existed (the table
+    is emptied first, so a unique index cannot trip over old duplicates).
+    """
+    db.session.execute(SearchToken.__table__.delete())
+    for index in SearchToken.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+    counts = {entity_type: reindex(entity_type) for entity_type in SEARCHABLE}
+    _mark_backfilled(SEARCHABLE)
+    db.session.commit()
+    logger.info(f"Rebuilt search index: {counts}")
+    return counts
+
+
+def _mark_backfilled(entity_types):
+    db.session.query(SearchIndexState).filter(SearchIndexState.entity_type.in_(list(entity_types)))\
+              .delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.session.add_all([SearchIndexState(entity_type=entity_type, backfilled_at=now) for entity_type in entity_types])
+
+
+def backfill_search_index() -> Dict[str, int]:
+    """Index rows that predate the search hooks, once per entity type; run at app start
+
+    Only entities with no tokens at all are tokenized, and each finished type is marked in
+    SearchIndexState, so later starts cost one query. On PostgreSQL a worker that cannot take
+    the advisory lock skips the backfill, leaving it to the worker that holds it.
+    Returns the entities indexed per type.
+    """
+    done = {entity_type for (entity_type,) in db.session.query(SearchIndexState.entity_type)}
+    if done.issuperset(SEARCHABLE):
+        return {}
+
+    if db.engine.dialect.name == 'postgresql':
+        if not db.session.execute(db.text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': BACKFILL_LOCK}).scalar():
+            db.session.rollback()
+            return {}
+        done = {entity_type for (entity_type,) in db.session.query(SearchIndexState.entity_type)}
+
+    counts = {}
+    for entity_type, (model, _) in SEARCHABLE.items():
+        if entity_type in done:
+            continue
+        has_tokens = db.session.query(SearchToken.id).filter(
+            SearchToken.entity_type == entity_type, SearchToken.entity_id == model.id
+        ).exists()
+        counts[entity_type] = reindex(entity_type, [entity_id for (entity_id,) in
+                                                    db.session.query(model.id).filter(~has_tokens)])
+    _mark_backfilled(counts)
+    db.session.commit()
+    logger.info(f"Backfilled search index: {counts}")
+    return counts
+
+
+def _search_fields_changed(obj, fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column, _, _ in fields)
+
+
+def _after_flush(session, flush_context):
+    """Re-tokenize searchable entities inserted, edited or deleted in this flush, in the same transaction"""
+    changed = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        entity_type = ENTITY_TYPES.get(type(obj))
+        if entity_type is None:
+            continue
+        fields = SEARCHABLE[entity_type][1]
+        if obj in session.deleted:
+            changed.setdefault(entity_type, {})[obj.id] = None
+        elif obj in session.new or _search_fields_changed(obj, fields):
+            changed.setdefault(entity_type, {})[obj.id] = {column: getattr(obj, column) for column, _, _ in fields}
+
+    if changed:
+        connection = session.connection()
+        for entity_type, rows_by_id in changed.items():
+            _write_tokens(connection, entity_type, rows_by_id)
+
+
+def register_search_hooks():
+    """Keep the index current on every flush of the app session (idempotent)"""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
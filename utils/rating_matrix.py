@@ -0,0 +1,200 @@
+"""
+Sparse rating matrix for WatchTogether
+Loads ContentRating into a compact user x item CSR matrix for vectorized collaborative filtering
+"""
+
+import logging
+import threading
+import numpy as np
+from scipy import sparse
+from app import db
+from models import ContentRating
+from typing import List, Tuple, Optional
+from sqlalchemy import func
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+class RatingMatrix:
+    """User x item rating matrix with row (user) and column (content) id mappings"""
+
+    def __init__(self, user_ids, content_ids, ratings, fingerprint=None):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float32)
+
+        # Map database ids to dense row/column positions
+        self.user_ids, rows = np.unique(user_ids, return_inverse=True)
+        self.content_ids, cols = np.unique(content_ids, return_inverse=True)
+        self.fingerprint = fingerprint
+
+        shape = (len(self.user_ids), len(self.content_ids))
+        self.matrix = sparse.csr_matrix((ratings, (rows, cols)), shape=shape, dtype=np.float32)
+        self.matrix.sum_duplicates()
+
+        # Column-major copy for fast slicing of the items a user has rated
+        self.by_item = self.matrix.tocsc()
+
+    def __repr__(self):
+        return f'<RatingMatrix {self.matrix.shape[0]} users x {self.matrix.shape[1]} items, {self.matrix.nnz} ratings>'
+
+    @classmethod
+    def from_database(cls):
+        """Build the matrix from every ContentRating row in a single query"""
+        fingerprint = cls.current_fingerprint()
+        rows = db.session.query(
+            ContentRating.user_id,
+            ContentRating.content_id,
+            ContentRating.rating
+        ).all()
+
+        if rows:
+            user_ids, content_ids, ratings = zip(*rows)
+        else:
+            user_ids, content_ids, ratings = (), (), ()
+
+        return cls(user_ids, content_ids, ratings, fingerprint=fingerprint)
+
+    @staticmethod
+    def current_fingerprint() -> Tuple:
+        """Cheap aggregate that changes whenever ratings are added, edited or deleted"""
+        count, max_id, last_updated = db.session.query(
+            func.count(ContentRating.id),
+            func.max(ContentRating.id),
+            func.max(ContentRating.updated_at)
+        ).one()
+        return (count, max_id, last_updated)
+
+    def user_row(self, user_id: int) -> Optional[int]:
+        """Get the matrix row for a user, or None if they have no ratings"""
+        pos = np.searchsorted(self.user_ids, user_id)
+        if pos < len(self.user_ids) and self.user_ids[pos] == user_id:
+            return int(pos)
+        return None
+
+    def has_user(self, user_id: int) -> bool:
+        """Check if a user has at least one rating"""
+        return self.user_row(user_id) is not None
+
+    def get_user_ratings(self, user_id: int) -> dict:
+        """Get a user's ratings as {content_id: rating}"""
+        row = self.user_row(user_id)
+        if row is None:
+            return {}
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return {
+            int(content_id): int(rating)
+            for content_id, rating in zip(self.content_ids[self.matrix.indices[start:end]],
+                                          self.matrix.data[start:end])
+        }
+
+    def similar_users(self, user_id: int, min_common: int = 3, min_similarity: float = 0.1,
+                      limit: int = None) -> List[Tuple[int, float]]:
+        """Find users with similar rating patterns using cosine similarity over co-rated items"""
+        row = self.user_row(user_id)
+        if row is None:
+            return []
+
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        item_cols = self.matrix.indices[start:end]
+        user_values = self.matrix.data[start:end].astype(np.float64)
+
+        # Restrict every user to the items the target user rated
+        co_rated = self.by_item[:, item_cols].tocsr()
+        co_rated_mask = co_rated.copy()
+        co_rated_mask.data = np.ones_like(co_rated_mask.data)
+
+        dot = co_rated @ user_values
+        common = co_rated_mask @ np.ones(len(item_cols))
+        user_norm_sq = co_rated_mask @ (user_values ** 2)
+        other_norm_sq = co_rated.multiply(co_rated) @ np.ones(len(item_cols))
+
+        candidates = common >= min_common
+        candidates[row] = False
+        candidates &= (user_norm_sq > 0) & (other_norm_sq > 0)
+
+        candidate_rows = np.flatnonzero(candidates)
+        similarity = dot[candidate_rows] / (
+            np.sqrt(user_norm_sq[candidate_rows]) * np.sqrt(other_norm_sq[candidate_rows])
+        )
+        keep = similarity > min_similarity
+        candidate_rows = candidate_rows[keep]
+        similarity = similarity[keep]
+
+        # Top-k selection; ties at the cut-off are kept and broken by user id below
+        if limit and len(candidate_rows) > limit:
+            threshold = np.partition(similarity, len(similarity) - limit)[len(similarity) - limit]
+            keep = similarity >= threshold
+            candidate_rows = candidate_rows[keep]
+            similarity = similarity[keep]
+
+        neighbour_ids = self.user_ids[candidate_rows]
+        order = np.lexsort((neighbour_ids, -similarity))
+        if limit:
+            order = order[:limit]
+
+        return [(int(neighbour_ids[i]), float(similarity[i])) for i in order]
+
+    def score_items(self, user_id: int, neighbours: List[Tuple[int, float]],
+                    min_rating: int = 4) -> List[Tuple[int, float, int]]:
+        """Score items the user hasn't rated by the average similarity-weighted neighbour rating
+
+        Returns (content_id, score, supporting_neighbours) sorted by score, best first.
+        """
+        if not neighbours:
+            return []
+
+        neighbour_rows = [self.user_row(neighbour_id) for neighbour_id, _ in neighbours]
+        similarities = np.array([similarity for _, similarity in neighbours], dtype=np.float64)
+
+        neighbour_matrix = self.matrix[neighbour_rows].astype(np.float64)
+        neighbour_matrix.data[neighbour_matrix.data < min_rating] = 0
+        neighbour_matrix.eliminate_zeros()
+
+        support_matrix = neighbour_matrix.copy()
+        support_matrix.data = np.ones_like(support_matrix.data)
+
+        weighted = neighbour_matrix.multiply(similarities[:, np.newaxis] / 5.0).tocsr()
+        score_sums = np.asarray(weighted.sum(axis=0)).ravel()
+        support = np.asarray(support_matrix.sum(axis=0)).ravel()
+
+        # Drop items the user has already rated
+        user_row = self.user_row(user_id)
+        if user_row is not None:
+            start, end = self.matrix.indptr[user_row], self.matrix.indptr[user_row + 1]
+            support[self.matrix.indices[start:end]] = 0
+
+        item_cols = np.flatnonzero(support)
+        scores = score_sums[item_cols] / support[item_cols]
+        item_ids = self.content_ids[item_cols]
+        order = np.lexsort((item_ids, -scores))
+
+        return [
+            (int(item_ids[i]), float(scores[i]), int(support[item_cols[i]]))
+            for i in order
+        ]
+
+
+_matrix_lock = threading.Lock()
+_cached_matrix = None
+
+
+def get_rating_matrix() -> RatingMatrix:
+    """Get the shared rating matrix, rebuilding it when ContentRating has changed"""
+    global _cached_matrix
+
+    fingerprint = RatingMatrix.current_fingerprint()
+    with _matrix_lock:
+        if _cached_matrix is None or _cached_matrix.fingerprint != fingerprint:
+            _cached_matrix = RatingMatrix.from_database()
+            logger.info(f"Rebuilt rating matrix: {_cached_matrix}")
+        return _cached_matrix
+
+
+def invalidate_rating_matrix():
+    """Drop the shared rating matrix so the next request rebuilds it"""
+    global _cached_matrix
+
+    with _matrix_lock:
+        _cached_matrix = None
@@ -0,0 +1,211 @@
+"""
+In-process caches for the recommendation system
+TTL + LRU caches sized and enabled by RecommendationConfig.CACHING, kept coherent across workers by DB version stamps
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from app import db
+from models import GroupMember, RecommendationCacheVersion
+from sqlalchemy.exc import IntegrityError
+from utils.recommendation_config import Config
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live"""
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        """Get a live value, counting a hit or a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting least recently used entries beyond maxsize"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_prefix(self, prefix: tuple):
+        """Drop every tuple key starting with prefix"""
+        with self._lock:
+            stale = [key for key in self._entries if isinstance(key, tuple) and key[:len(prefix)] == prefix]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+
+def _build_cache(name: str) -> TTLCache:
+    return TTLCache(name, Config.CACHING['cache_size_limit'], Config.get_cache_expiration().total_seconds())
+
+
+profile_cache = _build_cache('profiles')
+candidate_cache = _build_cache('candidates')
+
+
+def snapshot_profile(profile):
+    """Detached, read-only copy of a profile's columns that is safe to share across requests
+
+    The copy is never added to a session, so caching it cannot leak ORM state between requests.
+    """
+    model = type(profile)
+    return model(**{column.key: getattr(profile, column.key) for column in model.__table__.columns})
+
+
+def get_cache_version(target_type: str, target_id: int) -> int:
+    """Current invalidation version of a target; read it before loading what will be cached"""
+    version = db.session.query(RecommendationCacheVersion.version).filter_by(
+        target_type=target_type, target_id=target_id
+    ).scalar()
+    return version or 0
+
+
+def _get_current(cache: TTLCache, key: tuple, version: int):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] != version:  # Invalidated by a write, possibly in another worker
+        cache.invalidate(key)
+        return None
+    return entry[1]
+
+
+def cached_profile(target_type: str, target_id: int, loader: Callable, version: int):
+    """Get a user or group profile, honoring cache_user_profiles / cache_group_profiles
+
+    A miss returns the loader's live profile and caches a snapshot of it under version.
+    """
+    setting = 'cache_user_profiles' if target_type == 'user' else 'cache_group_profiles'
+    if not Config.CACHING[setting]:
+        return loader()
+
+    key = (target_type, target_id)
+    profile = _get_current(profile_cache, key, version)
+    if profile is None:
+        profile = loader()
+        profile_cache.set(key, (version, snapshot_profile(profile)))
+    return profile
+
+
+def get_cached_candidates(target_type: str, target_id: int, algorithm: str, limit: int,
+                          version: int) -> Optional[List[Tuple]]:
+    """Cached (content_id, score, reasoning) candidates, or None on a miss, a stale version or when disabled"""
+    if not Config.CACHING['enable_recommendation_cache']:
+        return None
+    return _get_current(candidate_cache, (target_type, target_id, algorithm, limit), version)
+
+
+def cache_candidates(target_type: str, target_id: int, algorithm: str, limit: int,
+                     recommendations: List[Tuple], version: int):
+    """Cache an algorithm's (content, score, reasoning) output as bare content ids"""
+    if Config.CACHING['enable_recommendation_cache']:
+        candidate_cache.set((target_type, target_id, algorithm, limit), (version, [
+            (content.id, score, reasoning) for content, score, reasoning in recommendations
+        ]))
+
+
+def _bump_versions(target_type: str, target_ids: List[int]):
+    """Advance targets' versions so every worker's cached entries for them go stale; commits"""
+    def bump(target_id):
+        return RecommendationCacheVersion.query.filter_by(target_type=target_type, target_id=target_id)\
+                                         .update({'version': RecommendationCacheVersion.version + 1},
+                                                 synchronize_session=False)
+
+    for target_id in target_ids:
+        if bump(target_id):
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(RecommendationCacheVersion(target_type=target_type, target_id=target_id, version=1))
+        except IntegrityError:
+            bump(target_id)  # Another worker created the row first
+    db.session.commit()
+
+
+def invalidate_user_cache(user_id: int, include_groups: bool = True):
+    """Drop a user's cached profile and candidates, and those of the groups they belong to, in every worker
+
+    Called after the triggering write is committed.
+    """
+    profile_cache.invalidate(('user', user_id))
+    candidate_cache.invalidate_prefix(('user', user_id))
+    _bump_versions('user', [user_id])
+
+    if include_groups:
+        for (group_id,) in db.session.query(GroupMember.group_id).filter_by(user_id=user_id).all():
+            invalidate_group_cache(group_id)
+
+
+def invalidate_group_cache(group_id: int):
+    """Drop a group's cached profile and candidates in every worker (membership or group watchlist changed)"""
+    profile_cache.invalidate(('group', group_id))
+    candidate_cache.invalidate_prefix(('group', group_id))
+    _bump_versions('group', [group_id])
+
+
+def clear_recommendation_caches():
+    profile_cache.clear()
+    candidate_cache.clear()
+
+
+def get_cache_stats() -> Dict[str, Dict]:
+    """Hit/miss/eviction counters for this process's caches"""
+    return {cache.name: cache.stats() for cache in (profile_cache, candidate_cache)}
@@ -6,6 +6,13 @@ from models.recommendations import (
     RecommendationHistory, ABTestExperiment
 )
 from utils.recommendation_engine import RecommendationEngine, update_recommendation_metrics
+from utils.item_similarity import rebuild_similarity_index, refresh_similarity_index
+from utils.matrix_factorization import retrain_factor_model
+from utils.batch_generation import run_batch_generation
+from utils.recommendation_store import delete_recommendations
+from utils.tmdb_cache import get_tmdb_cache
+from utils.tmdb_importer import import_tmdb_content
+from utils import discussion_threads, prefix_search
 from datetime import datetime, timedelta
 import json
 
@@ -111,11 +118,13 @@ def update_group_profiles(group_id, all_groups, force):
 @cli.command()
 @click.option('--user-id', type=int, help='Generate recommendations for specific user')
 @click.option('--group-id', type=int, help='Generate recommendations for specific group')
-@click.option('--algorithm', default='hybrid', help='Algorithm to use (hybrid, content_based, collaborative, trending, group_consensus)')
+@click.option('--algorithm', default='hybrid', help='Algorithm to use (hybrid, content_based, collaborative, trending, group_consensus, als)')
 @click.option('--limit', default=10, help='Number of recommendations to generate')
 @click.option('--batch-size', default=50, help='Batch size for bulk generation')
 @click.option('--all-users', is_flag=True, help='Generate recommendations for all active users')
-def generate_recommendations(user_id, group_id, algorithm, limit, batch_size, all_users):
+@click.option('--workers', type=int, help='Worker processes for --all-users (defaults to the CPU count)')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an interrupted --all-users run')
+def generate_recommendations(user_id, group_id, algorithm, limit, batch_size, all_users, workers, restart):
     """Generate recommendations for users or groups"""
     app = create_app()
     engine = RecommendationEngine()
@@ -144,33 +153,118 @@ def generate_recommendations(user_id, group_id, algorithm, limit, batch_size, al
                 click.echo(f"Error generating recommendations for group {group_id}: {str(e)}")
         
         elif all_users:
-            users = User.query.filter_by(is_active=True).all()
-            total_generated = 0
+            user_ids = [user_id for (user_id,) in db.session.query(User.id).filter_by(is_active=True)]
             
-            with click.progressbar(users, label='Generating recommendations') as bar:
-                for user in bar:
-                    try:
-                        recommendations = engine.generate_recommendations(
-                            user_id=user.id,
-                            algorithm=algorithm,
-                            limit=limit
-                        )
-                        total_generated += len(recommendations)
-                    except Exception as e:
-                        click.echo(f"Error for user {user.username}: {str(e)}")
-                        continue
-                    
-                    # Commit in batches
-                    if total_generated % batch_size == 0:
-                        db.session.commit()
+            with click.progressbar(length=len(user_ids), label='Generating recommendations') as bar:
+                stats = run_batch_generation(
+                    user_ids, algorithm=algorithm, limit=limit, workers=workers,
+                    shard_size=batch_size, job_name=f'cli_{algorithm}',
+                    resume=not restart, progress=bar.update
+                )
             
-            db.session.commit()
-            click.echo(f"Generated {total_generated} total recommendations for {len(users)} users")
+            if stats['skipped_shards']:
+                click.echo(f"Resumed run: skipped {stats['skipped_shards']} already completed shards")
+            click.echo(f"Generated {stats['recommendations']} total recommendations for {stats['users']} users "
+                       f"({stats['users_per_second']:.1f} users/sec, {stats['errors']} errors)")
         
         else:
             click.echo("Please specify --user-id, --group-id, or --all-users")
 
 
+@cli.command()
+@click.option('--full', is_flag=True, help='Rebuild the whole catalog instead of only items with new ratings')
+@click.option('--neighbours', type=int, help='Number of similar items to keep per item')
+def build_similarity_index(full, neighbours):
+    """Build or incrementally refresh the item-item similarity index"""
+    app = create_app()
+    settings = {'neighbours_per_item': neighbours} if neighbours else None
+    
+    with app.app_context():
+        if full:
+            item_count, row_count = rebuild_similarity_index(settings)
+            click.echo(f"Rebuilt similarity index for {item_count} items ({row_count} neighbour rows)")
+        else:
+            item_count, row_count = refresh_similarity_index(settings=settings)
+            click.echo(f"Refreshed similarity index for {item_count} items ({row_count} neighbour rows)")
+
+
+@cli.command()
+@click.option('--factors', type=int, help='Number of latent factors')
+@click.option('--iterations', type=int, help='Number of ALS iterations')
+def train_factor_model(factors, iterations):
+    """Train the matrix factorization model and publish a new version"""
+    app = create_app()
+    settings = {key: value for key, value in (('factors', factors), ('iterations', iterations)) if value}
+    
+    with app.app_context():
+        version = retrain_factor_model(settings)
+        if version:
+            click.echo(f"Published factor model version {version}")
+        else:
+            click.echo("No ratings, watchlist or feedback data to train on")
+
+
+@cli.command()
+@click.option('--pages', default=1, help='Number of popular-list pages to import')
+@click.option('--type', 'content_type', type=click.Choice(['movie', 'tv']), default='movie', help='TMDB content type')
+@click.option('--workers', type=int, help='Concurrent detail requests')
+@click.option('--refresh-after-days', type=int, help='Re-fetch stored titles older than this')
+def import_tmdb(pages, content_type, workers, refresh_after_days):
+    """Import popular TMDB titles into the content catalog"""
+    app = create_app()
+    
+    with app.app_context():
+        stats = import_tmdb_content(
+            content_type=content_type, pages=pages, workers=workers,
+            refresh_after_days=refresh_after_days,
+            progress=lambda s: click.echo(f"  {s['inserted'] + s['updated']} titles written...")
+        )
+        click.echo(
+            f"Imported {stats['inserted']} new and {stats['updated']} updated titles "
+            f"({stats['skipped']} fresh skipped, {stats['failed']} failed) "
+            f"at {stats['items_per_second']:.1f} items/sec"
+        )
+
+
+@cli.command()
+@click.option('--purge', is_flag=True, help='Delete entries past their stale window first')
+def tmdb_cache_stats(purge):
+    """Show TMDB response cache hit/miss metrics per endpoint class"""
+    cache = get_tmdb_cache()
+    if cache is None:
+        click.echo("TMDB response caching is disabled (EXTERNAL_APIS['cache_api_responses'])")
+        return
+    
+    if purge:
+        click.echo(f"Purged {cache.purge()} stale entries")
+    
+    for endpoint_class, stats in sorted(cache.stats().items()):
+        click.echo(
+            f"{endpoint_class}: {stats.get('entries', 0)} entries ({stats.get('fresh_entries', 0)} fresh), "
+            f"{stats.get('hit', 0)} hits, {stats.get('stale_hit', 0)} stale hits, "
+            f"{stats.get('miss', 0)} misses, hit rate {stats['hit_rate']:.1%}"
+        )
+
+
+@cli.command()
+def repair_discussion_counters():
+    """Recompute discussion like/dislike/reply counters from the likes and replies tables"""
+    app = create_app()
+    
+    with app.app_context():
+        click.echo(f"Repaired counters on {discussion_threads.repair_discussion_counters()} discussions")
+
+
+@cli.command()
+def rebuild_search_index():
+    """Rebuild the typeahead search index for users, groups, content and proposals"""
+    app = create_app()
+    
+    with app.app_context():
+        for entity_type, count in prefix_search.rebuild_search_index().items():
+            click.echo(f"Indexed {count} {entity_type} rows")
+
+
 @cli.command()
 def update_metrics():
     """Update recommendation performance metrics"""
@@ -192,33 +286,19 @@ def cleanup_old_recommendations(days, dry_run):
     with app.app_context():
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # Find old recommendations
-        old_recommendations = Recommendation.query.filter(
-            Recommendation.created_at < cutoff_date
-        ).all()
-        
-        # Find expired recommendations
-        expired_recommendations = Recommendation.query.filter(
-            Recommendation.expires_at < datetime.utcnow()
-        ).all()
-        
-        total_to_delete = len(old_recommendations) + len(expired_recommendations)
+        old_criteria = Recommendation.created_at < cutoff_date
+        expired_criteria = Recommendation.expires_at < datetime.utcnow()
         
         if dry_run:
-            click.echo(f"Would delete {len(old_recommendations)} old recommendations (older than {days} days)")
-            click.echo(f"Would delete {len(expired_recommendations)} expired recommendations")
-            click.echo(f"Total: {total_to_delete} recommendations")
+            old_count = Recommendation.query.filter(old_criteria).count()
+            expired_count = Recommendation.query.filter(expired_criteria).count()
+            click.echo(f"Would delete {old_count} old recommendations (older than {days} days)")
+            click.echo(f"Would delete {expired_count} expired recommendations")
+            click.echo(f"Total: {Recommendation.query.filter(db.or_(old_criteria, expired_criteria)).count()} recommendations")
         else:
-            # Delete old recommendations
-            for rec in old_recommendations:
-                db.session.delete(rec)
-            
-            # Delete expired recommendations
-            for rec in expired_recommendations:
-                db.session.delete(rec)
-            
+            total_deleted = delete_recommendations(db.or_(old_criteria, expired_criteria))
             db.session.commit()
-            click.echo(f"Deleted {total_to_delete} old/expired recommendations")
+            click.echo(f"Deleted {total_deleted} old/expired recommendations")
 
 
 @cli.command()
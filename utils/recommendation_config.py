@@ -41,6 +41,33 @@ class RecommendationConfig:
         'similarity_decay_factor': 0.1
     }
     
+    # Item-item similarity index settings
+    ITEM_SIMILARITY = {
+        'neighbours_per_item': 20,
+        'rating_weight': 0.7,
+        'genre_weight': 0.3,
+        'min_similarity': 0.05,
+        'batch_size': 128
+    }
+    
+    # Matrix factorization (ALS) model settings
+    MATRIX_FACTORIZATION = {
+        'model_dir': os.environ.get('MF_MODEL_DIR', os.path.join('instance', 'models', 'mf')),
+        'factors': 32,
+        'iterations': 15,
+        'regularization': 0.1,
+        'confidence_alpha': 10.0,
+        'watchlist_weight': 0.6,
+        'feedback_weights': {
+            'like': 1.0,
+            'already_seen': 0.3,
+            'dislike': -1.0,
+            'not_interested': -1.0
+        },
+        'keep_versions': 3,
+        'random_seed': 42
+    }
+    
     # Trending content settings
     TRENDING = {
         'trending_window_days': 30,
@@ -118,7 +145,8 @@ class RecommendationConfig:
         'cache_expiration_hours': 6,
         'cache_size_limit': 1000,
         'cache_user_profiles': True,
-        'cache_group_profiles': True
+        'cache_group_profiles': True,
+        'exclusion_index_ttl_seconds': 300
     }
     
     # Database settings
@@ -129,6 +157,24 @@ class RecommendationConfig:
         'cleanup_frequency_days': 7
     }
     
+    # Batch recommendation generation settings
+    BATCH_GENERATION = {
+        'workers': os.cpu_count() or 1,
+        'shard_size': 200,
+        'checkpoint_dir': os.path.join('instance', 'batch_generation')
+    }
+    
+    # Bulk TMDB import settings
+    TMDB_IMPORT = {
+        'workers': 8,
+        'batch_size': 50,
+        'refresh_after_days': 30,  # Stored titles updated more recently are skipped
+        'local_max_age_days': 7,  # Detail pages serve stored titles younger than this without calling TMDB
+        'refresh_budget_per_run': 200,  # Stale titles re-fetched per hourly refresh run
+        'refresh_popularity_days': 7,  # Window of watchlist adds/ratings used to prioritise refreshes
+        'refresh_failure_backoff_days': 2  # Titles TMDB failed to return (e.g. removed, 404) wait this long to retry
+    }
+    
     # Content filtering settings
     CONTENT_FILTERING = {
         'exclude_adult_content': True,
@@ -170,9 +216,39 @@ class RecommendationConfig:
     
     # External API settings
     EXTERNAL_APIS = {
-        'tmdb_api_timeout': 10,
+        'tmdb_api_timeout': 10,  # Read timeout per attempt
+        'tmdb_connect_timeout': 3.05,
+        'tmdb_pool_size': 20,
+        'tmdb_max_retries': 3,
+        'tmdb_backoff_seconds': 0.5,
+        'tmdb_max_backoff_seconds': 8,
+        'tmdb_retry_budget_seconds': 15,  # Total time spent waiting between retries
+        'tmdb_page_deadline_seconds': 4,  # Page-level TMDB budget; slower calls fall back to cached data
+        'tmdb_fan_out_workers': 16,
         'cache_api_responses': True,
-        'api_rate_limit_per_minute': 40
+        'api_rate_limit_per_minute': 40,  # Shared by every worker process
+        'tmdb_rate_limit_burst': 10,
+        'tmdb_interactive_reserve': 3,  # Tokens bulk imports must leave for detail/search calls
+        'tmdb_rate_limit_wait_seconds': {'interactive': 5, 'bulk': 120},
+        'tmdb_rate_limit_path': os.environ.get('TMDB_RATE_LIMIT_PATH', os.path.join('instance', 'tmdb_rate_limit.sqlite3')),
+        'tmdb_backend': os.environ.get('TMDB_BACKEND', 'http'),  # http, replay, record or synthetic
+        'tmdb_fixture_dir': os.environ.get('TMDB_FIXTURE_DIR', os.path.join('instance', 'tmdb_fixtures')),
+        'tmdb_synthetic_size': int(os.environ.get('TMDB_SYNTHETIC_SIZE', 1000)),
+        'tmdb_synthetic_seed': int(os.environ.get('TMDB_SYNTHETIC_SEED', 7)),
+        'tmdb_cache_path': os.environ.get('TMDB_CACHE_PATH', os.path.join('instance', 'tmdb_cache.sqlite3')),
+        'tmdb_cache_ttl_seconds': {
+            'trending': 15 * 60,
+            'popular': 60 * 60,
+            'discover': 60 * 60,
+            'search': 6 * 60 * 60,
+            'similar': 24 * 60 * 60,
+            'details': 7 * 24 * 60 * 60,
+            'genres': 7 * 24 * 60 * 60,
+            'configuration': 7 * 24 * 60 * 60,
+            'not_found': 24 * 60 * 60,  # Negative entries, e.g. a movie id probed as a TV show
+            'default': 60 * 60
+        },
+        'tmdb_cache_stale_seconds': 24 * 60 * 60  # Serve expired entries this long while refreshing
     }
     
     # Security settings
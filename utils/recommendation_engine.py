@@ -12,9 +12,18 @@ from models.recommendations import (
     SocialRecommendationSignal, FriendRecommendation, GroupRecommendationSession,
     GroupRecommendationVote, TrendingContent, RecommendationShare, SocialRecommendationInsight
 )
+from utils.rating_matrix import get_rating_matrix
+from utils.content_features import get_content_feature_store
+from utils.matrix_factorization import get_factor_model
+from utils.exclusion_index import get_exclusion_index, exclude_content, invalidate_exclusions
+from utils.recommendation_cache import get_cache_version, cached_profile, get_cached_candidates, cache_candidates
+from utils.recommendation_store import (
+    insert_recommendations, insert_history, expire_recommendations, archive_overflow
+)
 from datetime import datetime, timedelta
 import json
 import math
+import numpy as np
 from collections import defaultdict, Counter
 from typing import List, Dict, Tuple, Optional
 from sqlalchemy import and_, or_, func, desc
@@ -33,6 +42,8 @@ class RecommendationEngine:
             'hybrid': self._hybrid_filtering,
             'trending': self._trending_content,
             'group_consensus': self._group_consensus_filtering,
+            'als': self._matrix_factorization,
+            'mf': self._matrix_factorization,
             'social_collaborative': self._social_collaborative_filtering,
             'friend_based': self._friend_based_filtering,
             'social_hybrid': self._social_hybrid_filtering,
@@ -54,15 +65,61 @@ class RecommendationEngine:
         # Clean up expired recommendations first
         self._cleanup_expired_recommendations(user_id=user_id, group_id=group_id)
         
-        # Get or create preference profile
+        final_recommendations, algorithm, variant = self.score_recommendations(
+            user_id=user_id, group_id=group_id, algorithm=algorithm,
+            limit=limit, experiment_id=experiment_id
+        )
+        
+        # Save recommendations and history with set-based statements
+        now = datetime.utcnow()
+        insert_recommendations([
+            {
+                'user_id': user_id,
+                'group_id': group_id,
+                'content_id': content.id,
+                'score': score,
+                'algorithm': algorithm,
+                'reasoning': reasoning,
+                'experiment_id': experiment_id,
+                'variant': variant,
+                'created_at': now,
+                'expires_at': now + timedelta(days=7)
+            }
+            for content, score, reasoning in final_recommendations
+        ])
+        
+        # Update recommendation history
+        self._update_recommendation_history(
+            user_id, group_id, algorithm, len(final_recommendations),
+            experiment_id, variant
+        )
+        
+        db.session.commit()
+        exclude_content([content.id for content, _, _ in final_recommendations],
+                        user_id=user_id, group_id=group_id)
+        
+        saved_query = Recommendation.query.filter_by(status='active', created_at=now)
+        if user_id:
+            saved_query = saved_query.filter_by(user_id=user_id)
+        else:
+            saved_query = saved_query.filter_by(group_id=group_id)
+        return saved_query.order_by(Recommendation.score.desc()).all()
+    
+    def score_recommendations(self, user_id: int = None, group_id: int = None,
+                              algorithm: str = 'hybrid', limit: int = 10,
+                              experiment_id: str = None) -> Tuple[List[Tuple], str, Optional[str]]:
+        """Rank filtered (content, score, reasoning) tuples without saving them
+        
+        Returns (recommendations, algorithm, variant); the algorithm may be replaced by an A/B test variant.
+        """
+        # Get or create preference profile; the cache version is read first so writes during the load stale it
+        target_type, target_id = ('user', user_id) if user_id else ('group', group_id)
+        cache_version = get_cache_version(target_type, target_id)
         if user_id:
-            profile = self._get_or_create_user_profile(user_id)
-            target_type = 'user'
-            target_id = user_id
+            loader = lambda: self._get_or_create_user_profile(user_id)
         else:
-            profile = self._get_or_create_group_profile(group_id)
-            target_type = 'group'
-            target_id = group_id
+            loader = lambda: self._get_or_create_group_profile(group_id)
+        profile = cached_profile(target_type, target_id, loader, cache_version)
         
         # Check for A/B test assignment
         variant = None
@@ -77,73 +134,42 @@ class RecommendationEngine:
                 variant_config = experiment.get_variants().get(variant, {})
                 algorithm = variant_config.get('algorithm', algorithm)
         
-        # Generate recommendations using specified algorithm
-        algorithm_func = self.algorithms.get(algorithm, self._hybrid_filtering)
-        recommendations = algorithm_func(profile, limit * 2)  # Generate more for filtering
-        
-        # Filter out already seen/rated content
-        filtered_recommendations = self._filter_recommendations(
-            recommendations, user_id, group_id
-        )
-        
-        # Limit to requested number
-        final_recommendations = filtered_recommendations[:limit]
-        
-        # Save recommendations to database
-        saved_recommendations = []
-        for content, score, reasoning in final_recommendations:
-            rec = Recommendation(
-                user_id=user_id,
-                group_id=group_id,
-                content_id=content.id,
-                score=score,
-                algorithm=algorithm,
-                reasoning=reasoning,
-                experiment_id=experiment_id,
-                variant=variant,
-                expires_at=datetime.utcnow() + timedelta(days=7)
+        # Reuse cached candidates while they still fill the limit after fresh exclusion filtering
+        filtered_recommendations = None
+        cached = get_cached_candidates(target_type, target_id, algorithm, limit, cache_version)
+        if cached is not None:
+            filtered_recommendations = self._filter_recommendations(
+                self._hydrate_scored_content(cached, len(cached)), user_id, group_id
+            )
+            if len(filtered_recommendations) < limit:
+                filtered_recommendations = None
+        
+        if filtered_recommendations is None:
+            # Generate recommendations using specified algorithm
+            algorithm_func = self.algorithms.get(algorithm, self._hybrid_filtering)
+            recommendations = algorithm_func(profile, limit * 2)  # Generate more for filtering
+            cache_candidates(target_type, target_id, algorithm, limit, recommendations, cache_version)
+            
+            # Filter out already seen/rated content
+            filtered_recommendations = self._filter_recommendations(
+                recommendations, user_id, group_id
             )
-            db.session.add(rec)
-            saved_recommendations.append(rec)
-        
-        # Update recommendation history
-        self._update_recommendation_history(
-            user_id, group_id, algorithm, len(saved_recommendations),
-            experiment_id, variant
-        )
         
-        db.session.commit()
-        return saved_recommendations
+        # Limit to requested number
+        return filtered_recommendations[:limit], algorithm, variant
     
     def _cleanup_expired_recommendations(self, user_id: int = None, group_id: int = None):
         """Remove expired and old recommendations to prevent clutter"""
-        query = Recommendation.query.filter(
-            Recommendation.expires_at < datetime.utcnow()
-        )
+        user_ids = [user_id] if user_id else None
+        group_ids = [group_id] if group_id and not user_id else None
         
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        elif group_id:
-            query = query.filter_by(group_id=group_id)
-        
-        expired_recs = query.all()
-        for rec in expired_recs:
-            rec.status = 'expired'
-        
-        # Also limit the number of active recommendations per user/group
-        active_query = Recommendation.query.filter_by(status='active')
-        if user_id:
-            active_query = active_query.filter_by(user_id=user_id)
-        elif group_id:
-            active_query = active_query.filter_by(group_id=group_id)
-        
-        active_recs = active_query.order_by(Recommendation.created_at.desc()).all()
+        changed = expire_recommendations(user_ids=user_ids, group_ids=group_ids)
         
         # Keep only the most recent 50 active recommendations
-        if len(active_recs) > 50:
-            old_recs = active_recs[50:]
-            for rec in old_recs:
-                rec.status = 'archived'
+        changed += archive_overflow(user_ids=user_ids, group_ids=group_ids, keep=50)
+        
+        if changed:
+            invalidate_exclusions(user_id=user_id, group_id=group_id)
     
     def _should_generate_new_recommendations(self, user_id: int = None, group_id: int = None, 
                                            min_interval_hours: int = 6) -> bool:
@@ -170,8 +196,8 @@ class RecommendationEngine:
             profile = UserPreferenceProfile(user_id=user_id)
             db.session.add(profile)
             self._analyze_user_preferences(profile)
-        elif profile.last_updated < datetime.utcnow() - timedelta(days=7):
-            # Update profile if it's older than a week
+        elif profile.get_preference_stats() is None:
+            # Profiles created before incremental updates need their stats built once
             self._analyze_user_preferences(profile)
         
         return profile
@@ -190,72 +216,41 @@ class RecommendationEngine:
         return profile
     
     def _analyze_user_preferences(self, profile: UserPreferenceProfile):
-        """Analyze user's ratings and watchlist to build preference profile"""
-        user = profile.user
-        
-        # Analyze ratings
-        ratings = ContentRating.query.filter_by(user_id=user.id).all()
-        genre_scores = defaultdict(list)
-        type_scores = defaultdict(list)
+        """Rebuild the profile's running stats from every rating and watchlist item
         
-        for rating in ratings:
-            content = rating.content
-            score = rating.rating
-            
-            # Weight by rating (higher ratings contribute more)
-            weight = score / 5.0
-            
-            # Analyze genres
-            for genre in content.get_genres():
-                genre_scores[genre].append(weight)
-            
-            # Analyze content types
-            type_scores[content.type].append(weight)
+        Day-to-day changes are applied incrementally (see apply_rating_change and
+        apply_watchlist_change); this full rebuild seeds new profiles and serves as a
+        periodic consistency check.
+        """
+        # Use the foreign key: a freshly created profile is still pending and has no loaded user
+        user_id = profile.user_id
+        stats = UserPreferenceProfile.empty_preference_stats()
         
-        # Calculate average scores for genres and types
-        genre_preferences = {
-            genre: sum(scores) / len(scores) 
-            for genre, scores in genre_scores.items()
-        }
-        type_preferences = {
-            content_type: sum(scores) / len(scores)
-            for content_type, scores in type_scores.items()
-        }
+        # Analyze ratings, weighted by rating (higher ratings contribute more)
+        ratings = db.session.query(ContentRating.rating, Content.genre, Content.type).join(
+            Content, ContentRating.content_id == Content.id
+        ).filter(ContentRating.user_id == user_id)
+        for rating, genre, content_type in ratings:
+            UserPreferenceProfile._add_to_stats(stats, Content.parse_genres(genre), content_type,
+                                                rating / 5.0, 1)
+            stats['ratings'] += 1
         
         # Analyze watchlist for additional preferences
-        watchlist_items = UserWatchlist.query.filter_by(user_id=user.id).all()
-        for item in watchlist_items:
-            content = item.content
-            # Give moderate weight to watchlisted items
-            weight = 0.6
-            
-            for genre in content.get_genres():
-                if genre not in genre_preferences:
-                    genre_preferences[genre] = weight
-                else:
-                    genre_preferences[genre] = (genre_preferences[genre] + weight) / 2
-            
-            if content.type not in type_preferences:
-                type_preferences[content.type] = weight
-            else:
-                type_preferences[content.type] = (type_preferences[content.type] + weight) / 2
+        watchlist_items = db.session.query(Content.genre, Content.type).join(
+            UserWatchlist, UserWatchlist.content_id == Content.id
+        ).filter(UserWatchlist.user_id == user_id)
+        for genre, content_type in watchlist_items:
+            UserPreferenceProfile._add_to_stats(stats, Content.parse_genres(genre), content_type,
+                                                watchlist_count=1)
+            stats['watchlist'] += 1
         
         # Update profile
-        profile.set_genre_preferences(genre_preferences)
-        profile.set_content_type_preferences(type_preferences)
-        
-        # Calculate confidence score based on data available
-        total_ratings = len(ratings)
-        total_watchlist = len(watchlist_items)
-        confidence = min(1.0, (total_ratings * 0.7 + total_watchlist * 0.3) / 20)
-        profile.confidence_score = confidence
-        
-        profile.last_updated = datetime.utcnow()
+        profile.set_preference_stats(stats)
+        profile.refresh_preferences_from_stats()
     
     def _analyze_group_preferences(self, profile: GroupPreferenceProfile):
         """Analyze group members' preferences to build group profile"""
-        group = profile.group
-        members = GroupMember.query.filter_by(group_id=group.id).all()
+        members = GroupMember.query.filter_by(group_id=profile.group_id).all()
         
         all_genre_prefs = []
         all_type_prefs = []
@@ -307,34 +302,34 @@ class RecommendationEngine:
         if not genre_prefs and not type_prefs:
             return self._get_popular_content_fallback(profile, limit)
         
-        # Query content
-        content_query = Content.query.filter_by(status='active')
+        # Score the whole active catalog at once from the cached feature matrices
+        store = get_content_feature_store()
+        mask = np.ones(len(store), dtype=bool)
         
         # Apply preference filters if available
         if hasattr(profile, 'get_rating_range'):
             min_rating, max_rating = profile.get_rating_range()
-            content_query = content_query.filter(
-                and_(Content.rating >= min_rating, Content.rating <= max_rating)
-            )
+            mask &= store.rating_mask(min_rating, max_rating)
         
         if hasattr(profile, 'get_year_range'):
             min_year, max_year = profile.get_year_range()
-            content_query = content_query.filter(
-                and_(Content.year >= min_year, Content.year <= max_year)
-            )
+            mask &= store.year_mask(min_year, max_year)
         
-        content_items = content_query.all()
-        scored_content = []
+        # Skip content the target has already seen so the top k is not spent on it
+        mask &= ~self._exclusion_mask(profile, store.content_ids)
         
-        for content in content_items:
-            score = self._calculate_content_score(content, genre_prefs, type_prefs)
-            if score > 0:
-                reasoning = self._generate_content_reasoning(content, genre_prefs, type_prefs)
-                scored_content.append((content, score, reasoning))
+        scores = store.score(genre_prefs, type_prefs)
+        content_ids, top_scores = store.top_k(scores, limit, mask=mask)
         
-        # Sort by score and return top items
-        scored_content.sort(key=lambda x: x[1], reverse=True)
-        return scored_content[:limit]
+        # Only the winning ids are loaded as ORM objects
+        scored_content = self._hydrate_scored_content(
+            [(int(content_id), float(score), None) for content_id, score in zip(content_ids, top_scores)],
+            limit
+        )
+        return [
+            (content, score, self._generate_content_reasoning(content, genre_prefs, type_prefs))
+            for content, score, _ in scored_content
+        ]
     
     def _collaborative_filtering(self, profile, limit: int) -> List[Tuple]:
         """Collaborative filtering based on similar users"""
@@ -345,39 +340,66 @@ class RecommendationEngine:
         user_id = profile.user_id
         
         # Find users with similar rating patterns
-        user_ratings = ContentRating.query.filter_by(user_id=user_id).all()
-        if not user_ratings:
+        matrix = get_rating_matrix()
+        if not matrix.has_user(user_id):
             return []
         
-        user_content_ratings = {r.content_id: r.rating for r in user_ratings}
-        similar_users = self._find_similar_users(user_id, user_content_ratings)
+        similar_users = matrix.similar_users(user_id, limit=20)  # Top 20 similar users
         
-        # Get recommendations from similar users
-        recommendations = defaultdict(list)
-        
-        for similar_user_id, similarity in similar_users[:20]:  # Top 20 similar users
-            similar_user_ratings = ContentRating.query.filter_by(
-                user_id=similar_user_id
-            ).filter(
-                ContentRating.rating >= 4  # Only high ratings
-            ).all()
-            
-            for rating in similar_user_ratings:
-                if rating.content_id not in user_content_ratings:
-                    # Weight by similarity and rating
-                    score = similarity * (rating.rating / 5.0)
-                    recommendations[rating.content_id].append(score)
+        # Score content highly rated by similar users, best first
+        scored_ids = [
+            (content_id, score, f"Recommended based on {support} similar users")
+            for content_id, score, support in matrix.score_items(user_id, similar_users)
+        ]
         
-        # Average scores and get content
+        return self._hydrate_scored_content(scored_ids, limit)
+    
+    def _matrix_factorization(self, profile, limit: int) -> List[Tuple]:
+        """Score the catalog with the nightly ALS user and item factors"""
+        user_id = getattr(profile, 'user_id', None)
+        model = get_factor_model()
+        
+        # No trained model yet or a user unseen at training time: use the content-based path
+        if not user_id or model is None or model.user_row(user_id) is None:
+            return self._content_based_filtering(profile, limit)
+        
+        rated_ids = get_rating_matrix().get_user_ratings(user_id).keys()
+        scored_ids = [
+            (content_id, score, f"Recommended by your viewing pattern (model {model.version})")
+            for content_id, score in model.score_user(user_id, exclude_ids=rated_ids, limit=limit * 2)
+        ]
+        
+        return self._hydrate_scored_content(scored_ids, limit)
+    
+    def _exclusion_mask(self, profile, content_ids: np.ndarray) -> np.ndarray:
+        """True for content ids the profile's user or group should not be recommended again"""
+        user_id = getattr(profile, 'user_id', None)
+        group_id = getattr(profile, 'group_id', None)
+        if not user_id and not group_id:
+            return np.zeros(len(content_ids), dtype=bool)
+        return get_exclusion_index(user_id=user_id, group_id=group_id).mask(content_ids)
+    
+    def _hydrate_scored_content(self, scored_ids: List[Tuple], limit: int) -> List[Tuple]:
+        """Load Content rows for ranked (content_id, score, reasoning) tuples in batches"""
         scored_content = []
-        for content_id, scores in recommendations.items():
-            avg_score = sum(scores) / len(scores)
-            content = Content.query.get(content_id)
-            if content:
-                reasoning = f"Recommended based on {len(scores)} similar users"
-                scored_content.append((content, avg_score, reasoning))
         
-        scored_content.sort(key=lambda x: x[1], reverse=True)
+        for start in range(0, len(scored_ids), max(limit, 1)):
+            if len(scored_content) >= limit:
+                break
+            
+            batch = scored_ids[start:start + max(limit, 1)]
+            content_map = {
+                content.id: content
+                for content in Content.query.filter(
+                    Content.id.in_([content_id for content_id, _, _ in batch])
+                ).all()
+            }
+            
+            for content_id, score, reasoning in batch:
+                content = content_map.get(content_id)
+                if content:
+                    scored_content.append((content, score, reasoning))
+        
         return scored_content[:limit]
     
     def _hybrid_filtering(self, profile, limit: int) -> List[Tuple]:
@@ -476,315 +498,48 @@ class RecommendationEngine:
         scored_content.sort(key=lambda x: x[1], reverse=True)
         return scored_content[:limit]
     
-    def _get_popular_content_fallback(self, profile, limit: int) -> List[Tuple]:
-        """Fallback recommendations for users with no preference data"""
-        # Get highly-rated, popular content for new users
-        content_query = Content.query.filter_by(status='active')
-        
-        # Filter by rating if available
-        if hasattr(profile, 'get_rating_range'):
-            min_rating, max_rating = profile.get_rating_range()
-            content_query = content_query.filter(
-                and_(Content.rating >= min_rating, Content.rating <= max_rating)
-            )
-        else:
-            # Default to well-rated content (7.0+)
-            content_query = content_query.filter(Content.rating >= 7.0)
-        
-        # Order by rating and popularity
-        content_items = content_query.order_by(
-            desc(Content.rating)
-        ).limit(limit * 2).all()  # Get more items to have variety
-        
-        scored_content = []
-        for content in content_items:
-            # Base score on rating
-            score = (content.rating or 0)
-            reasoning = f"Popular choice: High rating ({content.rating}/10)"
-            scored_content.append((content, score, reasoning))
-        
-        # Add some variety by shuffling highly-scored items
-        import random
-        random.shuffle(scored_content)
-        return scored_content[:limit]
-
     def _group_consensus_filtering(self, profile: GroupPreferenceProfile, limit: int) -> List[Tuple]:
         """Recommend content that would appeal to the group consensus"""
-        group = profile.group
-        members = GroupMember.query.filter_by(group_id=group.id).all()
-        
-        if not members:
-            return []
-        
-        # Get all member preferences
-        member_profiles = []
-        for member in members:
-            user_profile = self._get_or_create_user_profile(member.user_id)
-            member_profiles.append(user_profile)
-        
-        # Find content that would score well for most members
-        content_items = Content.query.filter_by(status='active').all()
-        consensus_recommendations = []
-        
-        for content in content_items:
-            member_scores = []
-            
-            for user_profile in member_profiles:
-                genre_prefs = user_profile.get_genre_preferences()
-                type_prefs = user_profile.get_content_type_preferences()
-                score = self._calculate_content_score(content, genre_prefs, type_prefs)
-                member_scores.append(score)
-            
-            if member_scores:
-                # Calculate consensus metrics
-                avg_score = sum(member_scores) / len(member_scores)
-                min_score = min(member_scores)
-                disagreement = max(member_scores) - min_score
-                
-                # Consensus score favors content with high average and low disagreement
-                consensus_score = avg_score * (1 - disagreement / 5.0) * min_score
-                
-                if consensus_score > 0:
-                    reasoning = f"Group consensus: avg {avg_score:.2f}, min {min_score:.2f}"
-                    consensus_recommendations.append((content, consensus_score, reasoning))
-        
-        consensus_recommendations.sort(key=lambda x: x[1], reverse=True)
-        return consensus_recommendations[:limit]
-    
-    def _calculate_content_score(self, content: Content, genre_prefs: Dict, type_prefs: Dict) -> float:
-        """Calculate content score based on preferences"""
-        score = 0.0
-        
-        # Genre matching
-        content_genres = content.get_genres()
-        if content_genres and genre_prefs:
-            genre_scores = [genre_prefs.get(genre, 0) for genre in content_genres]
-            if genre_scores:
-                score += max(genre_scores) * 0.6  # Use best matching genre
-        
-        # Content type matching
-        if content.type in type_prefs:
-            score += type_prefs[content.type] * 0.3
-        
-        # Quality boost for high-rated content
-        if content.rating:
-            score += (content.rating / 10.0) * 0.1
-        
-        return score
-    
-    def _generate_content_reasoning(self, content: Content, genre_prefs: Dict, type_prefs: Dict) -> str:
-        """Generate human-readable reasoning for recommendation"""
-        reasons = []
-        
-        content_genres = content.get_genres()
-        if content_genres and genre_prefs:
-            matching_genres = [g for g in content_genres if g in genre_prefs and genre_prefs[g] > 0.5]
-            if matching_genres:
-                reasons.append(f"matches your interest in {', '.join(matching_genres)}")
-        
-        if content.type in type_prefs and type_prefs[content.type] > 0.5:
-            reasons.append(f"you enjoy {content.type}s")
-        
-        if content.rating and content.rating >= 7.0:
-            reasons.append(f"highly rated ({content.rating}/10)")
+        member_ids = [user_id for (user_id,) in db.session.query(GroupMember.user_id).filter_by(group_id=profile.group_id)]
         
-        return "Recommended because " + " and ".join(reasons) if reasons else "Recommended for you"
-    
-    def _find_similar_users(self, user_id: int, user_ratings: Dict) -> List[Tuple[int, float]]:
-        """Find users with similar rating patterns using cosine similarity"""
-        if not user_ratings:
+        if not member_ids:
             return []
         
-        # Get other users who have rated common content
-        common_content_ids = list(user_ratings.keys())
-        other_ratings = db.session.query(
-            ContentRating.user_id,
-            ContentRating.content_id,
-            ContentRating.rating
-        ).filter(
-            and_(ContentRating.content_id.in_(common_content_ids),
-                 ContentRating.user_id != user_id)
-        ).all()
-        
-        # Group by user
-        user_rating_maps = defaultdict(dict)
-        for user_id_other, content_id, rating in other_ratings:
-            user_rating_maps[user_id_other][content_id] = rating
-        
-        # Calculate similarities
-        similarities = []
-        for other_user_id, other_ratings in user_rating_maps.items():
-            # Find common content
-            common_content = set(user_ratings.keys()) & set(other_ratings.keys())
-            if len(common_content) >= 3:  # Need at least 3 common ratings
-                similarity = self._cosine_similarity(
-                    [user_ratings[cid] for cid in common_content],
-                    [other_ratings[cid] for cid in common_content]
-                )
-                if similarity > 0.1:  # Only consider reasonably similar users
-                    similarities.append((other_user_id, similarity))
-        
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities
-    
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        if not vec1 or not vec2 or len(vec1) != len(vec2):
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = math.sqrt(sum(a * a for a in vec1))
-        magnitude2 = math.sqrt(sum(b * b for b in vec2))
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
-        
-        return dot_product / (magnitude1 * magnitude2)
-    
-    def _filter_recommendations(self, recommendations: List[Tuple], 
-                              user_id: int = None, group_id: int = None) -> List[Tuple]:
-        """Filter out content user/group has already seen, rated, or has active recommendations for"""
-        if not recommendations:
-            return []
-        
-        filtered = []
-        seen_content_ids = set()
-        
-        # Get already rated/watchlisted content
-        excluded_content_ids = set()
-        
-        if user_id:
-            # User's ratings and watchlist
-            user_ratings = ContentRating.query.filter_by(user_id=user_id).all()
-            user_watchlist = UserWatchlist.query.filter_by(user_id=user_id).all()
-            
-            excluded_content_ids.update(r.content_id for r in user_ratings)
-            excluded_content_ids.update(w.content_id for w in user_watchlist)
-            
-            # Add existing active recommendations to prevent duplicates
-            existing_recs = Recommendation.query.filter_by(
-                user_id=user_id,
-                status='active'
-            ).filter(
-                Recommendation.expires_at > datetime.utcnow()
-            ).all()
-            excluded_content_ids.update(r.content_id for r in existing_recs)
-        
-        if group_id:
-            # Group's watchlist
-            from models import GroupWatchlist
-            group_watchlist = GroupWatchlist.query.filter_by(group_id=group_id).all()
-            excluded_content_ids.update(gw.content_id for gw in group_watchlist)
-            
-            # Add existing active group recommendations to prevent duplicates
-            existing_group_recs = Recommendation.query.filter_by(
-                group_id=group_id,
-                status='active'
-            ).filter(
-                Recommendation.expires_at > datetime.utcnow()
-            ).all()
-            excluded_content_ids.update(r.content_id for r in existing_group_recs)
-        
-        # Filter recommendations and remove duplicates within this batch
-        for content, score, reasoning in recommendations:
-            if content.id not in excluded_content_ids and content.id not in seen_content_ids:
-                filtered.append((content, score, reasoning))
-                seen_content_ids.add(content.id)
-        
-        return filtered
-    
-    def _update_recommendation_history(self, user_id: int, group_id: int, 
-                                     algorithm: str, total_recs: int,
-                                     experiment_id: str = None, variant: str = None):
-        """Update recommendation history for tracking"""
-        history = RecommendationHistory(
-            user_id=user_id,
-            group_id=group_id,
-            algorithm=algorithm,
-            total_recommendations=total_recs,
-            experiment_id=experiment_id,
-            variant=variant
+        # Get all member preferences in one query; stale profiles are refreshed by
+        # daily_profile_updates, only members without a profile are analyzed here
+        member_profiles = {
+            user_profile.user_id: user_profile
+            for user_profile in UserPreferenceProfile.query.filter(UserPreferenceProfile.user_id.in_(member_ids))
+        }
+        for user_id in member_ids:
+            if user_id not in member_profiles:
+                member_profiles[user_id] = self._get_or_create_user_profile(user_id)
+        
+        # Stack member preferences and score the whole catalog for every member at once
+        store = get_content_feature_store()
+        genre_matrix, feature_matrix = store.preference_matrices([
+            (member_profiles[user_id].get_genre_preferences(), member_profiles[user_id].get_content_type_preferences())
+            for user_id in member_ids
+        ])
+        member_scores = store.score_matrix(genre_matrix, feature_matrix)
+        
+        # Calculate consensus metrics column-wise (one column per content item)
+        avg_scores = member_scores.mean(axis=0)
+        min_scores = member_scores.min(axis=0)
+        disagreement = member_scores.max(axis=0) - min_scores
+        
+        # Consensus score favors content with high average and low disagreement
+        consensus_scores = avg_scores * (1 - disagreement / 5.0) * min_scores
+        content_ids, top_scores = store.top_k(
+            consensus_scores, limit, mask=~self._exclusion_mask(profile, store.content_ids)
         )
-        db.session.add(history)
-    
-    def _get_popular_content_fallback(self, profile, limit: int) -> List[Tuple]:
-        """Fallback recommendations for users with no preference data"""
-        # Get highly-rated, popular content for new users
-        content_query = Content.query.filter_by(status='active')
         
-        # Filter by rating if available
-        if hasattr(profile, 'get_rating_range'):
-            min_rating, max_rating = profile.get_rating_range()
-            content_query = content_query.filter(
-                and_(Content.rating >= min_rating, Content.rating <= max_rating)
-            )
-        else:
-            # Default to well-rated content (7.0+)
-            content_query = content_query.filter(Content.rating >= 7.0)
-        
-        # Order by rating and popularity
-        content_items = content_query.order_by(
-            desc(Content.rating),
-            desc(Content.popularity if hasattr(Content, 'popularity') else Content.rating)
-        ).limit(limit * 2).all()  # Get more items to have variety
-        
-        scored_content = []
-        for content in content_items:
-            # Base score on rating and add small random factor for variety
-            base_score = (content.rating or 0) * 0.8
-            popularity_score = getattr(content, 'popularity', 5.0) * 0.2
-            score = base_score + popularity_score
-            
-            reasoning = f"Popular choice: High rating ({content.rating}/10)"
-            scored_content.append((content, score, reasoning))
-        
-        # Add some variety by shuffling highly-scored items
-        import random
-        random.shuffle(scored_content)
-        return scored_content[:limit]
-
-    def _group_consensus_filtering(self, profile: GroupPreferenceProfile, limit: int) -> List[Tuple]:
-        """Recommend content that would appeal to the group consensus"""
-        group = profile.group
-        members = GroupMember.query.filter_by(group_id=group.id).all()
-        
-        if not members:
-            return []
-        
-        # Get all member preferences
-        member_profiles = []
-        for member in members:
-            user_profile = self._get_or_create_user_profile(member.user_id)
-            member_profiles.append(user_profile)
-        
-        # Find content that would score well for most members
-        content_items = Content.query.filter_by(status='active').all()
-        consensus_recommendations = []
-        
-        for content in content_items:
-            member_scores = []
-            
-            for user_profile in member_profiles:
-                genre_prefs = user_profile.get_genre_preferences()
-                type_prefs = user_profile.get_content_type_preferences()
-                score = self._calculate_content_score(content, genre_prefs, type_prefs)
-                member_scores.append(score)
-            
-            if member_scores:
-                # Calculate consensus metrics
-                avg_score = sum(member_scores) / len(member_scores)
-                min_score = min(member_scores)
-                disagreement = max(member_scores) - min_score
-                
-                # Consensus score favors content with high average and low disagreement
-                consensus_score = avg_score * (1 - disagreement / 5.0) * min_score
-                
-                if consensus_score > 0:
-                    reasoning = f"Group consensus: avg {avg_score:.2f}, min {min_score:.2f}"
-                    consensus_recommendations.append((content, consensus_score, reasoning))
-        
-        consensus_recommendations.sort(key=lambda x: x[1], reverse=True)
-        return consensus_recommendations[:limit]
+        positions = np.searchsorted(store.content_ids, content_ids)
+        scored_ids = [
+            (int(content_id), float(score), f"Group consensus: avg {avg_scores[pos]:.2f}, min {min_scores[pos]:.2f}")
+            for content_id, score, pos in zip(content_ids, top_scores, positions)
+        ]
+        return self._hydrate_scored_content(scored_ids, limit)
     
     def _calculate_content_score(self, content: Content, genre_prefs: Dict, type_prefs: Dict) -> float:
         """Calculate content score based on preferences"""
@@ -830,51 +585,7 @@ class RecommendationEngine:
         if not user_ratings:
             return []
         
-        # Get other users who have rated common content
-        common_content_ids = list(user_ratings.keys())
-        other_ratings = db.session.query(
-            ContentRating.user_id,
-            ContentRating.content_id,
-            ContentRating.rating
-        ).filter(
-            and_(ContentRating.content_id.in_(common_content_ids),
-                 ContentRating.user_id != user_id)
-        ).all()
-        
-        # Group by user
-        user_rating_maps = defaultdict(dict)
-        for user_id_other, content_id, rating in other_ratings:
-            user_rating_maps[user_id_other][content_id] = rating
-        
-        # Calculate similarities
-        similarities = []
-        for other_user_id, other_ratings in user_rating_maps.items():
-            # Find common content
-            common_content = set(user_ratings.keys()) & set(other_ratings.keys())
-            if len(common_content) >= 3:  # Need at least 3 common ratings
-                similarity = self._cosine_similarity(
-                    [user_ratings[cid] for cid in common_content],
-                    [other_ratings[cid] for cid in common_content]
-                )
-                if similarity > 0.1:  # Only consider reasonably similar users
-                    similarities.append((other_user_id, similarity))
-        
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities
-    
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        if not vec1 or not vec2 or len(vec1) != len(vec2):
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = math.sqrt(sum(a * a for a in vec1))
-        magnitude2 = math.sqrt(sum(b * b for b in vec2))
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
-        
-        return dot_product / (magnitude1 * magnitude2)
+        return get_rating_matrix().similar_users(user_id)
     
     def _filter_recommendations(self, recommendations: List[Tuple], 
                               user_id: int = None, group_id: int = None) -> List[Tuple]:
@@ -882,65 +593,33 @@ class RecommendationEngine:
         if not recommendations:
             return []
         
-        filtered = []
-        seen_content_ids = set()
+        content_ids = np.array([content.id for content, _, _ in recommendations], dtype=np.int64)
+        keep = np.ones(len(content_ids), dtype=bool)
         
-        # Get already rated/watchlisted content
-        excluded_content_ids = set()
+        # Already rated/watchlisted/recommended content, from the cached exclusion index
+        if user_id or group_id:
+            keep &= ~get_exclusion_index(user_id=user_id, group_id=group_id).mask(content_ids)
         
-        if user_id:
-            # User's ratings and watchlist
-            user_ratings = ContentRating.query.filter_by(user_id=user_id).all()
-            user_watchlist = UserWatchlist.query.filter_by(user_id=user_id).all()
-            
-            excluded_content_ids.update(r.content_id for r in user_ratings)
-            excluded_content_ids.update(w.content_id for w in user_watchlist)
-            
-            # Add existing active recommendations to prevent duplicates
-            existing_recs = Recommendation.query.filter_by(
-                user_id=user_id,
-                status='active'
-            ).filter(
-                Recommendation.expires_at > datetime.utcnow()
-            ).all()
-            excluded_content_ids.update(r.content_id for r in existing_recs)
+        # Remove duplicates within this batch (first occurrence wins)
+        _, first_positions = np.unique(content_ids, return_index=True)
+        unique = np.zeros(len(content_ids), dtype=bool)
+        unique[first_positions] = True
+        keep &= unique
         
-        if group_id:
-            # Group's watchlist
-            from models import GroupWatchlist
-            group_watchlist = GroupWatchlist.query.filter_by(group_id=group_id).all()
-            excluded_content_ids.update(gw.content_id for gw in group_watchlist)
-            
-            # Add existing active group recommendations to prevent duplicates
-            existing_group_recs = Recommendation.query.filter_by(
-                group_id=group_id,
-                status='active'
-            ).filter(
-                Recommendation.expires_at > datetime.utcnow()
-            ).all()
-            excluded_content_ids.update(r.content_id for r in existing_group_recs)
-        
-        # Filter recommendations and remove duplicates within this batch
-        for content, score, reasoning in recommendations:
-            if content.id not in excluded_content_ids and content.id not in seen_content_ids:
-                filtered.append((content, score, reasoning))
-                seen_content_ids.add(content.id)
-        
-        return filtered
+        return [recommendation for recommendation, kept in zip(recommendations, keep) if kept]
     
     def _update_recommendation_history(self, user_id: int, group_id: int, 
                                      algorithm: str, total_recs: int,
                                      experiment_id: str = None, variant: str = None):
         """Update recommendation history for tracking"""
-        history = RecommendationHistory(
-            user_id=user_id,
-            group_id=group_id,
-            algorithm=algorithm,
-            total_recommendations=total_recs,
-            experiment_id=experiment_id,
-            variant=variant
-        )
-        db.session.add(history)
+        insert_history([{
+            'user_id': user_id,
+            'group_id': group_id,
+            'algorithm': algorithm,
+            'total_recommendations': total_recs,
+            'experiment_id': experiment_id,
+            'variant': variant
+        }])
     
     def _get_popular_content_fallback(self, profile, limit: int) -> List[Tuple]:
         """Fallback recommendations for users with no preference data"""
@@ -1268,6 +947,39 @@ def mark_recommendation_feedback(recommendation_id: int, user_id: int,
     db.session.commit()
 
 
+def _get_incremental_profile(user_id: int) -> Optional[UserPreferenceProfile]:
+    """Get a profile whose stats deltas can be applied, or None if it has to be (re)built"""
+    profile = UserPreferenceProfile.query.filter_by(user_id=user_id).first()
+    if profile and profile.get_preference_stats() is None:
+        # Legacy profile: a full rebuild already reflects the committed change
+        RecommendationEngine()._analyze_user_preferences(profile)
+        db.session.commit()
+        return None
+    return profile
+
+
+def apply_rating_change(user_id: int, content: Content, old_rating: float = None, new_rating: float = None):
+    """Update a user's preference profile after a rating is created, edited or deleted"""
+    profile = _get_incremental_profile(user_id)
+    if profile is None:
+        return  # No profile yet; it is built from scratch on first use
+    
+    profile.apply_rating_delta(content.get_genres(), content.type, old_rating, new_rating)
+    profile.refresh_preferences_from_stats()
+    db.session.commit()
+
+
+def apply_watchlist_change(user_id: int, content: Content, delta: int):
+    """Update a user's preference profile after a watchlist item is added (+1) or removed (-1)"""
+    profile = _get_incremental_profile(user_id)
+    if profile is None:
+        return
+    
+    profile.apply_watchlist_delta(content.get_genres(), content.type, delta)
+    profile.refresh_preferences_from_stats()
+    db.session.commit()
+
+
 def update_recommendation_metrics():
     """Update performance metrics for recommendation history"""
     # Get recent recommendation histories that need metric updates
@@ -5,12 +5,16 @@ Handles periodic updates, maintenance, and optimization
 
 from datetime import datetime, timedelta
 from app import create_app, db
-from models import User, Group
+from models import User, Group, ContentRating
 from models.recommendations import (
     UserPreferenceProfile, GroupPreferenceProfile, Recommendation,
     RecommendationHistory, ABTestExperiment
 )
 from utils.recommendation_engine import RecommendationEngine, update_recommendation_metrics
+from utils.item_similarity import refresh_similarity_index
+from utils.matrix_factorization import retrain_factor_model
+from utils.batch_generation import run_batch_generation
+from utils.recommendation_store import delete_recommendations, delete_history
 import logging
 
 
@@ -36,10 +40,10 @@ def daily_profile_updates():
     with app.app_context():
         logger.info("Starting daily profile updates")
         
-        # Update stale user profiles (older than 3 days)
-        cutoff_date = datetime.utcnow() - timedelta(days=3)
+        # User profiles are kept current incrementally by the rating and watchlist routes;
+        # only profiles that have never had their running stats built need a full analysis
         stale_profiles = UserPreferenceProfile.query.filter(
-            UserPreferenceProfile.last_updated < cutoff_date
+            UserPreferenceProfile.preference_stats.is_(None)
         ).all()
         
         updated_users = 0
@@ -72,7 +76,6 @@ def weekly_recommendation_generation():
     """Weekly task: Generate fresh recommendations for active users"""
     logger = setup_logging()
     app = create_app()
-    engine = RecommendationEngine()
     
     with app.app_context():
         logger.info("Starting weekly recommendation generation")
@@ -80,9 +83,10 @@ def weekly_recommendation_generation():
         # Get users who need fresh recommendations
         cutoff_date = datetime.utcnow() - timedelta(days=7)
         
-        # Users with no recent recommendations
-        users_needing_recs = db.session.query(User).filter(
-            User.is_active == True
+        # Active users with at least one rating and no recent recommendations
+        users_needing_recs = [user_id for (user_id,) in db.session.query(User.id).filter(
+            User.is_active == True,
+            User.id.in_(db.session.query(ContentRating.user_id))
         ).filter(
             ~User.id.in_(
                 db.session.query(Recommendation.user_id).filter(
@@ -90,36 +94,15 @@ def weekly_recommendation_generation():
                     Recommendation.user_id.isnot(None)
                 )
             )
-        ).all()
-        
-        generated_count = 0
-        error_count = 0
+        )]
         
-        for user in users_needing_recs:
-            try:
-                # Check if user has enough activity for meaningful recommendations
-                user_ratings = db.session.query(db.func.count()).filter_by(user_id=user.id).scalar()
-                if user_ratings < 1:
-                    continue  # Skip users with no ratings
-                
-                recommendations = engine.generate_recommendations(
-                    user_id=user.id,
-                    algorithm='hybrid',
-                    limit=10
-                )
-                generated_count += len(recommendations)
-                
-                # Commit in batches of 50 users
-                if generated_count % 500 == 0:
-                    db.session.commit()
-                    
-            except Exception as e:
-                logger.error(f"Error generating recommendations for user {user.id}: {str(e)}")
-                error_count += 1
+        # Sharded across worker processes; an interrupted run resumes from its last committed shard
+        stats = run_batch_generation(users_needing_recs, algorithm='hybrid', limit=10,
+                                     job_name='weekly_recommendations')
         
-        db.session.commit()
-        logger.info(f"Generated recommendations for {len(users_needing_recs)} users")
-        logger.info(f"Total recommendations: {generated_count}, Errors: {error_count}")
+        logger.info(f"Generated recommendations for {stats['users']} users "
+                    f"({stats['users_per_second']:.1f} users/sec)")
+        logger.info(f"Total recommendations: {stats['recommendations']}, Errors: {stats['errors']}")
 
 
 def daily_metrics_update():
@@ -137,6 +120,37 @@ def daily_metrics_update():
             logger.error(f"Error updating metrics: {str(e)}")
 
 
+def weekly_profile_consistency_check():
+    """Weekly task: Rebuild user profiles from scratch and repair any drift in the incremental stats"""
+    logger = setup_logging()
+    app = create_app()
+    engine = RecommendationEngine()
+    
+    with app.app_context():
+        logger.info("Starting profile consistency check")
+        
+        checked = 0
+        drifted = 0
+        for profile in UserPreferenceProfile.query.yield_per(100):
+            try:
+                before = (profile.get_genre_preferences(), profile.get_content_type_preferences())
+                engine._analyze_user_preferences(profile)
+                after = (profile.get_genre_preferences(), profile.get_content_type_preferences())
+                
+                if any(
+                    old.keys() != new.keys() or any(abs(old[key] - new[key]) > 1e-6 for key in new)
+                    for old, new in zip(before, after)
+                ):
+                    drifted += 1
+                    logger.warning(f"Repaired drifted preference profile for user {profile.user_id}")
+                checked += 1
+            except Exception as e:
+                logger.error(f"Error checking user profile {profile.user_id}: {str(e)}")
+        
+        db.session.commit()
+        logger.info(f"Checked {checked} user profiles, repaired {drifted}")
+
+
 def weekly_cleanup():
     """Weekly task: Clean up old recommendations and data"""
     logger = setup_logging()
@@ -146,38 +160,55 @@ def weekly_cleanup():
         logger.info("Starting weekly cleanup")
         
         # Remove expired recommendations
-        expired_cutoff = datetime.utcnow()
-        expired_recs = Recommendation.query.filter(
-            Recommendation.expires_at < expired_cutoff
-        ).all()
-        
-        for rec in expired_recs:
-            db.session.delete(rec)
+        expired_count = delete_recommendations(Recommendation.expires_at < datetime.utcnow())
         
         # Remove very old dismissed recommendations (older than 30 days)
         old_dismissed_cutoff = datetime.utcnow() - timedelta(days=30)
-        old_dismissed = Recommendation.query.filter(
+        dismissed_count = delete_recommendations(
             Recommendation.status == 'dismissed',
             Recommendation.created_at < old_dismissed_cutoff
-        ).all()
-        
-        for rec in old_dismissed:
-            db.session.delete(rec)
+        )
         
         # Remove old recommendation history (older than 90 days)
-        history_cutoff = datetime.utcnow() - timedelta(days=90)
-        old_history = RecommendationHistory.query.filter(
-            RecommendationHistory.generation_date < history_cutoff
-        ).all()
-        
-        for history in old_history:
-            db.session.delete(history)
+        history_count = delete_history(datetime.utcnow() - timedelta(days=90))
         
         db.session.commit()
         
-        logger.info(f"Cleaned up {len(expired_recs)} expired recommendations")
-        logger.info(f"Cleaned up {len(old_dismissed)} old dismissed recommendations")
-        logger.info(f"Cleaned up {len(old_history)} old history records")
+        logger.info(f"Cleaned up {expired_count} expired recommendations")
+        logger.info(f"Cleaned up {dismissed_count} old dismissed recommendations")
+        logger.info(f"Cleaned up {history_count} old history records")
+
+
+def daily_similarity_index_refresh():
+    """Daily task: Refresh item-item similarity for content with new ratings"""
+    logger = setup_logging()
+    app = create_app()
+    
+    with app.app_context():
+        logger.info("Starting similarity index refresh")
+        
+        try:
+            item_count, row_count = refresh_similarity_index()
+            logger.info(f"Refreshed similarity index for {item_count} items ({row_count} rows)")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error refreshing similarity index: {str(e)}")
+
+
+def daily_factor_model_training():
+    """Daily task: Retrain matrix factorization factors and publish a new model version"""
+    logger = setup_logging()
+    app = create_app()
+    
+    with app.app_context():
+        logger.info("Starting factor model training")
+        
+        try:
+            version = retrain_factor_model()
+            if version:
+                logger.info(f"Published factor model version {version}")
+        except Exception as e:
+            logger.error(f"Error training factor model: {str(e)}")
 
 
 def experiment_management():
@@ -302,10 +333,13 @@ SCHEDULED_TASKS = {
     'daily': [
         daily_profile_updates,
         daily_metrics_update,
+        daily_similarity_index_refresh,
+        daily_factor_model_training,
         experiment_management
     ],
     'weekly': [
         weekly_recommendation_generation,
+        weekly_profile_consistency_check,
         weekly_cleanup,
         algorithm_performance_analysis,
         user_engagement_analysis
@@ -0,0 +1,161 @@
+"""
+Bulk persistence for recommendations
+Set-based INSERT, UPDATE and DELETE statements for Recommendation and RecommendationHistory rows
+"""
+
+import logging
+from app import db
+from models.recommendations import Recommendation, RecommendationHistory, RecommendationFeedback
+from utils.recommendation_config import Config
+from datetime import datetime
+from typing import List, Dict, Iterable
+from sqlalchemy import tuple_, func, select
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items: List, size: int = None):
+    size = size or Config.DATABASE['batch_size']
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _target_filter(user_ids: Iterable[int] = None, group_ids: Iterable[int] = None):
+    """WHERE clause for the given users and/or groups, or None for every target"""
+    clauses = []
+    if user_ids is not None:
+        clauses.append(Recommendation.user_id.in_(list(user_ids)))
+    if group_ids is not None:
+        clauses.append(Recommendation.group_id.in_(list(group_ids)))
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else db.or_(*clauses)
+
+
+def insert_recommendations(rows: List[Dict]) -> int:
+    """Insert recommendation rows in multi-row batches, superseding active duplicates
+
+    Rows are dicts of Recommendation columns. Within the batch the best score per
+    (target, content) wins; an existing active row for the same pair is archived so
+    the unique active index is never violated. Does not commit.
+    """
+    best = {}
+    for row in rows:
+        key = (row.get('user_id'), row.get('group_id'), row['content_id'])
+        if key not in best or row['score'] > best[key]['score']:
+            best[key] = row
+    rows = list(best.values())
+    if not rows:
+        return 0
+
+    user_pairs = [(row['user_id'], row['content_id']) for row in rows if row.get('user_id')]
+    group_pairs = [(row['group_id'], row['content_id']) for row in rows if row.get('group_id')]
+    for column, pairs in ((Recommendation.user_id, user_pairs), (Recommendation.group_id, group_pairs)):
+        for chunk in _chunks(pairs):
+            db.session.execute(
+                db.update(Recommendation)
+                .where(Recommendation.status == 'active',
+                       tuple_(column, Recommendation.content_id).in_(chunk))
+                .values(status='archived')
+                .execution_options(synchronize_session=False)
+            )
+
+    now = datetime.utcnow()
+    for row in rows:
+        row.setdefault('status', 'active')
+        row.setdefault('created_at', now)
+    for chunk in _chunks(rows, Config.DATABASE['batch_size'] * 10):
+        db.session.execute(db.insert(Recommendation), chunk)
+
+    return len(rows)
+
+
+def insert_history(rows: List[Dict]) -> int:
+    """Insert RecommendationHistory rows in multi-row batches. Does not commit"""
+    now = datetime.utcnow()
+    for row in rows:
+        row.setdefault('generation_date', now)
+        row.setdefault('updated_at', now)
+    for chunk in _chunks(rows, Config.DATABASE['batch_size'] * 10):
+        db.session.execute(db.insert(RecommendationHistory), chunk)
+    return len(rows)
+
+
+def expire_recommendations(user_ids: Iterable[int] = None, group_ids: Iterable[int] = None,
+                           now: datetime = None) -> int:
+    """Mark active recommendations past their expiry date as expired in one UPDATE"""
+    statement = db.update(Recommendation).where(
+        Recommendation.status == 'active',
+        Recommendation.expires_at < (now or datetime.utcnow())
+    ).values(status='expired')
+
+    target = _target_filter(user_ids, group_ids)
+    if target is not None:
+        statement = statement.where(target)
+    return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def archive_overflow(user_ids: Iterable[int] = None, group_ids: Iterable[int] = None, keep: int = 50) -> int:
+    """Archive all but the newest `keep` active recommendations per user and per group"""
+    archived = 0
+    for column, ids in ((Recommendation.user_id, user_ids), (Recommendation.group_id, group_ids)):
+        if ids is None and (user_ids is not None or group_ids is not None):
+            continue
+
+        ranked = select(
+            Recommendation.id,
+            func.row_number().over(
+                partition_by=column,
+                order_by=(Recommendation.created_at.desc(), Recommendation.id.desc())
+            ).label('position')
+        ).where(Recommendation.status == 'active', column.isnot(None))
+        if ids is not None:
+            ranked = ranked.where(column.in_(list(ids)))
+        ranked = ranked.subquery()
+
+        statement = db.update(Recommendation).where(
+            Recommendation.id.in_(select(ranked.c.id).where(ranked.c.position > keep))
+        ).values(status='archived')
+        archived += db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+    return archived
+
+
+def delete_recommendations(*criteria) -> int:
+    """Delete recommendations matching the criteria, and their feedback, in two DELETE statements"""
+    matching_ids = select(Recommendation.id).where(*criteria)
+    db.session.execute(
+        db.delete(RecommendationFeedback)
+        .where(RecommendationFeedback.recommendation_id.in_(matching_ids))
+        .execution_options(synchronize_session=False)
+    )
+    statement = db.delete(Recommendation).where(*criteria)
+    return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def remove_duplicate_active() -> Dict[str, int]:
+    """Delete all but the newest (highest id) active recommendation per user/group and content
+
+    Needed before the uq_active_*_recommendation indexes can be built on older databases.
+    Returns the rows removed per target type.
+    """
+    removed = {}
+    for column, label in ((Recommendation.user_id, 'user'), (Recommendation.group_id, 'group')):
+        newest_ids = select(func.max(Recommendation.id)).where(
+            Recommendation.status == 'active',
+            column.isnot(None)
+        ).group_by(column, Recommendation.content_id)
+
+        removed[label] = delete_recommendations(
+            Recommendation.status == 'active',
+            column.isnot(None),
+            Recommendation.id.notin_(newest_ids)
+        )
+    return removed
+
+
+def delete_history(before: datetime) -> int:
+    """Delete recommendation history generated before a cutoff in one DELETE"""
+    statement = db.delete(RecommendationHistory).where(RecommendationHistory.generation_date < before)
+    return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
@@ -0,0 +1,61 @@
+"""
+Schema upgrades for WatchTogether
+Brings tables created by older versions up to the current models at app start, since db.create_all never alters them
+"""
+
+import logging
+from app import db
+from models.recommendations import UserPreferenceProfile, Recommendation
+from utils.recommendation_store import remove_duplicate_active
+from sqlalchemy import inspect
+from typing import Dict, List
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(table_name: str, columns: Dict[str, str]) -> List[str]:
+    """ALTER TABLE ... ADD COLUMN for each {name: type/default DDL} the table lacks; returns the added names
+
+    Cheap when nothing is missing (one column inspection). IF NOT EXISTS lets PostgreSQL
+    workers booting together race safely.
+    """
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+    missing = [name for name in columns if name not in existing]
+    if not missing:
+        return []
+
+    if_not_exists = 'IF NOT EXISTS ' if db.engine.dialect.name == 'postgresql' else ''
+    with db.engine.begin() as connection:
+        for name in missing:
+            connection.execute(db.text(f"ALTER TABLE {table_name} ADD COLUMN {if_not_exists}{name} {columns[name]}"))
+    logger.info(f"Added columns to {table_name}: {', '.join(missing)}")
+    return missing
+
+
+def ensure_preference_stats_column() -> bool:
+    """Add preference_stats to a user_preference_profile table created before it existed
+
+    Existing profiles get NULL, which the engine treats as 'stats not built yet' and rebuilds on first use.
+    """
+    return bool(add_missing_columns(UserPreferenceProfile.__tablename__, {'preference_stats': 'TEXT'}))
+
+
+def ensure_recommendation_indexes() -> List[str]:
+    """Build the uq_active_*_recommendation indexes missing from an older recommendation table
+
+    Duplicate active rows, which older versions could write, are removed first so the unique
+    indexes can be built. Returns the names of the indexes created.
+    """
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(Recommendation.__tablename__)}
+    missing = [index for index in Recommendation.__table__.indexes if index.name not in existing]
+    if not missing:
+        return []
+
+    removed = remove_duplicate_active()
+    db.session.commit()
+    for index in missing:
+        index.create(bind=db.engine, checkfirst=True)
+    logger.info(f"Built recommendation indexes {', '.join(index.name for index in missing)} "
+                f"after removing duplicates {removed}")
+    return [index.name for index in missing]
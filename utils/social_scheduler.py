@@ -14,6 +14,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app, db
 from utils.social_analytics import generate_daily_insights
 from utils.recommendation_engine import RecommendationEngine
+from utils.tmdb_importer import refresh_stale_content
 from models.recommendations import TrendingContent, SocialRecommendationInsight
 import argparse
 import logging
@@ -161,6 +162,20 @@ def update_recommendation_history():
         db.session.rollback()
 
 
+def refresh_content_metadata():
+    """Refresh stale TMDB metadata for stored content within the per-run budget"""
+    logger.info("Refreshing stale content metadata...")
+    
+    try:
+        stats = refresh_stale_content()
+        logger.info(f"Refreshed {stats['candidates']} titles: {stats['changed']} changed, "
+                    f"{stats['unchanged']} unchanged, {stats['failed']} failed")
+        
+    except Exception as e:
+        logger.error(f"Error refreshing content metadata: {e}")
+        db.session.rollback()
+
+
 def run_daily_tasks():
     """Run all daily maintenance tasks"""
     logger.info("=== Starting daily social recommendation tasks ===")
@@ -178,6 +193,7 @@ def run_hourly_tasks():
     logger.info("=== Starting hourly social recommendation tasks ===")
     
     update_trending_content()
+    refresh_content_metadata()
     
     logger.info("=== Hourly tasks completed ===")
 
@@ -185,7 +201,7 @@ def run_hourly_tasks():
 def main():
     """Main function with command line argument parsing"""
     parser = argparse.ArgumentParser(description='Social Recommendation Scheduler')
-    parser.add_argument('--task', choices=['daily', 'hourly', 'trending', 'insights', 'cleanup'],
+    parser.add_argument('--task', choices=['daily', 'hourly', 'trending', 'insights', 'cleanup', 'content-refresh'],
                       default='daily', help='Task to run')
     parser.add_argument('--dry-run', action='store_true', help='Run without making changes')
     
@@ -211,6 +227,8 @@ def main():
                 generate_insights()
             elif args.task == 'cleanup':
                 cleanup_old_insights()
+            elif args.task == 'content-refresh':
+                refresh_content_metadata()
             
         except Exception as e:
             logger.error(f"Task failed: {e}")
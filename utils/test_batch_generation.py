@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Batch Generation Test Suite
+Checks sharded bulk generation and resuming from a checkpoint
+"""
+
+import sys
+import os
+import random
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, ContentRating
+from models.recommendations import Recommendation, RecommendationHistory
+from config import TestingConfig
+from utils.recommendation_config import Config
+from utils.recommendation_engine import RecommendationEngine
+from utils.rating_matrix import invalidate_rating_matrix
+from utils.content_features import invalidate_content_feature_store
+from utils.batch_generation import BatchCheckpoint, plan_shards, run_batch_generation
+from utils.recommendation_cache import clear_recommendation_caches
+
+
+def app_context(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config.BATCH_GENERATION, 'checkpoint_dir', str(tmp_path))
+    app = create_app('testing')
+    with app.app_context():
+        invalidate_rating_matrix()
+        invalidate_content_feature_store()
+        clear_recommendation_caches()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        invalidate_rating_matrix()
+        invalidate_content_feature_store()
+        clear_recommendation_caches()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    yield from app_context(tmp_path, monkeypatch)
+
+
+@pytest.fixture
+def shared_app(tmp_path, monkeypatch):
+    """App on a file database, so forked pool workers see the parent's rows"""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'batch.db'}")
+    yield from app_context(tmp_path, monkeypatch)
+
+
+def create_users_with_ratings(user_count=12, content_count=25, seed=4):
+    rng = random.Random(seed)
+    users = [User(username=f'batchuser{i}', email=f'batch{i}@example.com') for i in range(user_count)]
+    contents = [Content(title=f'Batch Title {i}', type='movie', genre='Drama, Comedy', rating=4.0, year=2015)
+                for i in range(content_count)]
+    db.session.add_all(users + contents)
+    db.session.flush()
+
+    for user in users:
+        for content in rng.sample(contents, 6):
+            db.session.add(ContentRating(user_id=user.id, content_id=content.id, rating=rng.randint(3, 5)))
+    db.session.commit()
+    return users
+
+
+def test_plan_shards_is_stable():
+    assert plan_shards([5, 1, 3, 3, 9], 2) == [[1, 3], [5, 9]]
+
+
+def test_bulk_generation_writes_rows(app):
+    users = create_users_with_ratings()
+    stats = run_batch_generation([u.id for u in users], algorithm='content_based', limit=5,
+                                 workers=0, shard_size=5, job_name='test')
+
+    assert stats['users'] == len(users)
+    assert stats['errors'] == 0
+    assert stats['recommendations'] == Recommendation.query.count() > 0
+    assert RecommendationHistory.query.count() == len(users)
+    assert stats['users_per_second'] > 0
+    assert not os.path.exists(os.path.join(Config.BATCH_GENERATION['checkpoint_dir'], 'test.json'))
+
+
+def test_resume_skips_completed_shards(app):
+    users = create_users_with_ratings()
+    user_ids = [u.id for u in users]
+    shards = plan_shards(user_ids, 4)
+
+    # Simulate a crash after the first shard was committed
+    path = os.path.join(Config.BATCH_GENERATION['checkpoint_dir'], 'test.json')
+    checkpoint = BatchCheckpoint.load_or_create(path, shards, 'content_based', 5)
+    checkpoint.mark_completed(0)
+
+    stats = run_batch_generation(user_ids, algorithm='content_based', limit=5,
+                                 workers=0, shard_size=4, job_name='test')
+
+    assert stats['skipped_shards'] == 1
+    assert stats['users'] == len(user_ids) - len(shards[0])
+    generated_for = {user_id for (user_id,) in db.session.query(Recommendation.user_id).distinct()}
+    assert generated_for.isdisjoint(shards[0])
+
+
+def test_checkpoint_for_other_users_is_not_resumed(app):
+    path = os.path.join(Config.BATCH_GENERATION['checkpoint_dir'], 'test.json')
+    BatchCheckpoint.load_or_create(path, plan_shards([1, 2, 3, 4], 2), 'content_based', 5).mark_completed(0)
+
+    # The same users in a different shard plan still resume; a changed user list starts over
+    assert BatchCheckpoint.load_or_create(path, plan_shards([1, 2, 3, 4], 4), 'content_based', 5).pending() == [1]
+    checkpoint = BatchCheckpoint.load_or_create(path, plan_shards([1, 2, 3, 5], 2), 'content_based', 5)
+    assert (checkpoint.shards, checkpoint.pending()) == ([[1, 2], [3, 5]], [0, 1])
+
+
+def test_process_pool_resumes_and_counts_errors(shared_app, monkeypatch):
+    users = create_users_with_ratings()
+    user_ids = [u.id for u in users]
+    shards = plan_shards(user_ids, 3)
+    failing = {shards[1][0], shards[3][-1]}
+
+    # Forked workers inherit the patched engine
+    score = RecommendationEngine.score_recommendations
+
+    def flaky_score(self, user_id, **kwargs):
+        if user_id in failing:
+            raise RuntimeError('scoring failed')
+        return score(self, user_id=user_id, **kwargs)
+
+    monkeypatch.setattr(RecommendationEngine, 'score_recommendations', flaky_score)
+
+    # Workers reuse the parent's schema instead of re-running the app's startup tasks
+    monkeypatch.setattr(type(db), 'create_all', lambda *args, **kwargs: pytest.fail('worker ran create_all'))
+
+    path = os.path.join(Config.BATCH_GENERATION['checkpoint_dir'], 'pool.json')
+    BatchCheckpoint.load_or_create(path, shards, 'content_based', 5).mark_completed(0)
+
+    stats = run_batch_generation(user_ids, algorithm='content_based', limit=5, workers=2, shard_size=3,
+                                 job_name='pool', config_name='testing')
+
+    assert (stats['shards'], stats['skipped_shards']) == (len(shards) - 1, 1)
+    assert stats['errors'] == len(failing)
+    assert stats['users'] == len(user_ids) - len(shards[0]) - len(failing)
+    generated_for = {user_id for (user_id,) in db.session.query(Recommendation.user_id).distinct()}
+    assert generated_for == set(user_ids) - set(shards[0]) - failing
+    assert stats['recommendations'] == Recommendation.query.count()
+    assert not os.path.exists(path)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Content Detail Test Suite
+Checks that detail pages are served from the local catalog without calling TMDB
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, ContentRating, ContentSimilarity, UserWatchlist
+from utils.tmdb_api import TMDBService
+import routes.content
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # No API key: any TMDB call would fail the request
+    monkeypatch.delenv('TMDB_API_KEY', raising=False)
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(routes.content, 'refresh_content_in_background',
+                        lambda app, tmdb_id, content_type: calls.append((tmdb_id, content_type)))
+    return calls
+
+
+def test_fresh_local_title_is_served_without_tmdb(app, refreshes, monkeypatch):
+    tmdb_calls = []
+    monkeypatch.setattr(TMDBService, 'fan_out', lambda self, calls, timeout=None: tmdb_calls.append(calls))
+    user = User(username='detailuser', email='detail@example.com')
+    critic = User(username='critic', email='critic@example.com')
+    show = Content(title='Local Show', type='tv_show', genre='Drama', tmdb_id=42, cast='A, B')
+    db.session.add_all([user, critic, show])
+    db.session.flush()
+    db.session.add(UserWatchlist(user_id=user.id, content_id=show.id, status='watching'))
+    db.session.add(ContentRating(user_id=user.id, content_id=show.id, rating=4, review_text='Great'))
+    db.session.add(ContentRating(user_id=critic.id, content_id=show.id, rating=2, review_text='Slow'))
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    response = client.get('/content/42')
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200
+    assert b'Local Show' in response.data and b'critic' in response.data
+    assert refreshes == [] and tmdb_calls == []
+    # Reviews and their authors come with the title, not from a query of their own
+    review_loads = [statement for statement in statements if 'review_text IS NOT NULL' in statement]
+    assert len(review_loads) == 1 and 'content.tmdb_id = ' in review_loads[0] and 'JOIN user' in review_loads[0]
+
+
+def test_local_title_uses_stored_neighbours(app, refreshes):
+    movie = Content(title='Local Movie', type='movie', tmdb_id=5)
+    neighbour = Content(title='Neighbour Movie', type='movie', tmdb_id=6)
+    db.session.add_all([movie, neighbour])
+    db.session.flush()
+    db.session.add(ContentSimilarity(content_id=movie.id, similar_content_id=neighbour.id, score=0.9, rank=1))
+    db.session.commit()
+
+    response = app.test_client().get('/content/5/movie')
+
+    assert response.status_code == 200
+    assert b'Neighbour Movie' in response.data
+
+
+def test_stale_local_title_is_refreshed_in_background(app, refreshes):
+    db.session.add(Content(title='Old Movie', type='movie', tmdb_id=7,
+                           updated_at=datetime.utcnow() - timedelta(days=60)))
+    db.session.commit()
+
+    response = app.test_client().get('/content/7/movie')
+
+    assert response.status_code == 200
+    assert b'Old Movie' in response.data
+    assert refreshes == [(7, 'movie')]
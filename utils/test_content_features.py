@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Content Feature Store Test Suite
+Checks vectorized content-based and group consensus scoring against the per-item scoring loops
+"""
+
+import sys
+import os
+import json
+import random
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, Group, GroupMember
+from models.recommendations import UserPreferenceProfile, GroupPreferenceProfile
+from utils.content_features import get_content_feature_store, invalidate_content_feature_store
+from utils.recommendation_engine import RecommendationEngine
+
+GENRES = ['Action', 'Drama', 'Comedy', 'Horror', 'Sci-Fi', 'Romance', 'Thriller']
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        invalidate_content_feature_store()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        invalidate_content_feature_store()
+
+
+def create_catalog(count=80, seed=3):
+    """Create content with a mix of JSON and comma separated genre strings"""
+    rng = random.Random(seed)
+    contents = []
+    for i in range(count):
+        genres = rng.sample(GENRES, rng.randint(0, 3))
+        contents.append(Content(
+            title=f'Feature Title {i}',
+            type=rng.choice(['movie', 'tv_show', 'documentary']),
+            genre=json.dumps(genres) if i % 2 else ', '.join(genres) or None,
+            year=rng.choice([None, rng.randint(1995, 2024)]),
+            rating=rng.choice([None, round(rng.uniform(0, 5), 1)]),
+            status='inactive' if i % 13 == 0 else 'active'
+        ))
+    db.session.add_all(contents)
+    db.session.commit()
+    return contents
+
+
+def reference_content_scores(engine, profile, limit):
+    """The original per-item loop, kept here as the parity oracle"""
+    genre_prefs = profile.get_genre_preferences()
+    type_prefs = profile.get_content_type_preferences()
+    min_rating, max_rating = profile.get_rating_range()
+    min_year, max_year = profile.get_year_range()
+
+    scored = []
+    for content in Content.query.filter_by(status='active').order_by(Content.id).all():
+        if content.rating is None or not (min_rating <= content.rating <= max_rating):
+            continue
+        if content.year is None or not (min_year <= content.year <= max_year):
+            continue
+        score = engine._calculate_content_score(content, genre_prefs, type_prefs)
+        if score > 0:
+            scored.append((content.id, score))
+
+    scored.sort(key=lambda x: (-round(x[1], 9), x[0]))
+    return scored[:limit]
+
+
+def test_content_based_parity(app):
+    create_catalog()
+    engine = RecommendationEngine()
+    rng = random.Random(5)
+
+    for _ in range(10):
+        profile = UserPreferenceProfile(preferred_rating_range='1.0-5.0', preferred_year_range='2000-2025')
+        profile.set_genre_preferences({genre: round(rng.random(), 3) for genre in rng.sample(GENRES, 3)})
+        profile.set_content_type_preferences({'movie': round(rng.random(), 3), 'tv_show': 0.4})
+
+        expected = reference_content_scores(engine, profile, limit=15)
+        actual = engine._content_based_filtering(profile, limit=15)
+
+        assert [content.id for content, _, _ in actual] == [content_id for content_id, _ in expected]
+        for (_, score, _), (_, expected_score) in zip(actual, expected):
+            assert score == pytest.approx(expected_score, abs=1e-9)
+
+
+def reference_group_consensus(engine, member_profiles, limit):
+    """The original per-member, per-item consensus loop"""
+    scored = []
+    for content in Content.query.filter_by(status='active').order_by(Content.id).all():
+        member_scores = [
+            engine._calculate_content_score(content, p.get_genre_preferences(), p.get_content_type_preferences())
+            for p in member_profiles
+        ]
+        avg_score = sum(member_scores) / len(member_scores)
+        min_score = min(member_scores)
+        disagreement = max(member_scores) - min_score
+        consensus_score = avg_score * (1 - disagreement / 5.0) * min_score
+        if consensus_score > 0:
+            scored.append((content.id, consensus_score))
+
+    scored.sort(key=lambda x: (-round(x[1], 9), x[0]))
+    return scored[:limit]
+
+
+def test_group_consensus_parity(app):
+    create_catalog()
+    engine = RecommendationEngine()
+    rng = random.Random(9)
+
+    owner = User(username='consensusowner', email='owner@example.com')
+    db.session.add(owner)
+    db.session.flush()
+    group = Group(name='Consensus Group', created_by=owner.id)
+    db.session.add(group)
+    db.session.flush()
+
+    member_profiles = []
+    for i in range(30):
+        user = User(username=f'consensus{i}', email=f'consensus{i}@example.com')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(GroupMember(user_id=user.id, group_id=group.id))
+
+        profile = UserPreferenceProfile(user_id=user.id)
+        profile.set_genre_preferences({genre: round(rng.random(), 3) for genre in rng.sample(GENRES, 4)})
+        profile.set_content_type_preferences({'movie': round(rng.random(), 3), 'tv_show': round(rng.random(), 3)})
+        db.session.add(profile)
+        member_profiles.append(profile)
+    db.session.commit()
+
+    expected = reference_group_consensus(engine, member_profiles, limit=20)
+    actual = engine._group_consensus_filtering(GroupPreferenceProfile(group_id=group.id, group=group), limit=20)
+    assert len(actual) == 20
+
+    assert [content.id for content, _, _ in actual] == [content_id for content_id, _ in expected]
+    for (_, score, _), (_, expected_score) in zip(actual, expected):
+        assert score == pytest.approx(expected_score, abs=1e-9)
+
+
+def test_store_invalidated_on_insert_and_update(app):
+    contents = create_catalog(count=10)
+    first = get_content_feature_store()
+    assert get_content_feature_store() is first
+
+    db.session.add(Content(title='Fresh Import', type='movie', genre='["Action"]', status='active'))
+    db.session.commit()
+    second = get_content_feature_store()
+    assert second is not first
+    assert len(second) == len(first) + 1
+
+    contents[1].genre = json.dumps(['Western'])
+    db.session.commit()
+    third = get_content_feature_store()
+    assert third is not second
+    assert 'Western' in third.genre_index
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Discussion Search Test Suite
+Checks the trigger-maintained full-text index, ranking, scoping and snippets
+"""
+
+import sys
+import os
+
+import pytest
+from sqlalchemy import event
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, Discussion
+from utils.discussion_search import get_search_engine, install_discussion_search, search_discussions
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def posts(app):
+    user = User(username='searcher', email='searcher@example.com', first_name='Ada')
+    movies = [Content(title='First', type='movie'), Content(title='Second', type='movie')]
+    db.session.add_all([user] + movies)
+    db.session.flush()
+
+    def post(message, content, **kwargs):
+        discussion = Discussion(content_id=content.id, user_id=user.id, message=message, **kwargs)
+        db.session.add(discussion)
+        return discussion
+
+    posts = {
+        'passing': post('The soundtrack was fine but the plot dragged', movies[0]),
+        'focused': post('Soundtrack soundtrack soundtrack! Best soundtrack of the year', movies[0]),
+        'other': post('Great soundtrack in this one too', movies[1]),
+        'hidden': post('Hidden soundtrack rant', movies[0], is_hidden=True),
+        'markup': post('<b>bold</b> twist ending', movies[1]),
+    }
+    db.session.commit()
+    return user, movies, posts
+
+
+def test_ranked_scoped_prefix_search(posts):
+    user, movies, posts = posts
+    assert get_search_engine() == 'fts5'
+
+    results, total = search_discussions('soundtr')
+    assert total == 3 and results[0].id == posts['focused'].id
+    assert posts['hidden'].id not in [result.id for result in results]
+
+    results, total = search_discussions('soundtrack', content_id=movies[1].id)
+    assert [result.id for result in results] == [posts['other'].id] and total == 1
+
+    results, total = search_discussions('soundtrack plot')
+    assert [result.id for result in results] == [posts['passing'].id]
+
+    results, _ = search_discussions('twist')
+    assert '&lt;b&gt;bold&lt;/b&gt;' in results[0].search_snippet
+    assert '<mark>twist</mark>' in results[0].search_snippet
+
+    assert search_discussions('"); DROP TABLE discussion; --') == ([], 0)
+
+
+def test_index_follows_edits_and_renames(posts):
+    user, movies, posts = posts
+    posts['other'].message = 'Changed my mind about the score'
+    user.username = 'composerfan'
+    db.session.commit()
+
+    assert search_discussions('soundtrack')[1] == 2
+    assert [result.id for result in search_discussions('score')[0]] == [posts['other'].id]
+    assert search_discussions('composerfan')[1] == 4
+
+
+def test_install_only_creates_missing_objects(posts):
+    user, movies, posts = posts
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        install_discussion_search()
+        assert len(statements) == 1 and 'sqlite_master' in statements[0]
+
+        # A lost trigger is recreated and discussions written meanwhile are backfilled
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TRIGGER discussion_fts_insert")
+        db.session.add(Discussion(content_id=movies[0].id, user_id=user.id, message='Unindexed soundtrack'))
+        db.session.commit()
+        assert search_discussions('unindexed')[1] == 0
+        statements.clear()
+        install_discussion_search()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert sum('CREATE' in statement for statement in statements) == 1
+    assert search_discussions('unindexed')[1] == 1
+    assert search_discussions('soundtrack')[1] == 4
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Discussion Thread Test Suite
+Checks that threads load in a constant number of queries and match the per-discussion methods
+"""
+
+import sys
+import os
+
+import pytest
+from sqlalchemy import event
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from config import TestingConfig
+from models import User, Content, Group, GroupMember, Discussion, DiscussionLike, DiscussionReport
+from utils.discussion_threads import load_thread, serialize_discussions, serialize_thread, repair_discussion_counters
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def build_thread(replies_per_level):
+    """Root with replies_per_level replies, each with two replies of their own, plus a hidden subtree"""
+    users = [User(username=f'threaduser{i}', email=f'thread{i}@example.com') for i in range(3)]
+    content = Content(title='Thread Movie', type='movie')
+    db.session.add_all(users + [content])
+    db.session.flush()
+
+    def post(parent, user, **kwargs):
+        discussion = Discussion(content_id=content.id, user_id=user.id, message='msg',
+                                parent_id=parent.id if parent else None, **kwargs)
+        db.session.add(discussion)
+        db.session.flush()
+        return discussion
+
+    root = post(None, users[0])
+    for i in range(replies_per_level):
+        reply = post(root, users[1])
+        db.session.add(DiscussionLike(discussion_id=reply.id, user_id=users[0].id, is_like=i % 2 == 0))
+        for _ in range(2):
+            post(reply, users[2])
+    hidden = post(root, users[1], is_hidden=True)
+    post(hidden, users[2])
+    db.session.commit()
+    repair_discussion_counters()
+    return root, users
+
+
+def count_queries(fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+
+def test_thread_matches_per_discussion_methods(app):
+    root, users = build_thread(3)
+    expected = {reply.id: (reply.get_reply_count(), reply.get_like_count(), reply.get_dislike_count(),
+                           reply.get_thread_depth(), reply.get_user_reaction(users[0].id))
+                for reply in Discussion.query.filter(Discussion.is_hidden == False).all()}
+    db.session.expire_all()
+
+    replies = load_thread(root, users[0].id)
+
+    assert [node['depth'] for node in replies] == [0, 0, 0]
+    assert all(len(node['replies']) == 2 and node['replies'][0]['depth'] == 1 for node in replies)
+    assert root.get_reply_count() == 9
+    loaded = [root] + [node['discussion'] for node in replies] + \
+             [child['discussion'] for node in replies for child in node['replies']]
+    for discussion in loaded:
+        assert (discussion.get_reply_count(), discussion.get_like_count(), discussion.get_dislike_count(),
+                discussion.get_thread_depth(), discussion.get_user_reaction(users[0].id)) == expected[discussion.id]
+
+    leaf = replies[0]['replies'][0]['discussion']
+    db.session.expire_all()
+    assert Discussion.query.get(leaf.id).get_thread_root().id == root.id
+
+
+def test_thread_query_count_is_constant(app):
+    root, users = build_thread(40)
+    db.session.expire_all()
+    root = Discussion.query.get(root.id)
+    viewer_id = users[0].id
+
+    # Replies, root author, viewer reactions and reports (no group role for content threads)
+    assert count_queries(lambda: load_thread(root, viewer_id)) == 4
+
+
+def test_bulk_serializer_matches_to_dict(app):
+    root, users = build_thread(3)
+    group = Group(name='Thread Group', created_by=users[0].id)
+    db.session.add(group)
+    db.session.flush()
+    db.session.add(GroupMember(group_id=group.id, user_id=users[0].id, role='moderator'))
+    group_post = Discussion(group_id=group.id, user_id=users[1].id, message='group msg')
+    db.session.add(group_post)
+    db.session.flush()
+    db.session.add(DiscussionReport(discussion_id=group_post.id, reporter_id=users[0].id, reason='spam'))
+    db.session.commit()
+    viewer_id = users[0].id
+
+    discussions = Discussion.query.order_by(Discussion.id).all()
+    expected = [discussion.to_dict(user_id=viewer_id) for discussion in discussions]
+    expected_thread = root.to_dict(include_replies=True, user_id=viewer_id)
+    db.session.expire_all()
+
+    discussions = Discussion.query.order_by(Discussion.id).all()
+    queries = count_queries(lambda: serialize_discussions(discussions, viewer_id))
+    db.session.expire_all()
+    assert serialize_discussions(Discussion.query.order_by(Discussion.id).all(), viewer_id) == expected
+    assert serialize_thread(Discussion.query.get(root.id), viewer_id) == expected_thread
+    # Authors, depths, viewer reactions, reports and roles
+    assert queries == 5
+
+    # A viewer with no group role gets false, not null
+    outsider = serialize_discussions([Discussion.query.get(group_post.id)], users[2].id)[0]
+    assert outsider['can_edit'] is False and outsider['can_pin'] is False
+    db.session.expunge_all()
+    assert Discussion.query.get(group_post.id).can_user_pin(users[2].id) is False
+
+
+def test_routes_keep_counters_in_step(app):
+    root, users = build_thread(2)
+    reply = Discussion.query.filter_by(parent_id=root.id, is_hidden=False).first()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(users[1].id)
+        session['_fresh'] = True
+
+    client.post('/discussions/create', data={'message': 'nested', 'content_id': root.content_id,
+                                             'parent_id': reply.id})
+    client.get(f'/discussions/like/{reply.id}/dislike')
+    client.get(f'/discussions/like/{reply.id}/like')
+    db.session.expire_all()
+    assert (root.get_reply_count(), reply.direct_reply_count, reply.get_like_count(),
+            reply.get_dislike_count()) == (7, 3, 2, 0)
+
+    client.post(f'/discussions/delete/{reply.id}')
+    db.session.expire_all()
+    assert (root.direct_reply_count, root.get_reply_count()) == (1, 3)
+    assert repair_discussion_counters() == 0
+
+
+def test_app_start_upgrades_tables_without_counters(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'old.db'}")
+    with create_app('testing').app_context():
+        root, _ = build_thread(2)
+        root_id = root.id
+        with db.engine.begin() as connection:
+            for index in ('ix_discussion_content_engagement', 'ix_discussion_group_engagement'):
+                connection.exec_driver_sql(f"DROP INDEX {index}")
+            for column in ('like_count', 'dislike_count', 'direct_reply_count', 'descendant_reply_count'):
+                connection.exec_driver_sql(f"ALTER TABLE discussion DROP COLUMN {column}")
+        db.session.remove()
+
+    with create_app('testing').app_context():
+        root = Discussion.query.get(root_id)
+        assert (root.direct_reply_count, root.get_reply_count()) == (2, 6)
+        assert repair_discussion_counters() == 0
+        db.session.remove()
+        db.drop_all()
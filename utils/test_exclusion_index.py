@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Exclusion Index Test Suite
+Checks the cached per-target exclusion sets used to filter recommendations
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, ContentRating, UserWatchlist
+from utils.recommendation_config import Config
+from utils.exclusion_index import get_exclusion_index, exclude_content, invalidate_exclusions
+from utils.content_features import invalidate_content_feature_store
+from utils.recommendation_cache import clear_recommendation_caches
+from utils.recommendation_engine import RecommendationEngine
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        invalidate_exclusions()
+        invalidate_content_feature_store()
+        clear_recommendation_caches()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        invalidate_exclusions()
+        invalidate_content_feature_store()
+        clear_recommendation_caches()
+
+
+@pytest.fixture
+def user_and_content(app):
+    user = User(username='excludeuser', email='exclude@example.com')
+    user.set_password('password')
+    contents = [Content(title=f'Exclude Title {i}', type='movie', genre='Drama', rating=4.0, year=2015)
+                for i in range(30)]
+    db.session.add_all([user] + contents)
+    db.session.flush()
+    db.session.add(ContentRating(user_id=user.id, content_id=contents[0].id, rating=5))
+    db.session.add(UserWatchlist(user_id=user.id, content_id=contents[1].id))
+    db.session.commit()
+    return user, contents
+
+
+def test_index_loads_and_updates_incrementally(user_and_content):
+    user, contents = user_and_content
+    index = get_exclusion_index(user_id=user.id)
+    assert list(index.content_ids) == [contents[0].id, contents[1].id]
+    assert get_exclusion_index(user_id=user.id) is index
+
+    exclude_content([contents[5].id], user_id=user.id)
+    assert contents[5].id in get_exclusion_index(user_id=user.id)
+
+    invalidate_exclusions(user_id=user.id)
+    assert get_exclusion_index(user_id=user.id) is not index
+
+
+def test_lru_is_bounded(app, monkeypatch):
+    monkeypatch.setitem(Config.CACHING, 'cache_size_limit', 2)
+    first = get_exclusion_index(user_id=1)
+    get_exclusion_index(user_id=2)
+    get_exclusion_index(user_id=3)
+    assert get_exclusion_index(user_id=1) is not first
+
+
+def test_quick_add_route_updates_cached_index(app, user_and_content):
+    user, contents = user_and_content
+    assert contents[7].id not in get_exclusion_index(user_id=user.id)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    response = client.get(f'/watchlist/quick-add/{contents[7].id}')
+
+    assert response.get_json()['success']
+    assert contents[7].id in get_exclusion_index(user_id=user.id)
+
+
+def test_regeneration_skips_already_recommended(user_and_content):
+    user, contents = user_and_content
+    engine = RecommendationEngine()
+
+    first = engine.generate_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+    second = engine.generate_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+
+    first_ids = {r.content_id for r in first}
+    second_ids = {r.content_id for r in second}
+    assert len(first_ids) == len(second_ids) == 5
+    assert first_ids.isdisjoint(second_ids)
+    assert not (first_ids | second_ids) & {contents[0].id, contents[1].id}
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Item Similarity Test Suite
+Checks the similarity index against a brute-force computation and its incremental refresh
+"""
+
+import sys
+import os
+import math
+import random
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, ContentRating, ContentSimilarity, ContentSimilarityState
+from utils.recommendation_config import Config
+from utils import item_similarity
+from utils.item_similarity import rebuild_similarity_index, refresh_similarity_index, get_stale_content_ids
+
+GENRES = ['Drama', 'Comedy', 'Horror', 'Action', 'Romance']
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def create_catalog(seed=7):
+    rng = random.Random(seed)
+    users = [User(username=f'simuser{i}', email=f'sim{i}@example.com') for i in range(10)]
+    contents = [Content(title=f'Sim Title {i}', type='movie', genre=', '.join(rng.sample(GENRES, rng.randint(1, 3))))
+                for i in range(15)]
+    loner = Content(title='Unrated Oddity', type='movie', genre='Experimental')
+    db.session.add_all(users + contents + [loner])
+    db.session.flush()
+    for user in users:
+        for content in rng.sample(contents, 5):
+            db.session.add(ContentRating(user_id=user.id, content_id=content.id, rating=rng.randint(1, 5)))
+    db.session.commit()
+    return users, contents, loner
+
+
+def brute_force_scores():
+    """{content_id: {other_id: score}} from plain cosine and Jaccard loops"""
+    settings = Config.ITEM_SIMILARITY
+    ratings = {}
+    for rating in ContentRating.query.all():
+        ratings.setdefault(rating.content_id, {})[rating.user_id] = rating.rating
+    genres = {content.id: {genre.lower() for genre in Content.parse_genres(content.genre)}
+              for content in Content.query.all()}
+
+    def cosine(a, b):
+        a, b = ratings.get(a, {}), ratings.get(b, {})
+        norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+        return sum(a[user] * b[user] for user in a.keys() & b.keys()) / norm if norm else 0.0
+
+    def jaccard(a, b):
+        union = genres[a] | genres[b]
+        return len(genres[a] & genres[b]) / len(union) if union else 0.0
+
+    return {a: {b: settings['rating_weight'] * cosine(a, b) + settings['genre_weight'] * jaccard(a, b)
+                for b in genres if b != a}
+            for a in genres}
+
+
+def test_full_build_matches_brute_force(app):
+    create_catalog()
+    top_n = 4
+    rebuild_similarity_index({'neighbours_per_item': top_n})
+    expected = brute_force_scores()
+
+    for content_id, others in expected.items():
+        rows = ContentSimilarity.query.filter_by(content_id=content_id).order_by(ContentSimilarity.rank).all()
+        best = sorted((score for score in others.values() if score >= Config.ITEM_SIMILARITY['min_similarity']),
+                      reverse=True)[:top_n]
+        assert [row.score for row in rows] == pytest.approx(best, abs=1e-5)
+        for row in rows:
+            assert row.score == pytest.approx(others[row.similar_content_id], abs=1e-5)
+
+    assert ContentSimilarityState.query.count() == len(expected)
+
+
+def test_refresh_tracks_added_deleted_and_in_flight_ratings(app, monkeypatch):
+    users, contents, loner = create_catalog()
+    rebuild_similarity_index()
+
+    # The unrated item has no neighbours but is indexed, so it is not recomputed every run
+    assert ContentSimilarity.query.filter_by(content_id=loner.id).count() == 0
+    assert get_stale_content_ids() == []
+
+    unrated_by_first = next(c for c in contents if not ContentRating.query.filter_by(
+        user_id=users[0].id, content_id=c.id).first())
+    db.session.add(ContentRating(user_id=users[0].id, content_id=unrated_by_first.id, rating=5))
+    db.session.commit()
+    assert get_stale_content_ids() == [unrated_by_first.id]
+    assert refresh_similarity_index() == (1, ContentSimilarity.query.filter_by(
+        content_id=unrated_by_first.id).count())
+    assert get_stale_content_ids() == []
+
+    deleted = ContentRating.query.first()
+    db.session.delete(deleted)
+    db.session.commit()
+    assert get_stale_content_ids() == [deleted.content_id]
+
+    # A rating committed after the build read the ratings must still be picked up next time
+    read_ratings = item_similarity.RatingMatrix.from_database
+    in_flight = ContentRating(user_id=users[1].id, content_id=loner.id, rating=4)
+
+    def read_then_write():
+        matrix = read_ratings()
+        db.session.add(in_flight)
+        db.session.flush()
+        return matrix
+
+    monkeypatch.setattr(item_similarity.RatingMatrix, 'from_database', read_then_write)
+    refresh_similarity_index()
+    monkeypatch.undo()
+    assert get_stale_content_ids() == [loner.id]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Preference Profile Test Suite
+Checks that incremental profile updates match a full re-analysis
+"""
+
+import sys
+import os
+import random
+from collections import defaultdict
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from config import TestingConfig
+from models import User, Content, ContentRating, UserWatchlist
+from models.recommendations import UserPreferenceProfile
+from utils.exclusion_index import invalidate_exclusions
+from utils.recommendation_engine import RecommendationEngine, apply_rating_change, apply_watchlist_change
+
+GENRES = ['Action', 'Drama', 'Comedy', 'Horror', 'Sci-Fi']
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        invalidate_exclusions()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        invalidate_exclusions()
+
+
+def reference_preferences(user_id):
+    """The original full analysis, kept here as the parity oracle"""
+    genre_scores = defaultdict(list)
+    type_scores = defaultdict(list)
+    for rating in ContentRating.query.filter_by(user_id=user_id).order_by(ContentRating.id):
+        for genre in rating.content.get_genres():
+            genre_scores[genre].append(rating.rating / 5.0)
+        type_scores[rating.content.type].append(rating.rating / 5.0)
+
+    genre_preferences = {genre: sum(s) / len(s) for genre, s in genre_scores.items()}
+    type_preferences = {content_type: sum(s) / len(s) for content_type, s in type_scores.items()}
+
+    for item in UserWatchlist.query.filter_by(user_id=user_id).order_by(UserWatchlist.id):
+        for genre in item.content.get_genres():
+            genre_preferences[genre] = 0.6 if genre not in genre_preferences else (genre_preferences[genre] + 0.6) / 2
+        content_type = item.content.type
+        type_preferences[content_type] = 0.6 if content_type not in type_preferences else (type_preferences[content_type] + 0.6) / 2
+
+    return genre_preferences, type_preferences
+
+
+def assert_preferences_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key])
+
+
+def test_incremental_updates_match_full_analysis(app):
+    rng = random.Random(21)
+    user = User(username='profileuser', email='profile@example.com')
+    contents = [Content(title=f'Profile Title {i}', type=rng.choice(['movie', 'tv_show']),
+                        genre=', '.join(rng.sample(GENRES, rng.randint(1, 3)))) for i in range(30)]
+    db.session.add_all([user] + contents)
+    db.session.commit()
+
+    profile = UserPreferenceProfile(user_id=user.id)
+    db.session.add(profile)
+    RecommendationEngine()._analyze_user_preferences(profile)
+    db.session.commit()
+
+    # A random history of creates, edits and deletes applied only through deltas
+    for _ in range(120):
+        content = rng.choice(contents)
+        if rng.random() < 0.6:
+            rating = ContentRating.query.filter_by(user_id=user.id, content_id=content.id).first()
+            if rating and rng.random() < 0.3:
+                old_rating = rating.rating
+                db.session.delete(rating)
+                db.session.commit()
+                apply_rating_change(user.id, content, old_rating=old_rating)
+            elif rating:
+                old_rating, rating.rating = rating.rating, rng.randint(1, 5)
+                db.session.commit()
+                apply_rating_change(user.id, content, old_rating, rating.rating)
+            else:
+                new_rating = ContentRating(user_id=user.id, content_id=content.id, rating=rng.randint(1, 5))
+                db.session.add(new_rating)
+                db.session.commit()
+                apply_rating_change(user.id, content, new_rating=new_rating.rating)
+        else:
+            item = UserWatchlist.query.filter_by(user_id=user.id, content_id=content.id).first()
+            if item:
+                db.session.delete(item)
+                db.session.commit()
+                apply_watchlist_change(user.id, content, -1)
+            else:
+                db.session.add(UserWatchlist(user_id=user.id, content_id=content.id))
+                db.session.commit()
+                apply_watchlist_change(user.id, content, 1)
+
+    expected_genres, expected_types = reference_preferences(user.id)
+    assert_preferences_equal(profile.get_genre_preferences(), expected_genres)
+    assert_preferences_equal(profile.get_content_type_preferences(), expected_types)
+
+    incremental_confidence = profile.confidence_score
+    RecommendationEngine()._analyze_user_preferences(profile)
+    assert_preferences_equal(profile.get_genre_preferences(), expected_genres)
+    assert profile.confidence_score == pytest.approx(incremental_confidence)
+
+
+def test_rating_route_applies_delta(app):
+    user = User(username='routeuser', email='route@example.com')
+    content = Content(title='Route Title', type='movie', genre='Drama, Comedy', tmdb_id=1)
+    db.session.add_all([user, content])
+    db.session.flush()
+    profile = UserPreferenceProfile(user_id=user.id)
+    profile.set_preference_stats(UserPreferenceProfile.empty_preference_stats())
+    db.session.add(profile)
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    client.post(f'/content/{content.id}/rate', data={'rating': 4})
+
+    db.session.refresh(profile)
+    assert profile.get_genre_preferences() == pytest.approx({'Drama': 0.8, 'Comedy': 0.8})
+    assert profile.get_preference_stats()['ratings'] == 1
+
+
+def test_app_start_adds_stats_to_old_profile_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'old.db'}")
+    with create_app('testing').app_context():
+        user = User(username='legacyprofile', email='legacyprofile@example.com')
+        content = Content(title='Legacy Title', type='movie', genre='Drama')
+        db.session.add_all([user, content])
+        db.session.flush()
+        db.session.add(ContentRating(user_id=user.id, content_id=content.id, rating=5))
+        db.session.add(UserPreferenceProfile(user_id=user.id))
+        db.session.commit()
+        user_id = user.id
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE user_preference_profile DROP COLUMN preference_stats")
+        db.session.remove()
+
+    with create_app('testing').app_context():
+        assert UserPreferenceProfile.query.one().get_preference_stats() is None
+        # The legacy profile is rebuilt from ratings on first use
+        profile = RecommendationEngine()._get_or_create_user_profile(user_id)
+        assert profile.get_preference_stats()['ratings'] == 1
+        assert profile.get_genre_preferences() == pytest.approx({'Drama': 1.0})
+        db.session.remove()
+        db.drop_all()
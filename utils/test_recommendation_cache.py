@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Recommendation Cache Test Suite
+Checks TTL/LRU behavior of the in-process caches and their invalidation hooks
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, Group, GroupMember, RecommendationCacheVersion
+from utils.content_features import invalidate_content_feature_store
+from utils.exclusion_index import invalidate_exclusions
+from utils.recommendation_cache import (
+    TTLCache, profile_cache, candidate_cache, clear_recommendation_caches
+)
+from utils.recommendation_engine import RecommendationEngine
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        invalidate_exclusions()
+        invalidate_content_feature_store()
+        clear_recommendation_caches()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        invalidate_exclusions()
+        invalidate_content_feature_store()
+        clear_recommendation_caches()
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('utils.recommendation_cache.time.monotonic', lambda: clock[0])
+    cache = TTLCache('test', maxsize=2, ttl_seconds=10)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # 'b' is least recently used
+    assert cache.get('b') is None
+
+    clock[0] += 11
+    assert cache.get('a') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations']) == (1, 2, 1, 1)
+
+
+def test_candidates_are_reused_until_exhausted(app):
+    user = User(username='cacheuser', email='cache@example.com')
+    contents = [Content(title=f'Cache Title {i}', type='movie', genre='Drama', rating=4.0, year=2015)
+                for i in range(30)]
+    db.session.add_all([user] + contents)
+    db.session.commit()
+    engine = RecommendationEngine()
+
+    engine.score_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+    engine.score_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+    assert candidate_cache.hits == 1
+    assert profile_cache.hits == 1
+
+    # Saving recommendations excludes half of the cached candidates, so they are regenerated
+    first = engine.generate_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+    second = engine.generate_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+    assert len(second) == 5
+    assert not {r.content_id for r in first} & {r.content_id for r in second}
+
+
+def test_routes_invalidate_user_and_group_entries(app):
+    user = User(username='hookuser', email='hook@example.com')
+    user.set_password('password')
+    content = Content(title='Hook Title', type='movie', genre='Drama', tmdb_id=1)
+    group = Group(name='Hook Group', creator=user)
+    db.session.add_all([user, content, group])
+    db.session.flush()
+    db.session.add(GroupMember(user_id=user.id, group_id=group.id, role='admin'))
+    db.session.commit()
+
+    profile_cache.set(('user', user.id), object())
+    profile_cache.set(('group', group.id), object())
+    candidate_cache.set(('group', group.id, 'group_consensus', 10), [])
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    client.get(f'/watchlist/quick-add/{content.id}')
+
+    assert len(profile_cache) == 0
+    assert len(candidate_cache) == 0
+
+
+def test_invalidation_by_another_worker_stales_entries(app):
+    user = User(username='workeruser', email='worker@example.com')
+    db.session.add_all([user] + [Content(title=f'Worker Title {i}', type='movie', genre='Drama', rating=4.0)
+                                 for i in range(20)])
+    db.session.commit()
+    engine = RecommendationEngine()
+    engine.score_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+
+    # Another process handled a rating: only the shared version row changes, not this process's cache
+    db.session.add(RecommendationCacheVersion(target_type='user', target_id=user.id, version=1))
+    db.session.commit()
+    engine.score_recommendations(user_id=user.id, algorithm='content_based', limit=5)
+    assert (profile_cache.invalidations, candidate_cache.invalidations) == (1, 1)
+    assert profile_cache.get(('user', user.id))[0] == 1
+    assert candidate_cache.get(('user', user.id, 'content_based', 5))[0] == 1
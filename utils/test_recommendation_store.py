@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Recommendation Store Test Suite
+Checks set-based recommendation writes, expiry, archival and the unique active index
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from config import TestingConfig
+from models import User, Content
+from models.recommendations import Recommendation, RecommendationFeedback
+from utils.recommendation_store import (
+    insert_recommendations, expire_recommendations, archive_overflow, delete_recommendations
+)
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user_and_content(app):
+    user = User(username='storeuser', email='store@example.com')
+    contents = [Content(title=f'Store Title {i}', type='movie') for i in range(60)]
+    db.session.add_all([user] + contents)
+    db.session.commit()
+    return user, contents
+
+
+def rows_for(user, contents, score=1.0, **extra):
+    return [dict({'user_id': user.id, 'content_id': c.id, 'score': score, 'algorithm': 'test'}, **extra)
+            for c in contents]
+
+
+def test_unique_active_index(user_and_content):
+    user, contents = user_and_content
+    db.session.add(Recommendation(user_id=user.id, content_id=contents[0].id, score=1, algorithm='test'))
+    db.session.commit()
+
+    db.session.add(Recommendation(user_id=user.id, content_id=contents[0].id, score=2, algorithm='test'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    # Inactive rows are not constrained
+    db.session.add(Recommendation(user_id=user.id, content_id=contents[0].id, score=2,
+                                  algorithm='test', status='dismissed'))
+    db.session.commit()
+
+
+def test_insert_supersedes_active_duplicates(user_and_content):
+    user, contents = user_and_content
+    insert_recommendations(rows_for(user, contents[:5], score=1.0))
+    db.session.commit()
+
+    inserted = insert_recommendations(rows_for(user, contents[3:8], score=2.0) +
+                                      rows_for(user, contents[3:4], score=3.0))
+    db.session.commit()
+
+    assert inserted == 5
+    active = Recommendation.query.filter_by(user_id=user.id, status='active').all()
+    assert sorted(r.content_id for r in active) == [c.id for c in contents[:8]]
+    assert next(r for r in active if r.content_id == contents[3].id).score == 3.0
+    assert Recommendation.query.filter_by(status='archived').count() == 2
+
+
+def test_expire_archive_and_delete(user_and_content):
+    user, contents = user_and_content
+    now = datetime.utcnow()
+    insert_recommendations(rows_for(user, contents[:5], expires_at=now - timedelta(days=1)))
+    insert_recommendations([
+        dict(row, created_at=now - timedelta(minutes=i))
+        for i, row in enumerate(rows_for(user, contents[5:], expires_at=now + timedelta(days=1)))
+    ])
+    db.session.commit()
+
+    assert expire_recommendations(user_ids=[user.id]) == 5
+    assert archive_overflow(user_ids=[user.id], keep=50) == 5
+    db.session.commit()
+
+    active = Recommendation.query.filter_by(user_id=user.id, status='active').all()
+    assert len(active) == 50
+    assert {r.content_id for r in active} == {c.id for c in contents[5:55]}
+
+    expired = Recommendation.query.filter_by(status='expired').first()
+    db.session.add(RecommendationFeedback(recommendation_id=expired.id, user_id=user.id, feedback_type='like'))
+    db.session.commit()
+
+    assert delete_recommendations(Recommendation.status == 'expired') == 5
+    db.session.commit()
+    assert RecommendationFeedback.query.count() == 0
+
+
+def test_app_start_dedupes_then_builds_missing_indexes(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'old.db'}")
+    with create_app('testing').app_context():
+        user = User(username='legacyrecs', email='legacyrecs@example.com')
+        content = Content(title='Legacy Rec', type='movie')
+        db.session.add_all([user, content])
+        db.session.commit()
+        with db.engine.begin() as connection:
+            for index in ('uq_active_user_recommendation', 'uq_active_group_recommendation'):
+                connection.exec_driver_sql(f"DROP INDEX {index}")
+        # Older versions could write the same active recommendation twice
+        for score in (0.5, 0.9):
+            db.session.add(Recommendation(user_id=user.id, content_id=content.id, score=score, algorithm='test'))
+        db.session.commit()
+        user_id, content_id = user.id, content.id
+        db.session.remove()
+
+    with create_app('testing').app_context():
+        assert [rec.score for rec in Recommendation.query.all()] == [0.9]
+        db.session.add(Recommendation(user_id=user_id, content_id=content_id, score=0.1, algorithm='test'))
+        with pytest.raises(IntegrityError):
+            db.session.flush()
+        db.session.rollback()
+        db.session.remove()
+        db.drop_all()
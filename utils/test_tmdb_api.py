@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+TMDB HTTP Client Test Suite
+Checks pooled-session retries and timeouts against a local fake server
+"""
+
+import sys
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.recommendation_config import Config
+from utils.tmdb_api import TMDBService, tmdb_get, get_tmdb_session
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    statuses = []
+    requests_seen = 0
+    delay = 0
+    connections = set()
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests_seen += 1
+        cls.connections.add(self.client_address)
+        time.sleep(cls.delay)
+        status = cls.statuses.pop(0) if cls.statuses else 200
+        body = json.dumps({'status': status}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_rate_limit_path', str(tmp_path / 'rate_limit.sqlite3'))
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'api_rate_limit_per_minute', 6000)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_rate_limit_burst', 100)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_backoff_seconds', 0.001)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_max_retries', 2)
+    FlakyHandler.statuses, FlakyHandler.requests_seen, FlakyHandler.connections = [], 0, set()
+    FlakyHandler.delay = 0
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_retries_transient_errors_then_succeeds(server):
+    FlakyHandler.statuses = [503, 429]
+    assert tmdb_get(f"{server}/movie/popular", {'page': 1}).json() == {'status': 200}
+    assert FlakyHandler.requests_seen == 3
+
+
+def test_retries_are_bounded_and_client_errors_are_not_retried(server):
+    FlakyHandler.statuses = [500, 500, 500, 500]
+    with pytest.raises(requests.HTTPError):
+        tmdb_get(f"{server}/movie/1", {})
+    assert FlakyHandler.requests_seen == 3
+
+    FlakyHandler.statuses = [404]
+    with pytest.raises(requests.HTTPError):
+        tmdb_get(f"{server}/movie/2", {})
+    assert FlakyHandler.requests_seen == 4
+
+
+def test_session_is_shared_and_keeps_connections_alive(server):
+    assert get_tmdb_session() is get_tmdb_session()
+    for page in range(5):
+        tmdb_get(f"{server}/movie/popular", {'page': page})
+    assert len(FlakyHandler.connections) == 1
+
+
+@pytest.fixture
+def service(server, monkeypatch, tmp_path):
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_cache_path', str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setenv('TMDB_BASE_URL', server)
+    monkeypatch.setenv('TMDB_API_KEY', 'test-key')
+    return TMDBService()
+
+
+def test_concurrent_detail_lookups_share_one_request(service):
+    FlakyHandler.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.get_content_details(550)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert FlakyHandler.requests_seen == 1
+    assert len(results) == 8 and all(result is not None for result in results)
+
+
+def test_not_found_is_cached(service):
+    FlakyHandler.statuses = [404]
+    assert service.get_content_details(551, 'tv') is None
+    assert service.get_content_details(551, 'tv') is None
+    assert FlakyHandler.requests_seen == 1
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+TMDB Backend Test Suite
+Checks the replay and synthetic backends and the request path running fully offline
+"""
+
+import sys
+import os
+import time
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from utils.recommendation_config import Config
+from utils import tmdb_api
+from utils.tmdb_api import TMDBService
+from utils.tmdb_backends import ReplayBackend, SyntheticBackend
+from utils.tmdb_cache import NOT_FOUND
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    monkeypatch.delenv('TMDB_API_KEY', raising=False)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_backend', 'synthetic')
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_synthetic_size', 200)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_cache_path', str(tmp_path / 'cache.sqlite3'))
+
+
+def test_synthetic_catalog_is_deterministic_and_type_exclusive():
+    first, second = SyntheticBackend(size=50, seed=3), SyntheticBackend(size=50, seed=3)
+    assert first.fetch('/movie/popular', {'page': 1}) == second.fetch('/movie/popular', {'page': 1})
+
+    item = first.fetch('/trending/all/day', {})['results'][0]
+    other_type = 'tv' if item['media_type'] == 'movie' else 'movie'
+    assert first.fetch(f"/{item['media_type']}/{item['id']}", {})['credits']['cast']
+    assert first.fetch(f"/{other_type}/{item['id']}", {}) is NOT_FOUND
+
+
+def test_replay_records_then_serves_offline(tmp_path):
+    synthetic = SyntheticBackend(size=20)
+    recorder = ReplayBackend(str(tmp_path), record_from=synthetic)
+    recorded = recorder.fetch('/movie/popular', {'page': 1, 'api_key': 'secret'})
+    missing = recorder.fetch('/movie/999', {})
+
+    replay = ReplayBackend(str(tmp_path))
+    assert replay.fetch('/movie/popular', {'page': 1}) == recorded
+    assert missing is NOT_FOUND and replay.fetch('/movie/999', {}) is NOT_FOUND
+    assert replay.fetch('/movie/popular', {'page': 2}) is None
+
+
+def test_browse_and_detail_pages_run_without_network(offline):
+    service = TMDBService()
+    details = service.get_content_details(1, 'movie') or service.get_content_details(1, 'tv')
+    assert details['title'] and details['genres']
+
+    app = create_app('testing')
+    with app.app_context():
+        client = app.test_client()
+        assert client.get('/content/').status_code == 200
+        assert client.get('/content/1').status_code == 200
+        assert client.get('/content/search?q=the').get_json()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_genre_browse_pages_through_the_whole_genre(offline, monkeypatch):
+    monkeypatch.setattr(tmdb_api, '_reference_data', {})
+    service = TMDBService()
+    genre_id, genre_name = next(iter(service.get_genre_map('movie').items()))
+    discovered = service.discover_content('movie', genre_id)
+    assert all(genre_id in item['genre_ids'] for item in discovered['results'])
+    assert discovered['total_results'] < service.get_popular_content('movie')['total_results']
+
+    app = create_app('testing')
+    with app.app_context():
+        client = app.test_client()
+        page = client.get('/content/', query_string={'genre': genre_name}).get_data(as_text=True)
+        assert f"of {discovered['total_results']} results" in page
+
+        # Search cannot filter by genre upstream, so locally filtered pages show no totals
+        page = client.get('/content/', query_string={'search': 'the', 'genre': genre_name}).get_data(as_text=True)
+        assert 'Showing' not in page and 'page-link' not in page
+        db.session.remove()
+        db.drop_all()
+
+
+class SlowBackend(SyntheticBackend):
+    delay = 0.0
+
+    def fetch(self, path, params):
+        time.sleep(self.delay)
+        return super().fetch(path, params)
+
+
+def test_fan_out_falls_back_to_cache_past_deadline(offline):
+    service = TMDBService(backend=SlowBackend(size=50))
+    popular = service.get_popular_content('movie')
+    details, content_type = service.find_content_details(1, 'tv')
+    assert details['title'] and content_type == service.backend._title(1)['media_type']
+
+    SlowBackend.delay = 0.5
+    started = time.monotonic()
+    results = service.fan_out({
+        'popular': lambda svc: svc.get_popular_content('movie'),
+        'uncached': lambda svc: svc.get_popular_content('movie', page=3)
+    }, timeout=0.1)
+    SlowBackend.delay = 0.0
+
+    assert time.monotonic() - started < 0.4
+    assert results == {'popular': popular, 'uncached': None}
+
+
+class CountingBackend(SyntheticBackend):
+    paths = []
+
+    def fetch(self, path, params):
+        type(self).paths.append(path)
+        return super().fetch(path, params)
+
+
+def test_alternate_type_is_probed_only_on_a_miss(offline, monkeypatch):
+    monkeypatch.setattr(CountingBackend, 'paths', [])
+    service = TMDBService(backend=CountingBackend(size=50))
+    first_type, second_type = service.backend._title(1)['media_type'], service.backend._title(2)['media_type']
+    wrong_type = 'tv' if second_type == 'movie' else 'movie'
+
+    assert service.find_content_details(1, first_type)[1] == first_type
+    assert service.find_content_details(2, wrong_type)[1] == second_type
+    probes = [path for path in CountingBackend.paths if path.split('/')[-1].isdigit()]
+    assert probes == [f"/{first_type}/1", f"/{wrong_type}/2", f"/{second_type}/2"]
+
+
+def test_list_items_get_genres_and_images_without_detail_calls(offline, monkeypatch):
+    monkeypatch.setattr(tmdb_api, '_reference_data', {})
+    monkeypatch.setattr(CountingBackend, 'paths', [])
+
+    service = TMDBService(backend=CountingBackend(size=50))
+    item = service.get_popular_content('movie')['results'][0]
+    card = service.transform_list_item(item, 'movie', poster_size='w200')
+
+    assert card['genres'] == service.get_content_details(item['id'], 'movie')['genres']
+    assert card['poster_url'].startswith('https://image.tmdb.org/t/p/w342/')
+    service.transform_list_item(service.get_popular_content('movie', page=2)['results'][0], 'movie')
+    assert CountingBackend.paths == ['/movie/popular', '/genre/movie/list', '/configuration',
+                                     f"/movie/{item['id']}", '/movie/popular']
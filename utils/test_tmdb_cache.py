@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+TMDB Response Cache Test Suite
+Checks per-endpoint TTLs, stale-while-revalidate and hit/miss metrics
+"""
+
+import sys
+import os
+import time
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import tmdb_cache
+from utils.tmdb_cache import TMDBResponseCache, make_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TMDBResponseCache(str(tmp_path / 'tmdb.sqlite3'),
+                             {'popular': 60, 'details': 3600}, stale_seconds=600)
+
+
+class FakeFetch:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_key_ignores_api_key_and_param_order():
+    assert make_cache_key('/movie/popular', {'api_key': 'a', 'page': 1, 'language': 'en'}) == \
+        make_cache_key('/movie/popular', {'language': 'en', 'page': 1, 'api_key': 'b'})
+
+
+def test_fresh_stale_and_expired_entries(cache, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(tmdb_cache.time, 'time', lambda: clock[0])
+    fetch = FakeFetch({'page': 1}, {'page': 2}, None)
+
+    assert cache.get('popular', '/movie/popular', {'page': 1}, fetch) == {'page': 1}
+    assert cache.get('popular', '/movie/popular', {'page': 1}, fetch) == {'page': 1}
+    assert fetch.calls == 1
+
+    # Past the TTL: the stale copy is served while a background refresh replaces it
+    clock[0] += 120
+    assert cache.get('popular', '/movie/popular', {'page': 1}, fetch) == {'page': 1}
+    deadline = time.monotonic() + 5
+    while not cache.stats()['popular'].get('refresh') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get('popular', '/movie/popular', {'page': 1}, fetch) == {'page': 2}
+
+    # Past the stale window with TMDB down: the expired copy is still better than nothing
+    clock[0] += 3600
+    assert cache.get('popular', '/movie/popular', {'page': 1}, fetch) == {'page': 2}
+    assert fetch.calls == 3
+
+    stats = cache.stats()['popular']
+    assert (stats['hit'], stats['stale_hit'], stats['miss'], stats['refresh']) == (2, 1, 2, 1)
+    assert stats['entries'] == 1
+
+
+def test_failures_are_not_cached(cache):
+    fetch = FakeFetch(None, {'id': 5})
+    assert cache.get('details', '/movie/5', {}, fetch) is None
+    assert cache.get('details', '/movie/5', {}, fetch) == {'id': 5}
+    assert fetch.calls == 2
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+TMDB Import Test Suite
+Runs the bulk importer against a local fake TMDB server
+"""
+
+import sys
+import os
+import re
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models import User, Content, UserWatchlist
+from utils.recommendation_config import Config
+from utils.tmdb_importer import import_tmdb_content, refresh_stale_content
+
+MISSING_ID = 107
+
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    detail_requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        page = int(parse_qs(url.query).get('page', ['1'])[0])
+        detail = re.fullmatch(r'/3/movie/(\d+)', url.path)
+
+        if url.path == '/3/movie/popular':
+            status, body = 200, {'page': page, 'results': [{'id': 100 + (page - 1) * 5 + i} for i in range(5)]}
+        elif detail and int(detail.group(1)) != MISSING_ID:
+            tmdb_id = int(detail.group(1))
+            type(self).detail_requests.append(tmdb_id)
+            status, body = 200, {
+                'id': tmdb_id, 'title': f'Fake Movie {tmdb_id}', 'release_date': '2020-05-01', 'original_language': 'en',
+                'genres': [{'name': 'Drama'}], 'vote_average': 7.5, 'runtime': 100,
+                'credits': {'cast': [{'name': 'Someone'}], 'crew': []}
+            }
+        else:
+            status, body = 404, {'status_message': 'not found'}
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'cache_api_responses', False)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_rate_limit_path', str(tmp_path / 'rate_limit.sqlite3'))
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'api_rate_limit_per_minute', 60000)
+    monkeypatch.setitem(Config.EXTERNAL_APIS, 'tmdb_rate_limit_burst', 100)
+    FakeTMDBHandler.detail_requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeTMDBHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setenv('TMDB_BASE_URL', f"http://127.0.0.1:{httpd.server_port}/3")
+    monkeypatch.setenv('TMDB_API_KEY', 'test-key')
+
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+    httpd.shutdown()
+
+
+def test_import_upserts_and_skips_fresh(app):
+    stats = import_tmdb_content('movie', pages=2, workers=4, batch_size=3)
+
+    assert (stats['candidates'], stats['inserted'], stats['failed']) == (10, 9, 1)
+    movie = Content.query.filter_by(tmdb_id=101).one()
+    assert (movie.title, movie.genre, movie.year, movie.type) == ('Fake Movie 101', 'Drama', 2020, 'movie')
+    assert (movie.language, movie.status) == ('EN', 'active')
+
+    # Fresh rows are skipped; stale ones are refreshed in place
+    Content.query.filter_by(tmdb_id=102).update({'updated_at': datetime.utcnow() - timedelta(days=90),
+                                                 'title': 'Old Title'})
+    db.session.commit()
+    FakeTMDBHandler.detail_requests = []
+
+    stats = import_tmdb_content('movie', pages=2, workers=4)
+
+    assert (stats['skipped'], stats['inserted'], stats['updated']) == (8, 0, 1)
+    assert sorted(FakeTMDBHandler.detail_requests) == [102]
+    assert Content.query.filter_by(tmdb_id=102).one().title == 'Fake Movie 102'
+    assert Content.query.count() == 9
+
+
+def test_refresh_prioritises_popular_stale_titles(app):
+    import_tmdb_content('movie', pages=1, workers=2)
+    stale = datetime.utcnow() - timedelta(days=60)
+    Content.query.filter_by(tmdb_id=101).update({'updated_at': stale})
+    Content.query.filter_by(tmdb_id=103).update({'updated_at': stale, 'rating': 2.0})
+    user = User(username='refreshuser', email='refresh@example.com')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(UserWatchlist(user_id=user.id, content_id=Content.query.filter_by(tmdb_id=103).one().id))
+    db.session.commit()
+    FakeTMDBHandler.detail_requests = []
+
+    stats = refresh_stale_content(budget=1, workers=2)
+
+    assert FakeTMDBHandler.detail_requests == [103]
+    assert (stats['changed'], stats['unchanged']) == (1, 0)
+    refreshed = Content.query.filter_by(tmdb_id=103).one()
+    assert refreshed.rating == 7.5 and refreshed.updated_at > stale
+
+    stats = refresh_stale_content(budget=10, workers=2)
+    assert (stats['candidates'], stats['changed'], stats['unchanged']) == (1, 0, 1)
+
+
+def test_refresh_backs_off_titles_missing_from_tmdb(app):
+    import_tmdb_content('movie', pages=1, workers=2)
+    stale = datetime.utcnow() - timedelta(days=60)
+    removed = Content(title='Removed Movie', type='movie', tmdb_id=MISSING_ID, updated_at=stale)
+    user = User(username='backoffuser', email='backoff@example.com')
+    db.session.add_all([removed, user])
+    Content.query.filter_by(tmdb_id=101).update({'updated_at': stale})
+    db.session.flush()
+    db.session.add(UserWatchlist(user_id=user.id, content_id=removed.id))
+    db.session.commit()
+
+    # The popular removed title fails once, then stops taking the refresh budget
+    assert refresh_stale_content(budget=1, workers=2)['failed'] == 1
+    FakeTMDBHandler.detail_requests = []
+    stats = refresh_stale_content(budget=1, workers=2)
+    assert (stats['failed'], stats['unchanged']) == (0, 1)
+    assert FakeTMDBHandler.detail_requests == [101]
+
+    backoff = Config.TMDB_IMPORT['local_max_age_days'] - Config.TMDB_IMPORT['refresh_failure_backoff_days']
+    retry_at = Content.query.filter_by(tmdb_id=MISSING_ID).one().updated_at
+    assert stale < retry_at <= datetime.utcnow() - timedelta(days=backoff)
+
+
+def test_refresh_keeps_moderation_status(app):
+    import_tmdb_content('movie', pages=1, workers=2)
+    stale = datetime.utcnow() - timedelta(days=60)
+    Content.query.filter_by(tmdb_id=101).update({'updated_at': stale, 'status': 'inactive'})
+    db.session.commit()
+
+    stats = refresh_stale_content(budget=1, workers=2)
+
+    assert (stats['changed'], stats['unchanged']) == (0, 1)
+    refreshed = Content.query.filter_by(tmdb_id=101).one()
+    assert refreshed.status == 'inactive' and refreshed.updated_at > stale
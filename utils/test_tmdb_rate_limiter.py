@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+TMDB Rate Limiter Test Suite
+Checks the shared token bucket, deadlines and interactive priority
+"""
+
+import sys
+import os
+import multiprocessing
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tmdb_rate_limiter import TokenBucketLimiter, RateLimitTimeout
+
+
+def take_tokens(path, count, results):
+    limiter = TokenBucketLimiter(path, rate_per_minute=1, burst=5, interactive_reserve=0)
+    taken = 0
+    for _ in range(count):
+        try:
+            limiter.acquire('interactive', timeout=0)
+            taken += 1
+        except RateLimitTimeout:
+            pass
+    results.put(taken)
+
+
+def test_bucket_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / 'limit.sqlite3')
+    TokenBucketLimiter(path, rate_per_minute=1, burst=5, interactive_reserve=0)
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=take_tokens, args=(path, 4, results)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sum(results.get() for _ in workers) == 5
+
+
+def test_bulk_leaves_reserve_for_interactive(tmp_path):
+    limiter = TokenBucketLimiter(str(tmp_path / 'limit.sqlite3'), rate_per_minute=1, burst=4,
+                                 interactive_reserve=2)
+
+    limiter.acquire('bulk', timeout=0)
+    limiter.acquire('bulk', timeout=0)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire('bulk', timeout=0)
+
+    limiter.acquire('interactive', timeout=0)
+    limiter.acquire('interactive', timeout=0)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire('interactive', timeout=0.05)
+
+
+def test_queued_request_gets_next_token(tmp_path):
+    limiter = TokenBucketLimiter(str(tmp_path / 'limit.sqlite3'), rate_per_minute=600, burst=1,
+                                 interactive_reserve=0)
+    limiter.acquire('interactive', timeout=0)
+    limiter.acquire('interactive', timeout=1)  # refills at 10 tokens/second
@@ -1,84 +1,425 @@
 import requests
 import os
+import copy
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, TimeoutError
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from utils.recommendation_config import Config
+from utils.tmdb_cache import get_tmdb_cache, make_cache_key, NOT_FOUND
+from utils.tmdb_rate_limiter import get_tmdb_rate_limiter
+from utils.tmdb_backends import ReplayBackend, SyntheticBackend
+
+# Status codes worth retrying: rate limited or a transient server-side failure
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Used until /configuration has been fetched (or when it cannot be)
+DEFAULT_IMAGE_CONFIG = {
+    'secure_base_url': 'https://image.tmdb.org/t/p/',
+    'poster_sizes': ['w92', 'w154', 'w185', 'w342', 'w500', 'w780', 'original'],
+    'backdrop_sizes': ['w300', 'w780', 'w1280', 'original'],
+    'profile_sizes': ['w45', 'w185', 'h632', 'original']
+}
+
+# Retry interval for reference data that could not be fetched
+REFERENCE_RETRY_SECONDS = 60
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# Genre lists and image configuration, kept in process: (backend, path) -> (expires_at, data)
+_reference_data = {}
+_reference_lock = threading.Lock()
+
+
+def get_tmdb_session():
+    """Process-wide pooled session so TMDB connections are kept alive across requests
+    
+    Rebuilt after a fork, since pooled sockets must not be shared between processes.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            pool_size = Config.EXTERNAL_APIS['tmdb_pool_size']
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept': 'application/json', 'Connection': 'keep-alive'})
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def _retry_delay(attempt, response=None):
+    """Full-jitter exponential backoff, honoring a Retry-After header when TMDB sends one"""
+    settings = Config.EXTERNAL_APIS
+    if response is not None and response.headers.get('Retry-After', '').isdigit():
+        return min(float(response.headers['Retry-After']), settings['tmdb_max_backoff_seconds'])
+    return random.uniform(0, min(settings['tmdb_max_backoff_seconds'],
+                                 settings['tmdb_backoff_seconds'] * 2 ** attempt))
+
+
+def tmdb_get(url, params, priority='interactive'):
+    """GET with connect/read timeouts and bounded, jittered retries on 429/5xx and connection errors
+    
+    Every attempt first takes a token from the shared rate limiter at the given priority.
+    Retries stop after tmdb_max_retries attempts or once tmdb_retry_budget_seconds of waiting is spent.
+    """
+    settings = Config.EXTERNAL_APIS
+    timeout = (settings['tmdb_connect_timeout'], settings['tmdb_api_timeout'])
+    session = get_tmdb_session()
+    limiter = get_tmdb_rate_limiter()
+    waited = 0.0
+    
+    for attempt in range(settings['tmdb_max_retries'] + 1):
+        if limiter:
+            limiter.acquire(priority)
+        
+        response = None
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response
+            if response.status_code == 429 and limiter:
+                limiter.drain()
+            error = requests.HTTPError(f"{response.status_code} from TMDB", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        
+        delay = _retry_delay(attempt, response)
+        if attempt == settings['tmdb_max_retries'] or waited + delay > settings['tmdb_retry_budget_seconds']:
+            raise error
+        time.sleep(delay)
+        waited += delay
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key in this process onto one in-flight call"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = fn()
+            return call['result']
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+_in_flight = SingleFlight()
+
+
+class HTTPBackend:
+    """The real TMDB API over the pooled, rate-limited session"""
+    
+    name = 'http'
+    
+    def __init__(self, base_url, priority='interactive'):
+        self.base_url = base_url
+        self.priority = priority
+    
+    def fetch(self, path, params):
+        """GET a TMDB endpoint, returning the decoded JSON, NOT_FOUND for a 404, or None on error"""
+        try:
+            return tmdb_get(f"{self.base_url}{path}", params, self.priority).json()
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return NOT_FOUND
+            print(f"TMDB API error: {e}")
+            return None
+        except requests.RequestException as e:
+            print(f"TMDB API error: {e}")
+            return None
+
+
+_synthetic_backends = {}
+_fan_out_pool = None
+_fan_out_pid = None
+
+
+def get_fan_out_pool():
+    """Process-wide thread pool for running a request's TMDB calls concurrently"""
+    global _fan_out_pool, _fan_out_pid
+    with _session_lock:
+        if _fan_out_pool is None or _fan_out_pid != os.getpid():
+            _fan_out_pool = ThreadPoolExecutor(max_workers=Config.EXTERNAL_APIS['tmdb_fan_out_workers'],
+                                               thread_name_prefix='tmdb-fan-out')
+            _fan_out_pid = os.getpid()
+        return _fan_out_pool
+
+
+def get_tmdb_backend(priority='interactive', base_url=None):
+    """Build the backend named by EXTERNAL_APIS['tmdb_backend']: http, replay, record or synthetic
+    
+    'record' replays fixtures and records any missing ones from the HTTP API.
+    """
+    settings = Config.EXTERNAL_APIS
+    backend = settings['tmdb_backend']
+    http = HTTPBackend(base_url or os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3'), priority)
+    
+    if backend == 'http':
+        return http
+    if backend in ('replay', 'record'):
+        return ReplayBackend(settings['tmdb_fixture_dir'], record_from=http if backend == 'record' else None)
+    if backend == 'synthetic':
+        key = (settings['tmdb_synthetic_size'], settings['tmdb_synthetic_seed'])
+        with _session_lock:
+            if key not in _synthetic_backends:
+                _synthetic_backends[key] = SyntheticBackend(*key)
+            return _synthetic_backends[key]
+    raise ValueError(f"Unknown TMDB backend: {backend}")
+
 
 class TMDBService:
     """Service for interacting with The Movie Database (TMDB) API"""
     
-    def __init__(self):
+    def __init__(self, priority='interactive', backend=None):
         self.api_key = os.environ.get('TMDB_API_KEY')
-        self.base_url = 'https://api.themoviedb.org/3'
-        self.image_base_url = 'https://image.tmdb.org/t/p'
+        self.priority = priority  # 'interactive' for page requests, 'bulk' for imports
+        self.base_url = os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+        self.backend = backend or get_tmdb_backend(priority, self.base_url)
+        self.cache_only = False  # Answer only from the response cache (see cached_view)
         
-        if not self.api_key:
+        # Only the live API needs a key; replay and synthetic backends run offline
+        if not self.api_key and self.backend.name in ('http', 'record'):
             raise ValueError("TMDB_API_KEY environment variable is required")
     
     def search_content(self, query, content_type='multi', page=1):
         """Search for content on TMDB"""
-        endpoint = f"{self.base_url}/search/{content_type}"
         params = {
             'api_key': self.api_key,
             'query': query,
             'page': page
         }
         
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"TMDB API error: {e}")
-            return None
+        return self._get('search', f"/search/{content_type}", params)
     
     def get_content_details(self, tmdb_id, content_type='movie'):
         """Get detailed information about a specific content item"""
-        endpoint = f"{self.base_url}/{content_type}/{tmdb_id}"
         params = {
             'api_key': self.api_key,
             'append_to_response': 'credits,videos,external_ids'
         }
         
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Transform TMDB data to our format
-            return self._transform_tmdb_data(data, content_type)
-        except requests.RequestException as e:
-            print(f"TMDB API error: {e}")
+        data = self._get('details', f"/{content_type}/{tmdb_id}", params)
+        if data is None:
             return None
+        
+        # Transform TMDB data to our format
+        return self._transform_tmdb_data(data, content_type)
     
     def get_popular_content(self, content_type='movie', page=1):
         """Get popular content from TMDB"""
-        endpoint = f"{self.base_url}/{content_type}/popular"
         params = {
             'api_key': self.api_key,
             'page': page
         }
         
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"TMDB API error: {e}")
-            return None
+        return self._get('popular', f"/{content_type}/popular", params)
+    
+    def discover_content(self, content_type='movie', genre_id=None, page=1):
+        """Browse TMDB's catalog by popularity, optionally restricted to one genre id"""
+        params = {
+            'api_key': self.api_key,
+            'page': page,
+            'sort_by': 'popularity.desc'
+        }
+        if genre_id:
+            params['with_genres'] = genre_id
+        
+        return self._get('discover', f"/discover/{content_type}", params)
+    
+    def get_similar_content(self, tmdb_id, content_type='movie', page=1):
+        """Get titles TMDB considers similar to a content item"""
+        params = {
+            'api_key': self.api_key,
+            'page': page
+        }
+        
+        return self._get('similar', f"/{content_type}/{tmdb_id}/similar", params)
     
     def get_trending_content(self, time_window='day'):
         """Get trending content from TMDB"""
-        endpoint = f"{self.base_url}/trending/all/{time_window}"
         params = {
             'api_key': self.api_key
         }
         
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            print(f"TMDB API error: {e}")
+        return self._get('trending', f"/trending/all/{time_window}", params)
+    
+    def get_genre_map(self, content_type='movie'):
+        """TMDB genre id -> name for 'movie' or 'tv'"""
+        data = self._get_reference('genres', f"/genre/{content_type}/list")
+        return {genre['id']: genre['name'] for genre in (data or {}).get('genres', [])}
+    
+    def get_image_config(self):
+        """Image base URL and available sizes from TMDB's /configuration"""
+        data = self._get_reference('configuration', '/configuration')
+        return (data or {}).get('images') or DEFAULT_IMAGE_CONFIG
+    
+    def image_url(self, path, kind='poster', size='w500'):
+        """Full image URL for a TMDB image path
+        
+        A width TMDB does not offer is rounded up to the next offered width (or 'original').
+        """
+        if not path:
             return None
+        images = self.get_image_config()
+        sizes = images.get(f"{kind}_sizes", [size])
+        if size not in sizes:
+            widths = {int(offered[1:]): offered for offered in sizes
+                      if offered.startswith('w') and offered[1:].isdigit()}
+            wider = [width for width in widths if size[1:].isdigit() and width >= int(size[1:])]
+            size = widths[min(wider)] if wider else 'original'
+        return f"{images['secure_base_url'].rstrip('/')}/{size}{path}"
+    
+    def genre_names(self, genre_ids, content_type='movie'):
+        """Map the genre_ids of a list result to names, without a details call"""
+        genre_map = self.get_genre_map(content_type)
+        return [genre_map[genre_id] for genre_id in genre_ids or [] if genre_id in genre_map]
+    
+    def transform_list_item(self, item, content_type='movie', poster_size='w500'):
+        """Card data for a popular, search or similar result; None for people"""
+        item_type = item.get('media_type', content_type)
+        if item_type == 'person':
+            return None
+        
+        release_date = item.get('release_date') or item.get('first_air_date', '')
+        year = None
+        if release_date:
+            try:
+                year = int(release_date.split('-')[0])
+            except ValueError:
+                pass
+        
+        genres = self.genre_names(item.get('genre_ids'), item_type)
+        return {
+            'tmdb_id': item['id'],
+            'title': item.get('title') or item.get('name', ''),
+            'description': item.get('overview', ''),
+            'type': 'tv_show' if item_type == 'tv' else 'movie',
+            'year': year,
+            'rating': item.get('vote_average'),
+            'poster_url': self.image_url(item.get('poster_path'), 'poster', poster_size),
+            'genres': genres,
+            'genre': ', '.join(genres) or None
+        }
+    
+    def cached_view(self):
+        """Copy of this service that never calls TMDB and serves cached responses of any age"""
+        view = copy.copy(self)
+        view.cache_only = True
+        return view
+    
+    def fan_out(self, calls, timeout=None):
+        """Run calls (name -> fn(service)) concurrently under one deadline
+        
+        Calls still running at the deadline are answered by fn(self.cached_view()) instead, so a
+        page waits at most for its slowest call or the deadline, whichever is sooner.
+        """
+        if timeout is None:
+            timeout = Config.EXTERNAL_APIS['tmdb_page_deadline_seconds']
+        
+        pool = get_fan_out_pool()
+        futures = {name: pool.submit(fn, self) for name, fn in calls.items()}
+        wait(futures.values(), timeout=timeout)
+        
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                future.cancel()
+                results[name] = calls[name](self.cached_view())
+        return results
+    
+    def find_content_details(self, tmdb_id, content_type='movie', timeout=None):
+        """Probe the requested content type, then the alternate one on a miss; returns (details, content_type)
+        
+        Both probes share one deadline; past it, cached details are used and no further call is made.
+        """
+        if timeout is None:
+            timeout = Config.EXTERNAL_APIS['tmdb_page_deadline_seconds']
+        deadline = time.monotonic() + timeout
+        alt_type = 'tv' if content_type == 'movie' else 'movie'
+        
+        pool = get_fan_out_pool()
+        for probe_type in (content_type, alt_type):
+            remaining = deadline - time.monotonic()
+            details = None
+            if remaining > 0:
+                future = pool.submit(self.get_content_details, tmdb_id, probe_type)
+                try:
+                    details = future.result(timeout=remaining)
+                except TimeoutError:
+                    future.cancel()
+            if details is None and time.monotonic() >= deadline:
+                details = self.cached_view().get_content_details(tmdb_id, probe_type)
+            if details:
+                return details, probe_type
+        return None, content_type
+    
+    def _cache_path(self, path):
+        # Offline backends get their own cache namespace so they never mix with live responses
+        return path if self.backend.name == 'http' else f"{self.backend.name}:{path}"
+    
+    def _get(self, endpoint_class, path, params):
+        """GET a TMDB endpoint through the shared response cache when caching is enabled
+        
+        Concurrent identical requests in this process share one lookup (and at most one TMDB call).
+        """
+        if self.cache_only:
+            cache = get_tmdb_cache()
+            return cache.peek(endpoint_class, self._cache_path(path), params) if cache else None
+        
+        def lookup():
+            cache = get_tmdb_cache()
+            if cache is None:
+                data = self._fetch(path, params)
+                return None if data is NOT_FOUND else data
+            return cache.get(endpoint_class, self._cache_path(path), params, lambda: self._fetch(path, params))
+        
+        return _in_flight.do(make_cache_key(f"{self.backend.name}:{path}", params), lookup)
+    
+    def _get_reference(self, endpoint_class, path):
+        """Rarely changing reference data, memoized in process on top of the response cache"""
+        key = (self.backend.name, path)
+        entry = _reference_data.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        
+        data = self._get(endpoint_class, path, {'api_key': self.api_key})
+        ttl = Config.EXTERNAL_APIS['tmdb_cache_ttl_seconds'][endpoint_class] if data else REFERENCE_RETRY_SECONDS
+        if not self.cache_only:
+            with _reference_lock:
+                _reference_data[key] = (time.monotonic() + ttl, data)
+        return data
+    
+    def _fetch(self, path, params):
+        """Fetch from the configured backend: decoded JSON, NOT_FOUND for a 404, or None on error"""
+        return self.backend.fetch(path, params)
     
     def _transform_tmdb_data(self, data, content_type):
         """Transform TMDB API response to our content format"""
@@ -118,12 +459,8 @@ class TMDBService:
                     break
         
         # Get poster and backdrop URLs
-        poster_url = None
-        backdrop_url = None
-        if data.get('poster_path'):
-            poster_url = f"{self.image_base_url}/w500{data['poster_path']}"
-        if data.get('backdrop_path'):
-            backdrop_url = f"{self.image_base_url}/w1280{data['backdrop_path']}"
+        poster_url = self.image_url(data.get('poster_path'), 'poster', 'w500')
+        backdrop_url = self.image_url(data.get('backdrop_path'), 'backdrop', 'w1280')
         
         # Get trailer URL
         trailer_url = None
@@ -158,20 +495,37 @@ class TMDBService:
             'imdb_id': imdb_id
         }
     
-    def import_popular_content(self, content_type='movie', pages=1):
-        """Import popular content from TMDB"""
-        imported_content = []
+    def iter_content_details(self, tmdb_ids, content_type='movie', workers=8):
+        """Fetch details for many items on a bounded thread pool, yielding (tmdb_id, details) as they complete
         
+        Calls still go through the shared session, response cache and rate limiter; details is None on error.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {
+                executor.submit(self.get_content_details, tmdb_id, content_type): tmdb_id
+                for tmdb_id in tmdb_ids
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    
+    def get_popular_ids(self, content_type='movie', pages=1):
+        """TMDB ids from the first pages of the popular list, in list order without duplicates"""
+        tmdb_ids = []
         for page in range(1, pages + 1):
             popular_data = self.get_popular_content(content_type, page)
             if not popular_data or 'results' not in popular_data:
                 continue
-            
-            for item in popular_data['results']:
-                tmdb_id = item['id']
-                details = self.get_content_details(tmdb_id, content_type)
-                if details:
-                    details['tmdb_id'] = tmdb_id
-                    imported_content.append(details)
+            tmdb_ids.extend(item['id'] for item in popular_data['results'])
+        return list(dict.fromkeys(tmdb_ids))
+    
+    def import_popular_content(self, content_type='movie', pages=1, workers=8):
+        """Import popular content from TMDB"""
+        imported_content = []
+        
+        for tmdb_id, details in self.iter_content_details(self.get_popular_ids(content_type, pages),
+                                                           content_type, workers):
+            if details:
+                details['tmdb_id'] = tmdb_id
+                imported_content.append(details)
         
         return imported_content
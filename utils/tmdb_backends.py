@@ -0,0 +1,282 @@
+"""
+Offline TMDB backends for WatchTogether
+Replay recorded JSON fixtures or fabricate a deterministic synthetic catalog, so benchmarks and CI need no network
+"""
+
+import os
+import re
+import json
+import random
+import hashlib
+import logging
+import threading
+from utils.tmdb_cache import make_cache_key, NOT_FOUND
+from typing import Dict, List, Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+class ReplayBackend:
+    """Serves TMDB responses recorded as JSON files, optionally recording misses through another backend
+
+    Fixtures live at <directory>/<endpoint path>/<hash of params>.json and hold the status and body.
+    """
+
+    name = 'replay'
+
+    def __init__(self, directory: str, record_from=None):
+        self.directory = directory
+        self.record_from = record_from
+        self._lock = threading.Lock()
+
+    def fixture_path(self, path: str, params: Dict) -> str:
+        digest = hashlib.sha1(make_cache_key(path, params).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, path.strip('/'), f"{digest}.json")
+
+    def fetch(self, path: str, params: Dict):
+        fixture_path = self.fixture_path(path, params)
+        if os.path.exists(fixture_path):
+            with open(fixture_path) as f:
+                fixture = json.load(f)
+            return NOT_FOUND if fixture['status'] == 404 else fixture['body']
+
+        if self.record_from is None:
+            logger.warning(f"No recorded TMDB fixture for {make_cache_key(path, params)}")
+            return None
+
+        data = self.record_from.fetch(path, params)
+        if data is not None:
+            self.record(path, params, data)
+        return data
+
+    def record(self, path: str, params: Dict, data):
+        fixture = {'request': make_cache_key(path, params), 'status': 404 if data is NOT_FOUND else 200,
+                   'body': None if data is NOT_FOUND else data}
+        fixture_path = self.fixture_path(path, params)
+        with self._lock:
+            os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
+            tmp_path = f"{fixture_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(fixture, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, fixture_path)
+
+
+# TMDB genre ids with rough catalog shares, so synthetic genre mixes look like the real one
+GENRES = {
+    'movie': [(18, 'Drama', 30), (35, 'Comedy', 20), (28, 'Action', 12), (53, 'Thriller', 11),
+              (10749, 'Romance', 8), (27, 'Horror', 7), (80, 'Crime', 6), (12, 'Adventure', 6),
+              (878, 'Science Fiction', 5), (99, 'Documentary', 5), (16, 'Animation', 4),
+              (14, 'Fantasy', 4), (10751, 'Family', 4), (9648, 'Mystery', 3), (36, 'History', 2),
+              (10752, 'War', 1), (10402, 'Music', 1), (37, 'Western', 1)],
+    'tv': [(18, 'Drama', 30), (35, 'Comedy', 20), (80, 'Crime', 10), (10759, 'Action & Adventure', 9),
+           (10765, 'Sci-Fi & Fantasy', 7), (99, 'Documentary', 6), (16, 'Animation', 6),
+           (9648, 'Mystery', 5), (10764, 'Reality', 5), (10751, 'Family', 3), (10762, 'Kids', 2),
+           (10768, 'War & Politics', 1)]
+}
+
+TITLE_WORDS = ['Silent', 'Broken', 'Last', 'Hidden', 'Golden', 'Midnight', 'Lost', 'Crimson', 'Wild',
+               'Distant', 'Burning', 'Frozen', 'Electric', 'Secret', 'Shattered', 'Endless']
+TITLE_NOUNS = ['River', 'Empire', 'Garden', 'Horizon', 'Signal', 'Harbor', 'Kingdom', 'Echo', 'Station',
+               'Frontier', 'Orchard', 'Protocol', 'Tide', 'Mirror', 'Summit', 'Archive']
+FIRST_NAMES = ['Ana', 'Ben', 'Chloe', 'Dev', 'Elena', 'Felix', 'Grace', 'Hiro', 'Isla', 'Jon', 'Kira',
+               'Leo', 'Maya', 'Nikhil', 'Olga', 'Priya', 'Quinn', 'Rafael', 'Sofia', 'Tomas']
+LAST_NAMES = ['Adams', 'Becker', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen',
+              'Kowalski', 'Lopez', 'Moreau', 'Nakamura', 'Okafor', 'Petrov', 'Rossi', 'Singh', 'Tanaka', 'Varga']
+COUNTRIES = [('United States of America', 'en', 50), ('United Kingdom', 'en', 12), ('France', 'fr', 8),
+             ('Japan', 'ja', 8), ('South Korea', 'ko', 7), ('India', 'hi', 6), ('Spain', 'es', 5),
+             ('Germany', 'de', 4)]
+
+PAGE_SIZE = 20
+
+
+class SyntheticBackend:
+    """Fabricates a deterministic catalog of N titles answering the TMDB endpoints the app uses
+
+    Ids 1..N are ranked by popularity (id 1 is the most popular); each id is either a movie or a
+    TV show, so probing the other type returns 404 like the real API. Cast members are drawn with
+    Zipf weights so a few actors appear across many titles.
+    """
+
+    name = 'synthetic'
+
+    ROUTES = [
+        (re.compile(r'/(movie|tv)/popular'), '_popular'),
+        (re.compile(r'/discover/(movie|tv)'), '_discover'),
+        (re.compile(r'/trending/all/(day|week)'), '_trending'),
+        (re.compile(r'/search/(multi|movie|tv)'), '_search'),
+        (re.compile(r'/(movie|tv)/(\d+)/similar'), '_similar'),
+        (re.compile(r'/(movie|tv)/(\d+)'), '_details'),
+        (re.compile(r'/genre/(movie|tv)/list'), '_genres'),
+        (re.compile(r'/configuration'), '_configuration'),
+    ]
+
+    def __init__(self, size: int = 1000, seed: int = 7):
+        self.size = size
+        self.seed = seed
+        rng = random.Random(seed)
+        self.cast_pool = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(400)]
+        self.cast_weights = [1.0 / (rank + 1) for rank in range(len(self.cast_pool))]
+        self.director_pool = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(80)]
+        self._titles = {}
+        self._by_type = {}
+
+    def _title(self, tmdb_id: int) -> Dict:
+        """Full synthetic record for an id (memoized; generation depends only on seed and id)"""
+        title = self._titles.get(tmdb_id)
+        if title is not None:
+            return title
+
+        rng = random.Random(self.seed * 1_000_003 + tmdb_id)
+        media_type = 'movie' if rng.random() < 0.7 else 'tv'
+        genre_table = GENRES[media_type]
+        genre_count = rng.choice([1, 1, 2, 2, 2, 3])
+        genres = []
+        while len(genres) < genre_count:
+            genre = rng.choices(genre_table, weights=[weight for _, _, weight in genre_table])[0]
+            if genre not in genres:
+                genres.append(genre)
+        country, language, _ = rng.choices(COUNTRIES, weights=[weight for _, _, weight in COUNTRIES])[0]
+        year = rng.randint(1970, 2025)
+
+        title = {
+            'id': tmdb_id,
+            'media_type': media_type,
+            'title': f"The {rng.choice(TITLE_WORDS)} {rng.choice(TITLE_NOUNS)} {tmdb_id}",
+            'overview': f"A synthetic {genres[0][1].lower()} title for offline runs.",
+            'date': f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'runtime': rng.randint(80, 170) if media_type == 'movie' else rng.randint(22, 60),
+            'genres': [{'id': genre_id, 'name': name} for genre_id, name, _ in genres],
+            'vote_average': round(min(10.0, max(1.0, rng.gauss(6.6, 1.1))), 1),
+            'vote_count': int(50000 / tmdb_id) + rng.randint(0, 200),
+            'popularity': round(1000.0 / tmdb_id ** 0.8, 3),
+            'cast': list(dict.fromkeys(rng.choices(self.cast_pool, weights=self.cast_weights, k=12)))[:10],
+            'director': rng.choice(self.director_pool),
+            'country': country,
+            'language': language,
+            'poster_path': f"/synthetic/poster{tmdb_id}.jpg",
+            'backdrop_path': f"/synthetic/backdrop{tmdb_id}.jpg",
+            'trailer_key': f"synthetic{tmdb_id}"
+        }
+        self._titles[tmdb_id] = title
+        return title
+
+    def _list_item(self, title: Dict) -> Dict:
+        date_key, name_key = ('release_date', 'title') if title['media_type'] == 'movie' else ('first_air_date', 'name')
+        return {
+            'id': title['id'],
+            'media_type': title['media_type'],
+            name_key: title['title'],
+            date_key: title['date'],
+            'overview': title['overview'],
+            'genre_ids': [genre['id'] for genre in title['genres']],
+            'vote_average': title['vote_average'],
+            'popularity': title['popularity'],
+            'poster_path': title['poster_path'],
+            'backdrop_path': title['backdrop_path']
+        }
+
+    def _page(self, titles: List[Dict], page: int) -> Dict:
+        page = max(1, int(page or 1))
+        start = (page - 1) * PAGE_SIZE
+        return {
+            'page': page,
+            'results': [self._list_item(title) for title in titles[start:start + PAGE_SIZE]],
+            'total_pages': max(1, -(-len(titles) // PAGE_SIZE)),
+            'total_results': len(titles)
+        }
+
+    def _of_type(self, media_type: Optional[str]) -> List[Dict]:
+        """Titles of a type (None for all) in popularity order"""
+        titles = self._by_type.get(media_type)
+        if titles is None:
+            titles = [self._title(tmdb_id) for tmdb_id in range(1, self.size + 1)]
+            titles = self._by_type[media_type] = [
+                title for title in titles if media_type in (None, title['media_type'])
+            ]
+        return titles
+
+    def _popular(self, params, media_type):
+        return self._page(self._of_type(media_type), params.get('page', 1))
+
+    def _discover(self, params, media_type):
+        titles = self._of_type(media_type)
+        if params.get('with_genres'):
+            genre_id = int(params['with_genres'])
+            titles = [title for title in titles if genre_id in {genre['id'] for genre in title['genres']}]
+        return self._page(titles, params.get('page', 1))
+
+    def _trending(self, params, window):
+        titles = self._of_type(None)
+        # Shuffle the head of the popularity ranking so trending differs from popular
+        head = titles[:100]
+        random.Random(f"{self.seed}-{window}").shuffle(head)
+        return self._page(head + titles[100:], params.get('page', 1))
+
+    def _search(self, params, search_type):
+        query = str(params.get('query', '')).lower()
+        media_type = None if search_type == 'multi' else search_type
+        return self._page([title for title in self._of_type(media_type) if query in title['title'].lower()],
+                          params.get('page', 1))
+
+    def _similar(self, params, media_type, tmdb_id):
+        title = self._find(media_type, int(tmdb_id))
+        if title is None:
+            return NOT_FOUND
+        genre_ids = {genre['id'] for genre in title['genres']}
+        similar = [other for other in self._of_type(media_type)
+                   if other['id'] != title['id'] and genre_ids & {genre['id'] for genre in other['genres']}]
+        return self._page(similar, params.get('page', 1))
+
+    def _details(self, params, media_type, tmdb_id):
+        title = self._find(media_type, int(tmdb_id))
+        if title is None:
+            return NOT_FOUND
+
+        details = {
+            'id': title['id'],
+            'overview': title['overview'],
+            'genres': title['genres'],
+            'vote_average': title['vote_average'],
+            'vote_count': title['vote_count'],
+            'popularity': title['popularity'],
+            'poster_path': title['poster_path'],
+            'backdrop_path': title['backdrop_path'],
+            'original_language': title['language'],
+            'production_countries': [{'name': title['country']}],
+            'credits': {
+                'cast': [{'name': name, 'order': order} for order, name in enumerate(title['cast'])],
+                'crew': [{'job': 'Director', 'name': title['director']}]
+            },
+            'videos': {'results': [{'type': 'Trailer', 'site': 'YouTube', 'key': title['trailer_key']}]},
+            'external_ids': {'imdb_id': f"tt{9000000 + title['id']}"}
+        }
+        if media_type == 'movie':
+            details.update({'title': title['title'], 'release_date': title['date'], 'runtime': title['runtime']})
+        else:
+            details.update({'name': title['title'], 'first_air_date': title['date'],
+                            'episode_run_time': [title['runtime']]})
+        return details
+
+    def _genres(self, params, media_type):
+        return {'genres': [{'id': genre_id, 'name': name} for genre_id, name, _ in GENRES[media_type]]}
+
+    def _configuration(self, params):
+        return {'images': {
+            'secure_base_url': 'https://image.tmdb.org/t/p/',
+            'poster_sizes': ['w92', 'w154', 'w185', 'w342', 'w500', 'w780', 'original'],
+            'backdrop_sizes': ['w300', 'w780', 'w1280', 'original']
+        }}
+
+    def _find(self, media_type: str, tmdb_id: int) -> Optional[Dict]:
+        if not 1 <= tmdb_id <= self.size:
+            return None
+        title = self._title(tmdb_id)
+        return title if title['media_type'] == media_type else None
+
+    def fetch(self, path: str, params: Dict):
+        for pattern, handler in self.ROUTES:
+            match = pattern.fullmatch(path)
+            if match:
+                return getattr(self, handler)(params, *match.groups())
+        return NOT_FOUND
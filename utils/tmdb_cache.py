@@ -0,0 +1,252 @@
+"""
+Persistent TMDB response cache for WatchTogether
+SQLite-backed so every worker process shares it, with per-endpoint TTLs and stale-while-revalidate
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from utils.recommendation_config import Config
+from typing import Callable, Dict, Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+# How long a claimed background refresh blocks other workers from refreshing the same key
+REFRESH_LEASE_SECONDS = 30
+
+# How often in-process counters are added to the shared metrics table
+METRICS_FLUSH_SECONDS = 30
+
+# Returned by a fetch callable when TMDB answered 404; cached as a null body with the not_found TTL
+NOT_FOUND = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tmdb_response (
+    cache_key TEXT PRIMARY KEY,
+    endpoint_class TEXT NOT NULL,
+    body TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    refresh_until REAL
+);
+CREATE TABLE IF NOT EXISTS tmdb_cache_metric (
+    endpoint_class TEXT NOT NULL,
+    event TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (endpoint_class, event)
+);
+"""
+
+
+def make_cache_key(path: str, params: Dict) -> str:
+    """Stable key for an endpoint path and its params (the API key is not part of it)"""
+    params = {key: value for key, value in params.items() if key != 'api_key'}
+    return f"{path}?{json.dumps(params, sort_keys=True, default=str)}"
+
+
+class TMDBResponseCache:
+    """Shared cache of raw TMDB JSON responses
+
+    Fresh entries are served directly. Entries past their TTL but inside the stale window are
+    served immediately while one worker refreshes them in a background thread; anything older
+    is fetched synchronously.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Dict[str, int], stale_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._last_flush = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shared across threads), reopened after a fork"""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection, self._local.pid = self._connect(), os.getpid()
+        return self._local.connection
+
+    def _ttl(self, endpoint_class: str) -> int:
+        return self.ttl_seconds.get(endpoint_class, self.ttl_seconds.get('default', 3600))
+
+    def _count(self, endpoint_class: str, event: str):
+        with self._lock:
+            self._counters[(endpoint_class, event)] += 1
+            if time.monotonic() - self._last_flush < METRICS_FLUSH_SECONDS:
+                return
+            pending, self._counters = self._counters, Counter()
+            self._last_flush = time.monotonic()
+        self._flush_counters(pending)
+
+    def _flush_counters(self, pending: Counter):
+        try:
+            self._connection.executemany(
+                """INSERT INTO tmdb_cache_metric (endpoint_class, event, count) VALUES (?, ?, ?)
+                   ON CONFLICT (endpoint_class, event) DO UPDATE SET count = count + excluded.count""",
+                [(endpoint_class, event, count) for (endpoint_class, event), count in pending.items()]
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not flush TMDB cache metrics: {e}")
+
+    def get(self, endpoint_class: str, path: str, params: Dict,
+            fetch: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """Get a cached response, fetching it with fetch() when missing or too stale
+
+        fetch returns the decoded JSON, NOT_FOUND for a 404 (cached as a negative entry and
+        returned as None), or None on failure (failures are not cached).
+        """
+        key = make_cache_key(path, params)
+        now = time.time()
+        row = self._connection.execute(
+            'SELECT body, expires_at FROM tmdb_response WHERE cache_key = ?', (key,)
+        ).fetchone()
+
+        if row is not None:
+            body, expires_at = row
+            if now < expires_at:
+                self._count(endpoint_class, 'hit' if body != 'null' else 'negative_hit')
+                return json.loads(body)
+            if now < expires_at + self.stale_seconds:
+                self._count(endpoint_class, 'stale_hit')
+                self._refresh_in_background(endpoint_class, key, fetch)
+                return json.loads(body)
+
+        self._count(endpoint_class, 'miss')
+        data = fetch()
+        if data is NOT_FOUND:
+            self.set(endpoint_class, key, None)
+            return None
+        if data is not None:
+            self.set(endpoint_class, key, data)
+        elif row is not None:
+            # Serve the expired copy rather than nothing when TMDB is unavailable
+            self._count(endpoint_class, 'error_fallback')
+            return json.loads(row[0])
+        return data
+
+    def set(self, endpoint_class: str, key: str, data: Optional[Dict]):
+        """Store a response; None stores a negative (not found) entry"""
+        now = time.time()
+        ttl = self._ttl('not_found') if data is None else self._ttl(endpoint_class)
+        self._connection.execute(
+            """INSERT INTO tmdb_response (cache_key, endpoint_class, body, fetched_at, expires_at, refresh_until)
+               VALUES (?, ?, ?, ?, ?, NULL)
+               ON CONFLICT (cache_key) DO UPDATE SET body = excluded.body, fetched_at = excluded.fetched_at,
+                   expires_at = excluded.expires_at, refresh_until = NULL""",
+            (key, endpoint_class, json.dumps(data), now, now + ttl)
+        )
+
+    def _claim_refresh(self, key: str) -> bool:
+        """Take a short lease on refreshing key so only one worker refreshes it"""
+        now = time.time()
+        cursor = self._connection.execute(
+            """UPDATE tmdb_response SET refresh_until = ?
+               WHERE cache_key = ? AND (refresh_until IS NULL OR refresh_until < ?)""",
+            (now + REFRESH_LEASE_SECONDS, key, now)
+        )
+        return cursor.rowcount == 1
+
+    def _refresh_in_background(self, endpoint_class: str, key: str, fetch: Callable[[], Optional[Dict]]):
+        if not self._claim_refresh(key):
+            return
+
+        def refresh():
+            data = fetch()
+            if data is not None:
+                self.set(endpoint_class, key, None if data is NOT_FOUND else data)
+                self._count(endpoint_class, 'refresh')
+            else:
+                self._count(endpoint_class, 'refresh_error')
+
+        threading.Thread(target=refresh, name='tmdb-cache-refresh', daemon=True).start()
+
+    def peek(self, endpoint_class: str, path: str, params: Dict) -> Optional[Dict]:
+        """Cached response of any age without fetching; used when a request deadline has passed"""
+        row = self._connection.execute(
+            'SELECT body FROM tmdb_response WHERE cache_key = ?', (make_cache_key(path, params),)
+        ).fetchone()
+        self._count(endpoint_class, 'deadline_hit' if row else 'deadline_miss')
+        return json.loads(row[0]) if row else None
+
+    def purge(self, older_than_seconds: int = None) -> int:
+        """Delete entries past their stale window (or everything older than older_than_seconds)"""
+        now = time.time()
+        if older_than_seconds is None:
+            cursor = self._connection.execute(
+                'DELETE FROM tmdb_response WHERE expires_at + ? < ?', (self.stale_seconds, now)
+            )
+        else:
+            cursor = self._connection.execute(
+                'DELETE FROM tmdb_response WHERE fetched_at < ?', (now - older_than_seconds,)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        """Hit/miss counters per endpoint class across all workers, plus entry counts"""
+        with self._lock:
+            pending, self._counters = self._counters, Counter()
+            self._last_flush = time.monotonic()
+        if pending:
+            self._flush_counters(pending)
+
+        endpoints = {}
+        for endpoint_class, event, count in self._connection.execute(
+            'SELECT endpoint_class, event, count FROM tmdb_cache_metric'
+        ):
+            endpoints.setdefault(endpoint_class, Counter())[event] = count
+
+        now = time.time()
+        for endpoint_class, entries, fresh in self._connection.execute(
+            """SELECT endpoint_class, COUNT(*), SUM(CASE WHEN expires_at > ? THEN 1 ELSE 0 END)
+               FROM tmdb_response GROUP BY endpoint_class""", (now,)
+        ):
+            endpoint = endpoints.setdefault(endpoint_class, Counter())
+            endpoint['entries'] = entries
+            endpoint['fresh_entries'] = fresh
+
+        for endpoint in endpoints.values():
+            served = endpoint['hit'] + endpoint['stale_hit']
+            lookups = served + endpoint['miss']
+            endpoint['hit_rate'] = served / lookups if lookups else 0.0
+
+        return {endpoint_class: dict(counts) for endpoint_class, counts in endpoints.items()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tmdb_cache() -> Optional[TMDBResponseCache]:
+    """Get the process-wide response cache, or None when EXTERNAL_APIS['cache_api_responses'] is off"""
+    global _cache
+    settings = Config.EXTERNAL_APIS
+    if not settings['cache_api_responses']:
+        return None
+
+    with _cache_lock:
+        if _cache is None or _cache.path != settings['tmdb_cache_path']:
+            _cache = TMDBResponseCache(
+                settings['tmdb_cache_path'],
+                settings['tmdb_cache_ttl_seconds'],
+                settings['tmdb_cache_stale_seconds']
+            )
+        return _cache
@@ -0,0 +1,254 @@
+"""
+TMDB import and refresh for WatchTogether
+Fetches titles concurrently and upserts them into Content by tmdb_id in batched transactions
+"""
+
+import time
+import logging
+import threading
+from app import db
+from models import Content, ContentRating, UserWatchlist
+from utils.tmdb_api import TMDBService
+from utils.prefix_search import reindex
+from utils.recommendation_config import Config
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import func
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+
+def details_to_content_row(details: Dict, tmdb_id: int) -> Dict:
+    """Map TMDBService.get_content_details output onto the TMDB-owned Content columns
+
+    status is left out so refreshes never undo a moderator's deactivation; upsert_content sets it on insert.
+    The language code is upper-cased as the add-from-TMDB routes store it, so refreshes compare like with like.
+    """
+    return {
+        'title': details['title'],
+        'description': details.get('description'),
+        'type': details['type'],
+        'genre': ', '.join(details.get('genres', [])),
+        'year': details.get('year'),
+        'rating': details.get('rating'),
+        'duration': details.get('duration'),
+        'poster_url': details.get('poster_url'),
+        'backdrop_url': details.get('backdrop_url'),
+        'trailer_url': details.get('trailer_url'),
+        'tmdb_id': tmdb_id,
+        'imdb_id': details.get('imdb_id'),
+        'director': details.get('director'),
+        'cast': ', '.join(details.get('cast', [])),
+        'country': details.get('country'),
+        'language': details['language'].upper() if details.get('language') else None
+    }
+
+
+def upsert_content(rows: List[Dict]) -> Dict[str, int]:
+    """Insert new titles and update existing ones (matched by tmdb_id) with set-based statements"""
+    if not rows:
+        return {'inserted': 0, 'updated': 0}
+
+    existing = dict(db.session.query(Content.tmdb_id, Content.id).filter(
+        Content.tmdb_id.in_([row['tmdb_id'] for row in rows])
+    ))
+    now = datetime.utcnow()
+    inserts = [dict(row, status='active', created_at=now, updated_at=now) for row in rows if row['tmdb_id'] not in existing]
+    updates = [dict(row, id=existing[row['tmdb_id']], updated_at=now) for row in rows if row['tmdb_id'] in existing]
+
+    if inserts:
+        db.session.execute(db.insert(Content), inserts)
+    if updates:
+        db.session.execute(db.update(Content), updates)
+
+    # Bulk statements skip the session's search hooks, so re-tokenize the written titles here
+    content_ids = list(existing.values())
+    if inserts:
+        content_ids += [content_id for (content_id,) in db.session.query(Content.id).filter(
+            Content.tmdb_id.in_([row['tmdb_id'] for row in inserts])
+        )]
+    reindex('content', content_ids)
+    return {'inserted': len(inserts), 'updated': len(updates)}
+
+
+def import_tmdb_content(content_type: str = 'movie', pages: int = 1, workers: int = None,
+                        batch_size: int = None, refresh_after_days: int = None,
+                        service: TMDBService = None, progress=None) -> Dict:
+    """Import the first pages of TMDB's popular list for a content type ('movie' or 'tv')
+
+    Titles already stored and updated within refresh_after_days are skipped. Details are fetched
+    on a bounded thread pool at bulk priority; rows are written in batches from this thread.
+    """
+    settings = Config.TMDB_IMPORT
+    workers = workers or settings['workers']
+    batch_size = batch_size or settings['batch_size']
+    refresh_after_days = settings['refresh_after_days'] if refresh_after_days is None else refresh_after_days
+    service = service or TMDBService(priority='bulk')
+
+    started = time.monotonic()
+    stats = {'candidates': 0, 'skipped': 0, 'inserted': 0, 'updated': 0, 'failed': 0}
+
+    tmdb_ids = service.get_popular_ids(content_type, pages)
+    stats['candidates'] = len(tmdb_ids)
+
+    fresh_since = datetime.utcnow() - timedelta(days=refresh_after_days)
+    fresh_ids = {
+        tmdb_id for (tmdb_id,) in db.session.query(Content.tmdb_id).filter(
+            Content.tmdb_id.in_(tmdb_ids), Content.updated_at >= fresh_since
+        )
+    }
+    pending_ids = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in fresh_ids]
+    stats['skipped'] = len(fresh_ids)
+
+    batch = []
+
+    def flush():
+        counts = upsert_content(batch)
+        db.session.commit()
+        stats['inserted'] += counts['inserted']
+        stats['updated'] += counts['updated']
+        batch.clear()
+        if progress:
+            progress(stats)
+
+    for tmdb_id, details in service.iter_content_details(pending_ids, content_type, workers):
+        if not details:
+            stats['failed'] += 1
+            continue
+        batch.append(details_to_content_row(details, tmdb_id))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.monotonic() - started
+    stats['elapsed_seconds'] = elapsed
+    stats['items_per_second'] = (stats['inserted'] + stats['updated']) / elapsed if elapsed > 0 else 0.0
+    logger.info(f"TMDB import ({content_type}, {pages} pages): {stats}")
+    return stats
+
+
+def is_content_fresh(content: Content) -> bool:
+    """Whether a stored title's TMDB metadata is recent enough to serve without refreshing"""
+    max_age = timedelta(days=Config.TMDB_IMPORT['local_max_age_days'])
+    return content.updated_at is not None and content.updated_at >= datetime.utcnow() - max_age
+
+
+def refresh_content(tmdb_id: int, content_type: str = 'movie', service: TMDBService = None) -> bool:
+    """Re-fetch one title's details from TMDB and upsert its Content row"""
+    details = (service or TMDBService()).get_content_details(tmdb_id, content_type)
+    if not details:
+        return False
+    upsert_content([details_to_content_row(details, tmdb_id)])
+    db.session.commit()
+    return True
+
+
+def get_stale_content(limit: int, popularity_days: int = None) -> List[Content]:
+    """Stored TMDB titles past local_max_age_days, most recently popular first, then oldest first
+
+    Popularity is the number of watchlist adds and ratings within the last popularity_days.
+    """
+    settings = Config.TMDB_IMPORT
+    popularity_days = settings['refresh_popularity_days'] if popularity_days is None else popularity_days
+    now = datetime.utcnow()
+    recent = now - timedelta(days=popularity_days)
+
+    watchlist_adds = db.session.query(
+        UserWatchlist.content_id, func.count().label('activity')
+    ).filter(UserWatchlist.added_at >= recent).group_by(UserWatchlist.content_id).subquery()
+    ratings = db.session.query(
+        ContentRating.content_id, func.count().label('activity')
+    ).filter(ContentRating.created_at >= recent).group_by(ContentRating.content_id).subquery()
+    activity = func.coalesce(watchlist_adds.c.activity, 0) + func.coalesce(ratings.c.activity, 0)
+
+    return Content.query.outerjoin(
+        watchlist_adds, watchlist_adds.c.content_id == Content.id
+    ).outerjoin(
+        ratings, ratings.c.content_id == Content.id
+    ).filter(
+        Content.tmdb_id.isnot(None),
+        Content.updated_at < now - timedelta(days=settings['local_max_age_days'])
+    ).order_by(activity.desc(), Content.updated_at.asc()).limit(limit).all()
+
+
+def refresh_stale_content(budget: int = None, workers: int = None, batch_size: int = None,
+                          service: TMDBService = None) -> Dict:
+    """Re-fetch up to budget stale titles concurrently at bulk priority, writing only changed columns
+
+    Unchanged titles only have updated_at bumped so they leave the stale set. Titles TMDB fails to
+    return (removed titles answer 404) are backed off: updated_at is moved so they become stale again
+    after refresh_failure_backoff_days instead of taking budget on every run.
+    """
+    settings = Config.TMDB_IMPORT
+    budget = budget or settings['refresh_budget_per_run']
+    workers = workers or settings['workers']
+    batch_size = batch_size or settings['batch_size']
+    service = service or TMDBService(priority='bulk')
+
+    started = time.monotonic()
+    stats = {'candidates': 0, 'changed': 0, 'unchanged': 0, 'failed': 0}
+    now = datetime.utcnow()
+    retry_after = min(now, now - timedelta(days=settings['local_max_age_days'] -
+                                           settings['refresh_failure_backoff_days']))
+
+    stale = get_stale_content(budget)
+    stats['candidates'] = len(stale)
+    by_type = {}
+    for content in stale:
+        by_type.setdefault('tv' if content.type == 'tv_show' else 'movie', {})[content.tmdb_id] = content
+
+    batch = []
+
+    def flush():
+        db.session.execute(db.update(Content), batch)
+        reindex('content', [row['id'] for row in batch if 'title' in row or 'description' in row])
+        db.session.commit()
+        batch.clear()
+
+    for content_type, stored in by_type.items():
+        for tmdb_id, details in service.iter_content_details(list(stored), content_type, workers):
+            content = stored[tmdb_id]
+            if not details:
+                stats['failed'] += 1
+                batch.append({'id': content.id, 'updated_at': retry_after})
+            else:
+                changes = {
+                    column: value for column, value in details_to_content_row(details, tmdb_id).items()
+                    if getattr(content, column) != value
+                }
+                stats['changed' if changes else 'unchanged'] += 1
+                batch.append(dict(changes, id=content.id, updated_at=datetime.utcnow()))
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+
+    stats['elapsed_seconds'] = time.monotonic() - started
+    logger.info(f"TMDB refresh: {stats}")
+    return stats
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def refresh_content_in_background(app, tmdb_id: int, content_type: str = 'movie'):
+    """Refresh a stale title on a daemon thread; concurrent requests for the same title start one refresh"""
+    with _refreshing_lock:
+        if tmdb_id in _refreshing:
+            return
+        _refreshing.add(tmdb_id)
+
+    def run():
+        try:
+            with app.app_context():
+                refresh_content(tmdb_id, content_type)
+        except Exception as e:
+            logger.warning(f"Background refresh of TMDB {tmdb_id} failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(tmdb_id)
+
+    threading.Thread(target=run, name=f"tmdb-refresh-{tmdb_id}", daemon=True).start()
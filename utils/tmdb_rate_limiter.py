@@ -0,0 +1,172 @@
+"""
+Cross-process token-bucket rate limiter for TMDB calls
+Bucket state lives in a small SQLite file so every worker draws from the same budget
+"""
+
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+import requests
+from utils.recommendation_config import Config
+from typing import Optional
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ('interactive', 'bulk')
+
+# A registered interactive waiter is forgotten after this long (covers crashed processes)
+WAITER_LEASE_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_bucket (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interactive_waiter (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class RateLimitTimeout(requests.RequestException):
+    """No token became available before the caller's deadline"""
+
+
+class TokenBucketLimiter:
+    """Token bucket shared through SQLite
+
+    Interactive calls (detail pages, search) may spend every token. Bulk calls leave a reserve
+    untouched and yield entirely while any interactive call is queued.
+    """
+
+    def __init__(self, path: str, rate_per_minute: float, burst: int, interactive_reserve: int,
+                 name: str = 'tmdb'):
+        self.path = path
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.interactive_reserve = interactive_reserve
+        self.name = name
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection
+        connection.executescript(SCHEMA)
+        connection.execute(
+            'INSERT OR IGNORE INTO token_bucket (name, tokens, updated_at) VALUES (?, ?, ?)',
+            (name, self.capacity, time.time())
+        )
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, reopened after a fork"""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def _try_take(self, priority: str) -> float:
+        """Take a token if allowed; returns 0 on success or the seconds to wait before retrying"""
+        connection = self._connection
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            tokens, updated_at = connection.execute(
+                'SELECT tokens, updated_at FROM token_bucket WHERE name = ?', (self.name,)
+            ).fetchone()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+
+            required = 1.0
+            if priority == 'bulk':
+                required += self.interactive_reserve
+                waiting = connection.execute(
+                    'SELECT COUNT(*) FROM interactive_waiter WHERE expires_at > ?', (now,)
+                ).fetchone()[0]
+                if waiting:
+                    required = max(required, tokens + 1.0)
+
+            if tokens >= required:
+                tokens -= 1.0
+                wait = 0.0
+            else:
+                wait = (required - tokens) / self.rate
+
+            connection.execute('UPDATE token_bucket SET tokens = ?, updated_at = ? WHERE name = ?',
+                               (tokens, now, self.name))
+            connection.execute('COMMIT')
+            return wait
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def acquire(self, priority: str = 'interactive', timeout: float = None):
+        """Block until a token is taken, raising RateLimitTimeout once timeout seconds have passed"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if timeout is None:
+            timeout = Config.EXTERNAL_APIS['tmdb_rate_limit_wait_seconds'][priority]
+
+        deadline = time.monotonic() + timeout
+        waiter_id = None
+        try:
+            while True:
+                wait = self._try_take(priority)
+                if wait == 0:
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout(f"TMDB rate limit: no token within {timeout:.1f}s ({priority})")
+
+                if priority == 'interactive':
+                    waiter_id = self._register_waiter(waiter_id)
+                # Jitter spreads out workers that wake for the same token
+                time.sleep(min(remaining, wait * random.uniform(1.0, 1.25)))
+        finally:
+            if waiter_id is not None:
+                self._connection.execute('DELETE FROM interactive_waiter WHERE id = ?', (waiter_id,))
+
+    def _register_waiter(self, waiter_id: int = None) -> int:
+        expires_at = time.time() + WAITER_LEASE_SECONDS
+        if waiter_id is None:
+            return self._connection.execute(
+                'INSERT INTO interactive_waiter (expires_at) VALUES (?)', (expires_at,)
+            ).lastrowid
+        self._connection.execute('UPDATE interactive_waiter SET expires_at = ? WHERE id = ?',
+                                 (expires_at, waiter_id))
+        return waiter_id
+
+    def drain(self):
+        """Empty the bucket after TMDB answers 429 so every worker backs off together"""
+        self._connection.execute('UPDATE token_bucket SET tokens = 0, updated_at = ? WHERE name = ?',
+                                 (time.time(), self.name))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_tmdb_rate_limiter() -> Optional[TokenBucketLimiter]:
+    """Get the process-wide limiter configured from EXTERNAL_APIS, or None when no limit is set"""
+    global _limiter
+    settings = Config.EXTERNAL_APIS
+    if not settings['api_rate_limit_per_minute']:
+        return None
+
+    with _limiter_lock:
+        if _limiter is None or _limiter.path != settings['tmdb_rate_limit_path']:
+            _limiter = TokenBucketLimiter(
+                settings['tmdb_rate_limit_path'],
+                settings['api_rate_limit_per_minute'],
+                settings['tmdb_rate_limit_burst'],
+                settings['tmdb_interactive_reserve']
+            )
+        return _limiter